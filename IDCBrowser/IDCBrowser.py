@@ -7,7 +7,7 @@ import csv
 import json
 import logging
 import os.path
-import pickle
+import shutil
 import string
 import sys
 import time
@@ -17,7 +17,6 @@ import xml.etree.ElementTree as ET
 import zipfile
 from random import randint
 import tempfile
-import inspect
 
 # Third-party imports
 import pydicom
@@ -30,6 +29,10 @@ from __main__ import vtk, qt, ctk, slicer
 
 # Local application imports
 from slicer.ScriptedLoadableModule import *
+from IDCBrowserLib import (DownloadJob, DownloadScheduler, FacetIndex, HierarchyQueries, IdentifierIndex, ImportManifest,
+                           IncrementalSearch, IndexStore, LocalCatalog, LRUCache, PersistentQueryCache, QueryExecutor,
+                           ReferenceGraph, SeriesLookup, BROWSER_COLUMNS, REFERENCING_MODALITIES, compactIndex,
+                           findIndexFiles, formatMemoryReport, pluginNamesForModality, readManifestUrls, sortForLoading)
 
 #
 # IDCBrowser
@@ -50,6 +53,126 @@ class IDCBrowser(ScriptedLoadableModule):
 
 
 
+#
+# DataFrameTableModel
+#
+
+class DataFrameTableModel(qt.QAbstractTableModel):
+  """Table model that reads cells directly from the columns of a pandas DataFrame.
+
+  Display values are only built for the cells the view requests, which are
+  the visible rows. Columns mapped to None are not backed by the DataFrame,
+  their content comes from displayCallback(row, column) and
+  decorationCallback(row, column).
+  """
+
+  def __init__(self, columns, headerLabels, parent=None):
+    qt.QAbstractTableModel.__init__(self, parent)
+    self.columns = columns
+    self.headerLabels = headerLabels
+    self.displayCallback = None
+    self.decorationCallback = None
+    self.alignments = {}
+    self.frame = None
+    self.columnValues = []
+
+  def setFrame(self, frame):
+    self.beginResetModel()
+    self.frame = frame.reset_index(drop=True) if frame is not None and len(frame) else None
+    self.updateColumnValues()
+    self.endResetModel()
+
+  def updateColumnValues(self):
+    # NumPy views of the displayed columns, so that data() does not go through pandas indexing.
+    # Columns of pandas extension types (categorical and Arrow strings, see IndexCompaction)
+    # mark missing values with pd.NA, which cannot be compared, they are converted to object
+    # arrays with None instead.
+    import numpy as np
+    self.columnValues = []
+    for column in self.columns:
+      if self.frame is not None and column is not None and column in self.frame.columns:
+        values = self.frame[column]
+        if isinstance(values.dtype, np.dtype):
+          self.columnValues.append(values.to_numpy())
+        else:
+          self.columnValues.append(values.to_numpy(dtype=object, na_value=None))
+      else:
+        self.columnValues.append(None)
+
+  def value(self, row, column):
+    return self.frame[column].iat[row]
+
+  def findRow(self, column, value):
+    """Return the first row where column equals value, or -1."""
+    if self.frame is None or column not in self.frame.columns:
+      return -1
+    import numpy as np
+    # compared in pandas, missing values of extension type columns compare as pd.NA
+    rows = np.flatnonzero((self.frame[column] == value).to_numpy(dtype=bool, na_value=False))
+    return int(rows[0]) if len(rows) else -1
+
+  def rowCount(self, parent=None):
+    if (parent is not None and parent.isValid()) or self.frame is None:
+      return 0
+    return len(self.frame)
+
+  def columnCount(self, parent=None):
+    if parent is not None and parent.isValid():
+      return 0
+    return len(self.columns)
+
+  def data(self, index, role=qt.Qt.DisplayRole):
+    if not index.isValid() or self.frame is None:
+      return None
+    row = index.row()
+    column = index.column()
+    if role == qt.Qt.DisplayRole or role == qt.Qt.ToolTipRole:
+      values = self.columnValues[column]
+      if values is None:
+        return self.displayCallback(row, column) if self.displayCallback is not None else None
+      value = values[row]
+      if value is None or value != value:
+        # missing value (None or NaN)
+        return ''
+      return str(value)
+    if role == qt.Qt.DecorationRole and self.decorationCallback is not None:
+      return self.decorationCallback(row, column)
+    if role == qt.Qt.TextAlignmentRole and column in self.alignments:
+      return int(self.alignments[column])
+    return None
+
+  def headerData(self, section, orientation, role=qt.Qt.DisplayRole):
+    if role != qt.Qt.DisplayRole:
+      return None
+    if orientation == qt.Qt.Horizontal:
+      return self.headerLabels[section] if section < len(self.headerLabels) else None
+    return str(section + 1)
+
+  def sort(self, column, order=qt.Qt.AscendingOrder):
+    if self.frame is None or column >= len(self.columns) or self.columns[column] not in self.frame.columns:
+      return
+    columnName = self.columns[column]
+    ascending = order == qt.Qt.AscendingOrder
+    try:
+      sortedFrame = self.frame.sort_values(columnName, ascending=ascending, kind="stable", na_position="last")
+    except TypeError:
+      # mixed value types in an object column, compare as text
+      sortedFrame = self.frame.sort_values(columnName, ascending=ascending, kind="stable", na_position="last",
+                                           key=lambda values: values.astype(str))
+    # Reorder the rows in place rather than resetting the model, so that the
+    # view keeps its selection and current row
+    import numpy as np
+    self.layoutAboutToBeChanged.emit()
+    newRows = np.empty(len(sortedFrame), dtype=np.int64)
+    # frame rows are numbered 0..n-1, so the sorted index holds the previous row of each new row
+    newRows[sortedFrame.index.to_numpy()] = np.arange(len(sortedFrame))
+    self.frame = sortedFrame.reset_index(drop=True)
+    self.updateColumnValues()
+    persistentIndexes = self.persistentIndexList()
+    self.changePersistentIndexList(persistentIndexes,
+      [self.index(int(newRows[index.row()]), index.column()) if index.isValid() else index for index in persistentIndexes])
+    self.layoutChanged.emit()
+
 #
 # qIDCBrowserWidget
 #
@@ -62,6 +185,11 @@ class IDCBrowserWidget(ScriptedLoadableModuleWidget):
     """
     ScriptedLoadableModuleWidget.setup(self)
 
+    # Durations of the setup phases, logged to track module-open latency
+    self.startupTimings = {}
+    self.setupStartTime = time.time()
+    phaseStartTime = self.setupStartTime
+
     # Load settings from the system
     self.settings = qt.QSettings()
 
@@ -83,23 +211,11 @@ class IDCBrowserWidget(ScriptedLoadableModuleWidget):
     logging.info("Checking requirements ...")
     if not self.logic.setupPythonRequirements():
       return
+    phaseStartTime = self.recordStartupPhase("requirements", phaseStartTime)
 
-    from idc_index import index
-
-    qt.QApplication.setOverrideCursor(qt.Qt.WaitCursor)
-
-    logging.info("Initializing IDC client ...")
-    startTime = time.time()
-    self.IDCClient = index.IDCClient()
-    logging.info("IDC Client initialized in {0:.2f} seconds.".format(time.time() - startTime))
-    qt.QApplication.restoreOverrideCursor()
-
-    logging.debug("s5cmd path: " + self.IDCClient.s5cmdPath)
-
-    self.IDCClient.IDCIndexPath = self.logic.getIDCIndexPath()
-    logging.debug("IDCIndex path: " + self.IDCClient.IDCIndexPath)
-
-    logging.info("Initialization done.")
+    # The IDC client loads the full index, it is created in the background
+    # once the panel is shown, see startIDCClientInitialization()
+    self.IDCClient = None
 
     # Load the browser widget UI
     uiFilePath = os.path.join(self.modulePath, 'Resources', 'UI', 'IDCBrowserMain.ui')
@@ -108,12 +224,19 @@ class IDCBrowserWidget(ScriptedLoadableModuleWidget):
     self.browserWidget.setWindowTitle('SlicerIDCBrowser | NCI Imaging Data Commons data release '+self.logic.idc_version)
 
     self.initialConnection = False
-    self.seriesTableRowCount = 0
-    self.studiesTableRowCount = 0
     self.downloadProgressLabels = {}
     self.selectedSeriesNicknamesDic = {}
     self.downloadQueue = {}
+    # SeriesInstanceUID -> DownloadJob priority of queued series that are downloaded first
+    self.downloadPriorities = {}
     self.seriesRowNumber = {}
+    self.seriesToLoad = []
+
+    # Series are downloaded in the background, the timer polls the running transfers
+    self.downloadScheduler = None
+    self.downloadTimer = qt.QTimer()
+    self.downloadTimer.setInterval(500)
+    self.downloadTimer.timeout.connect(self.onDownloadTimer)
 
     self.imagesToDownloadCount = 0
 
@@ -126,22 +249,25 @@ class IDCBrowserWidget(ScriptedLoadableModuleWidget):
     # Flag to track if we're searching specifically for a series (to prevent auto-select all)
     self.isSearchingForSpecificSeries = False
 
+    # Hierarchy queries run in the background, results are picked up by a timer on the GUI thread
+    self.queryExecutor = QueryExecutor()
+    self.queryResultTimer = qt.QTimer()
+    self.queryResultTimer.setInterval(20)
+    self.queryResultTimer.timeout.connect(self.onQueryResultTimer)
+    # (level, identifier) steps of a search result navigation still waiting for query results
+    self.pendingSelection = []
+
     item = qt.QStandardItem()
 
     # Put the files downloaded from IDC in the DICOM database folder by default.
     # This makes downloaded files relocatable along with the DICOM database in
     # recent Slicer versions.
 
+    # The database schema is only updated before the first import, see ensureDICOMDatabase()
+    self.dicomDatabaseChecked = False
     dicomDatabase = slicer.app.dicomDatabase()
     if not os.path.isfile(dicomDatabase.databaseFilename):
-      dicomBrowser = ctk.ctkDICOMBrowser()
-      dicomBrowser.databaseDirectory = dicomDatabase.databaseDirectory
-      dicomBrowser.createNewDatabaseDirectory()
-      dicomDatabase.openDatabase(dicomDatabase.databaseFilename)
-      logging.info("DICOM database created")
-    else:
-      logging.info('DICOM database is available at '+dicomDatabase.databaseFilename)
-      dicomDatabase.updateSchemaIfNeeded()
+      self.ensureDICOMDatabase()
 
     databaseDirectory = dicomDatabase.databaseDirectory
     defaultStoragePath = os.path.join(databaseDirectory, "IDCLocal")
@@ -158,21 +284,12 @@ class IDCBrowserWidget(ScriptedLoadableModuleWidget):
 
     self.cachePath = self.storagePath + "/ServerResponseCache/"
     logging.debug("IDC cache path: " + self.cachePath)
-    self.downloadedSeriesArchiveFile = self.storagePath + 'archive.p'
-    if os.path.isfile(self.downloadedSeriesArchiveFile):
-      print("Reading "+self.downloadedSeriesArchiveFile)
-      f = open(self.downloadedSeriesArchiveFile, 'rb')
-      self.previouslyDownloadedSeries = pickle.load(f)
-      f.close()
-    else:
-      with open(self.downloadedSeriesArchiveFile, 'wb') as f:
-        self.previouslyDownloadedSeries = []
-        pickle.dump(self.previouslyDownloadedSeries, f)
-      f.close()
+    self.logic.setupLocalCatalog(self.storagePath)
 
-    if not os.path.exists(self.cachePath):
-      os.makedirs(self.cachePath)
-    self.useCacheFlag = False
+    self.logic.setupQueryCache(self.cachePath,
+                               slicer.util.settingsValue("IDCBrowser/QueryCacheSizeMB", 256, converter=int))
+    self.logic.useQueryCache = slicer.util.settingsValue("IDCBrowser/UseQueryCache", True, converter=slicer.util.toBool)
+    phaseStartTime = self.recordStartupPhase("local storage", phaseStartTime)
 
     # Load icons
     self.reportIcon = qt.QIcon(self.modulePath + '/Resources/Icons/report.png')
@@ -227,6 +344,14 @@ class IDCBrowserWidget(ScriptedLoadableModuleWidget):
     self.storagePathButton = self.ui.findChild(ctk.ctkDirectoryButton, "storagePathButton")
     self.storageResetButton = self.ui.findChild(qt.QPushButton, "storageResetButton")
     self.webWidgetCheckBox = self.ui.findChild(qt.QCheckBox, "webWidgetCheckBox")
+    self.queryCacheCheckBox = self.ui.findChild(qt.QCheckBox, "queryCacheCheckBox")
+    self.queryCacheStatisticsLabel = self.ui.findChild(qt.QLabel, "queryCacheStatisticsLabel")
+    self.queryCacheClearButton = self.ui.findChild(qt.QPushButton, "queryCacheClearButton")
+    self.concurrentDownloadsSpinBox = self.ui.findChild(qt.QSpinBox, "concurrentDownloadsSpinBox")
+    self.downloadOrderComboBox = self.ui.findChild(qt.QComboBox, "downloadOrderComboBox")
+    self.bandwidthLimitSpinBox = self.ui.findChild(qt.QDoubleSpinBox, "bandwidthLimitSpinBox")
+    self.updateCheckCheckBox = self.ui.findChild(qt.QCheckBox, "updateCheckCheckBox")
+    self.compactIndexCheckBox = self.ui.findChild(qt.QCheckBox, "compactIndexCheckBox")
 
     # Update widgets with dynamic content
     self.browserCollapsibleButton.text = "SlicerIDCBrowser | NCI Imaging Data Commons data release " + self.logic.idc_version
@@ -241,13 +366,13 @@ class IDCBrowserWidget(ScriptedLoadableModuleWidget):
     self.collectionSelector = self.browserWidget.findChild(qt.QComboBox, "collectionSelector")
     self.logoLabel = self.browserWidget.findChild(qt.QLabel, "logoLabel")
     self.patientsCollapsibleGroupBox = self.browserWidget.findChild(ctk.ctkCollapsibleGroupBox, "patientsCollapsibleGroupBox")
-    self.patientsTableWidget = self.browserWidget.findChild(qt.QTableWidget, "patientsTableWidget")
+    self.patientsTableView = self.browserWidget.findChild(qt.QTableView, "patientsTableView")
     self.studiesCollapsibleGroupBox = self.browserWidget.findChild(ctk.ctkCollapsibleGroupBox, "studiesCollapsibleGroupBox")
-    self.studiesTableWidget = self.browserWidget.findChild(qt.QTableWidget, "studiesTableWidget")
+    self.studiesTableView = self.browserWidget.findChild(qt.QTableView, "studiesTableView")
     self.studiesSelectAllButton = self.browserWidget.findChild(qt.QPushButton, "studiesSelectAllButton")
     self.studiesSelectNoneButton = self.browserWidget.findChild(qt.QPushButton, "studiesSelectNoneButton")
     self.seriesCollapsibleGroupBox = self.browserWidget.findChild(ctk.ctkCollapsibleGroupBox, "seriesCollapsibleGroupBox")
-    self.seriesTableWidget = self.browserWidget.findChild(qt.QTableWidget, "seriesTableWidget")
+    self.seriesTableView = self.browserWidget.findChild(qt.QTableView, "seriesTableView")
     self.seriesSelectAllButton = self.browserWidget.findChild(qt.QPushButton, "seriesSelectAllButton")
     self.seriesSelectNoneButton = self.browserWidget.findChild(qt.QPushButton, "seriesSelectNoneButton")
     self.imagesCountLabel = self.browserWidget.findChild(qt.QLabel, "imagesCountLabel")
@@ -256,6 +381,11 @@ class IDCBrowserWidget(ScriptedLoadableModuleWidget):
     self.cancelDownloadButton = self.browserWidget.findChild(qt.QPushButton, "cancelDownloadButton")
     self.statusFrame = self.browserWidget.findChild(qt.QFrame, "statusFrame")
     self.statusLabel = self.browserWidget.findChild(qt.QLabel, "statusLabel")
+    self.facetsCollapsibleGroupBox = self.browserWidget.findChild(ctk.ctkCollapsibleGroupBox, "facetsCollapsibleGroupBox")
+    self.facetsWidget = self.browserWidget.findChild(qt.QWidget, "facetsWidget")
+    self.facetsResultLabel = self.browserWidget.findChild(qt.QLabel, "facetsResultLabel")
+    self.facetsClearButton = self.browserWidget.findChild(qt.QPushButton, "facetsClearButton")
+    self.facetsDownloadButton = self.browserWidget.findChild(qt.QPushButton, "facetsDownloadButton")
 
     # Set up geometry for browser widget
     self.popupGeometry = qt.QRect()
@@ -277,6 +407,20 @@ class IDCBrowserWidget(ScriptedLoadableModuleWidget):
     self.collectionCompleter.setModel(qt.QStringListModel())
     self.collectionSelector.setCompleter(self.collectionCompleter)
 
+    # Set up QCompleter listing incremental search hits while typing
+    self.searchHitLimit = 20
+    self.searchHitsByLabel = {}
+    self.searchCompleter = qt.QCompleter()
+    self.searchCompleter.setCompletionMode(qt.QCompleter.UnfilteredPopupCompletion)
+    self.searchCompleter.setModel(qt.QStringListModel())
+    self.unifiedSearchSelector.setCompleter(self.searchCompleter)
+
+    # Facet lists are created once the index is loaded, see createFacetLists()
+    self.facetValueLimit = 200
+    self.facetSelection = {}
+    self.facetListWidgets = {}
+    self.facetItemValues = {}
+
     # Update logo label with IDC version
     logoLabelText = "IDC release "+self.logic.idc_version
     self.logoLabel.text = logoLabelText
@@ -284,35 +428,37 @@ class IDCBrowserWidget(ScriptedLoadableModuleWidget):
     # Set download destination
     self.downloadDestinationSelector.directory = self.storagePath
 
-    # Configure table widgets
-    self.patientsModel = qt.QStandardItemModel()
+    # Configure table views, they display DataFrame columns through DataFrameTableModel
     self.patientsTableHeaderLabels = ['Patient ID', 'Patient Sex', 'Patient Age']
-    self.patientsTableWidgetHeader = self.patientsTableWidget.horizontalHeader()
-    self.patientsTreeSelectionModel = self.patientsTableWidget.selectionModel()
-    abstractItemView = qt.QAbstractItemView()
-    self.patientsTableWidget.setSelectionBehavior(abstractItemView.SelectRows)
-    verticalheader = self.patientsTableWidget.verticalHeader()
-    verticalheader.setDefaultSectionSize(20)
-
-    self.studiesModel = qt.QStandardItemModel()
+    self.patientsModel = DataFrameTableModel(['PatientID', 'PatientSex', 'PatientAge'], self.patientsTableHeaderLabels)
+    self.patientsModel.decorationCallback = self.patientsTableDecoration
     self.studiesTableHeaderLabels = ['Study Instance UID', 'Study Date', 'Study Description', 'Series Count']
-    self.studiesTableWidget.hideColumn(0)
-    self.studiesTreeSelectionModel = self.studiesTableWidget.selectionModel()
-    self.studiesTableWidget.setSelectionBehavior(abstractItemView.SelectRows)
-    studiesVerticalheader = self.studiesTableWidget.verticalHeader()
-    studiesVerticalheader.setDefaultSectionSize(20)
-    self.studiesTableWidgetHeader = self.studiesTableWidget.horizontalHeader()
-
+    self.studiesModel = DataFrameTableModel(['StudyInstanceUID', 'StudyDate', 'StudyDescription', 'SeriesCount'], self.studiesTableHeaderLabels)
     self.seriesTableHeaderLabels = ['Series Instance UID', 'Status', 'Modality',
                     'Series Date', 'Series Description', 'Body Part Examined',
                     'Series Number','Manufacturer',
                     'Manufacturer Model Name','Instance Count']
-    self.seriesTableWidget.hideColumn(0)
-    self.seriesTreeSelectionModel = self.studiesTableWidget.selectionModel()
-    self.seriesTableWidget.setSelectionBehavior(abstractItemView.SelectRows)
-    seriesVerticalheader = self.seriesTableWidget.verticalHeader()
-    seriesVerticalheader.setDefaultSectionSize(20)
-    self.seriesTableWidgetHeader = self.seriesTableWidget.horizontalHeader()
+    # Status column is not backed by the DataFrame, it only shows the download status icon
+    self.seriesModel = DataFrameTableModel(['SeriesInstanceUID', None, 'Modality',
+                    'SeriesDate', 'SeriesDescription', 'BodyPartExamined',
+                    'SeriesNumber', 'Manufacturer',
+                    'ManufacturerModelName', 'ImageCount'], self.seriesTableHeaderLabels)
+    self.seriesModel.displayCallback = self.seriesTableStatusText
+    self.seriesModel.decorationCallback = self.seriesTableDecoration
+    self.seriesModel.alignments[1] = qt.Qt.AlignCenter
+
+    abstractItemView = qt.QAbstractItemView()
+    for tableView, model in ((self.patientsTableView, self.patientsModel),
+                             (self.studiesTableView, self.studiesModel),
+                             (self.seriesTableView, self.seriesModel)):
+      tableView.setModel(model)
+      tableView.setSelectionBehavior(abstractItemView.SelectRows)
+      tableView.verticalHeader().setDefaultSectionSize(20)
+    self.studiesTableView.hideColumn(0)
+    self.seriesTableView.hideColumn(0)
+    self.patientsTableViewHeader = self.patientsTableView.horizontalHeader()
+    self.studiesTableViewHeader = self.studiesTableView.horizontalHeader()
+    self.seriesTableViewHeader = self.seriesTableView.horizontalHeader()
 
     # Set icons for buttons
     iconSize = qt.QSize(70, 40)
@@ -326,10 +472,13 @@ class IDCBrowserWidget(ScriptedLoadableModuleWidget):
     #
     # delete data context menu
     #
-    self.seriesTableWidget.setContextMenuPolicy(2)
-    self.removeSeriesAction = qt.QAction("Remove from disk", self.seriesTableWidget)
-    self.seriesTableWidget.addAction(self.removeSeriesAction)
+    self.seriesTableView.setContextMenuPolicy(2)
+    self.removeSeriesAction = qt.QAction("Remove from disk", self.seriesTableView)
+    self.seriesTableView.addAction(self.removeSeriesAction)
     # self.removeSeriesAction.enabled = False
+    self.downloadFirstAction = qt.QAction("Download first", self.seriesTableView)
+    self.downloadFirstAction.toolTip = "Download the selected series before the other queued series"
+    self.seriesTableView.addAction(self.downloadFirstAction)
 
     # Configure storage path and settings
     self.storagePathButton.directory = self.storagePath
@@ -341,24 +490,46 @@ class IDCBrowserWidget(ScriptedLoadableModuleWidget):
     if not self.developerMode:
       self.webWidgetCheckBox.hide()
 
+    # Configure query cache checkbox
+    self.queryCacheCheckBox.checked = self.logic.useQueryCache
+    self.updateQueryCacheStatistics()
+
+    # Configure number of concurrent downloads
+    self.concurrentDownloadsSpinBox.value = slicer.util.settingsValue("IDCBrowser/ConcurrentDownloads", 4, converter=int)
+    self.downloadOrderComboBox.currentIndex = 1 if self.downloadOrder() == DownloadScheduler.QUEUE_ORDER else 0
+    self.bandwidthLimitSpinBox.value = slicer.util.settingsValue("IDCBrowser/BandwidthLimitMBps", 0.0, converter=float)
+    self.updateCheckCheckBox.checked = slicer.util.settingsValue("IDCBrowser/CheckForUpdates", True, converter=slicer.util.toBool)
+    self.compactIndexCheckBox.checked = slicer.util.settingsValue("IDCBrowser/CompactIndex", False, converter=slicer.util.toBool)
+
     # Connect signals
     self.showBrowserButton.connect('clicked(bool)', self.onShowBrowserButton)
     self.unifiedSearchSelector.connect('textChanged(QString)', self.onUnifiedSearchTextChanged)
+    self.searchCompleter.connect('activated(QString)', self.onSearchHitActivated)
     self.collectionSelector.connect('currentIndexChanged(QString)', self.collectionSelected)
-    self.patientsTableWidget.connect('itemSelectionChanged()', self.patientsTableSelectionChanged)
-    self.studiesTableWidget.connect('itemSelectionChanged()', self.studiesTableSelectionChanged)
-    self.seriesTableWidget.connect('itemSelectionChanged()', self.seriesSelected)
+    self.patientsTableView.selectionModel().connect('selectionChanged(QItemSelection,QItemSelection)', self.patientsTableSelectionChanged)
+    self.studiesTableView.selectionModel().connect('selectionChanged(QItemSelection,QItemSelection)', self.studiesTableSelectionChanged)
+    self.seriesTableView.selectionModel().connect('selectionChanged(QItemSelection,QItemSelection)', self.seriesSelected)
     self.indexButton.connect('clicked(bool)', self.onIndexButton)
     self.loadButton.connect('clicked(bool)', self.onLoadButton)
     self.cancelDownloadButton.connect('clicked(bool)', self.onCancelDownloadButton)
     self.storagePathButton.connect('directoryChanged(const QString &)', self.onStoragePathButton)
     self.storageResetButton.connect('clicked(bool)', self.onStorageResetButton)
+    self.queryCacheCheckBox.connect('stateChanged(int)', self.onUseCacheStateChanged)
+    self.queryCacheClearButton.connect('clicked(bool)', self.onQueryCacheClearButton)
+    self.concurrentDownloadsSpinBox.connect('valueChanged(int)', self.onConcurrentDownloadsChanged)
+    self.downloadOrderComboBox.connect('currentIndexChanged(int)', self.onDownloadOrderChanged)
+    self.bandwidthLimitSpinBox.connect('valueChanged(double)', self.onBandwidthLimitChanged)
+    self.updateCheckCheckBox.connect('toggled(bool)', self.onUpdateCheckToggled)
+    self.compactIndexCheckBox.connect('toggled(bool)', self.onCompactIndexToggled)
     self.removeSeriesAction.connect('triggered()', self.onRemoveSeriesContextMenuTriggered)
+    self.downloadFirstAction.connect('triggered()', self.onDownloadFirstContextMenuTriggered)
     self.seriesSelectAllButton.connect('clicked(bool)', self.onSeriesSelectAllButton)
     self.seriesSelectNoneButton.connect('clicked(bool)', self.onSeriesSelectNoneButton)
     self.studiesSelectAllButton.connect('clicked(bool)', self.onStudiesSelectAllButton)
     self.studiesSelectNoneButton.connect('clicked(bool)', self.onStudiesSelectNoneButton)
     self.webWidgetCheckBox.connect('toggled(bool)', self.onWebWidgetToggled)
+    self.facetsClearButton.connect('clicked(bool)', self.onFacetsClearButton)
+    self.facetsDownloadButton.connect('clicked(bool)', self.onFacetsDownloadButton)
 
     # Hide the progress bar initially
     self.hideProgressBar()
@@ -390,6 +561,99 @@ class IDCBrowserWidget(ScriptedLoadableModuleWidget):
       self.currentViewArrangement = layoutNode.GetViewArrangement()
       self.previousViewArrangement = layoutNode.GetViewArrangement()
 
+    # Create tab widget for browser and web portal, the portal tab is only created when enabled
+    self.webWidget = None
+    self.tabWidget = qt.QTabWidget()
+    self.tabWidget.setObjectName("IDCBrowserTabWidget")
+    self.tabWidget.addTab(self.browserWidget, "Local Browser")
+    self.viewFactory.setWidget(self.tabWidget)
+    self.updateWebWidgetVisibility()
+    self.recordStartupPhase("user interface", phaseStartTime)
+
+    self.startIDCClientInitialization()
+    self.startPythonRequirementsCheck()
+
+  def recordStartupPhase(self, phase, phaseStartTime):
+    """Record the duration of a setup phase that started at phaseStartTime, return the current time."""
+    now = time.time()
+    self.startupTimings[phase] = now - phaseStartTime
+    logging.debug("IDCBrowser startup phase '{0}' took {1:.2f} seconds".format(phase, now - phaseStartTime))
+    return now
+
+  def startIDCClientInitialization(self):
+    """Load the IDC index in the background, the browser is enabled when it is ready."""
+    self.browserWidget.enabled = False
+    self.showBrowserButton.enabled = False
+    self.showStatus("Loading IDC index", '')
+    self.downloadProgressBar.setMaximum(0)
+    self.downloadProgressBar.setFormat("Loading IDC index ...")
+    self.showProgressBar()
+    self.idcClientStartTime = time.time()
+
+    def onError(error):
+      self.hideProgressBar()
+      self.downloadProgressBar.setMaximum(1000)
+      logging.error("Failed to initialize the IDC client: {0}".format(error))
+      # the browser stays disabled without an index, showing it loads the index again
+      self.showBrowserButton.enabled = True
+      self.showBrowserButton.toolTip = "Loading the IDC index failed, click to try again"
+      response = qt.QMessageBox.critical(slicer.util.mainWindow(),
+                  'SlicerIDCBrowser', "Failed to load the IDC index:\n" + str(error),
+                  qt.QMessageBox.Retry | qt.QMessageBox.Close, qt.QMessageBox.Retry)
+      if response == qt.QMessageBox.Retry:
+        self.startIDCClientInitialization()
+    compact = slicer.util.settingsValue("IDCBrowser/CompactIndex", False, converter=slicer.util.toBool)
+    self.queryExecutor.submit("client", lambda: self.logic.initializeIDCClient(compact), self.onIDCClientInitialized, onError)
+    self.queryResultTimer.start()
+
+  def onIDCClientInitialized(self, client):
+    self.recordStartupPhase("IDC index", self.idcClientStartTime)
+    self.IDCClient = client
+    logging.debug("s5cmd path: " + self.IDCClient.s5cmdPath)
+    self.IDCClient.IDCIndexPath = self.logic.getIDCIndexPath()
+    logging.debug("IDCIndex path: " + self.IDCClient.IDCIndexPath)
+
+    self.hideProgressBar()
+    self.downloadProgressBar.setMaximum(1000)
+    self.browserWidget.enabled = True
+    self.showBrowserButton.toolTip = ""
+    if not self.initialConnection:
+      phaseStartTime = time.time()
+      self.getCollectionValues()
+      self.recordStartupPhase("collections", phaseStartTime)
+    self.createFacetLists()
+    logging.info("Initialization done. Startup took {0:.2f} seconds ({1})".format(
+      time.time() - self.setupStartTime,
+      ", ".join("{0} {1:.2f} s".format(phase, seconds) for phase, seconds in self.startupTimings.items())))
+
+  def waitForIDCClient(self, timeoutSeconds=300):
+    """Process events until the IDC client has been initialized in the background."""
+    startTime = time.time()
+    while self.IDCClient is None and self.queryExecutor.isPending("client") and time.time() - startTime < timeoutSeconds:
+      slicer.app.processEvents()
+      time.sleep(0.01)
+    self.onQueryResultTimer()
+    return self.IDCClient
+
+  def ensureDICOMDatabase(self):
+    """Create the DICOM database if it does not exist yet, otherwise update its schema if needed."""
+    if self.dicomDatabaseChecked:
+      return
+    self.dicomDatabaseChecked = True
+    dicomDatabase = slicer.app.dicomDatabase()
+    if not os.path.isfile(dicomDatabase.databaseFilename):
+      dicomBrowser = ctk.ctkDICOMBrowser()
+      dicomBrowser.databaseDirectory = dicomDatabase.databaseDirectory
+      dicomBrowser.createNewDatabaseDirectory()
+      dicomDatabase.openDatabase(dicomDatabase.databaseFilename)
+      logging.info("DICOM database created")
+    else:
+      logging.info('DICOM database is available at '+dicomDatabase.databaseFilename)
+      dicomDatabase.updateSchemaIfNeeded()
+
+  def createWebWidget(self):
+    """Create the IDC portal tab, this is only done when the tab is first shown."""
+    startTime = time.time()
     self.webWidget = slicer.qSlicerWebWidget()
     self.webWidget.setAcceptDrops(False)
     self.webWidget.webView().setAcceptDrops(False)
@@ -425,22 +689,8 @@ class IDCBrowserWidget(ScriptedLoadableModuleWidget):
 """
     self.webWidget.loadProgress.connect(lambda p: self.webWidget.evalJS(updateStyleJS))
     self.webWidget.url = qt.QUrl("https://portal.imaging.datacommons.cancer.gov/explore/")
-
-    # Create tab widget for browser and web portal
-    self.tabWidget = qt.QTabWidget()
-    self.tabWidget.setObjectName("IDCBrowserTabWidget")
-    self.tabWidget.addTab(self.browserWidget, "Local Browser")
     self.tabWidget.addTab(self.webWidget, "IDC Portal")
-    self.viewFactory.setWidget(self.tabWidget)
-
-    # Initialize browser
-    if self.showBrowserButton != None and self.showBrowserButton.enabled:
-      self.showBrowser()
-    if not self.initialConnection:
-      self.getCollectionValues()
-
-    self.updateWebWidgetVisibility()
-    self.startPythonRequirementsCheck()
+    logging.debug("IDC portal widget created in {0:.2f} seconds".format(time.time() - startTime))
 
   def updateUpgradeRequiredWidget(self):
     """
@@ -457,20 +707,50 @@ class IDCBrowserWidget(ScriptedLoadableModuleWidget):
       self.settings.setValue("IDCBrowser/PipUpdateRequested", False)
       slicer.util.restart()
 
+  def onCompactIndexToggled(self, checked):
+    # the index is loaded once per session
+    self.settings.setValue("IDCBrowser/CompactIndex", checked)
+
+  def onUpdateCheckToggled(self, checked):
+    self.settings.setValue("IDCBrowser/CheckForUpdates", checked)
+    if checked:
+      self.startPythonRequirementsCheck()
+
   def startPythonRequirementsCheck(self):
+    """Check in the background whether a newer idc-index is available on the package index.
+
+    The latest version is cached in the application settings, the package
+    index is queried again only after IDCBrowser/UpdateCheckIntervalHours.
+    Set IDCBrowser/CheckForUpdates to false to disable the check.
+    """
+    if not slicer.util.settingsValue("IDCBrowser/CheckForUpdates", True, converter=slicer.util.toBool):
+      logging.debug("Check for idc-index updates is disabled")
+      return
+    checkIntervalHours = slicer.util.settingsValue("IDCBrowser/UpdateCheckIntervalHours", 24.0, converter=float)
+    lastCheckTime = slicer.util.settingsValue("IDCBrowser/UpdateCheckTime", 0.0, converter=float)
+    if time.time() - lastCheckTime < checkIntervalHours * 3600:
+      logging.debug("Using cached result of the idc-index update check")
+      self.updatePipUpdateRequested(self.settings.value("IDCBrowser/LatestIdcIndexVersion"))
+      return
+    if getattr(self, "pipVersionsProc", None) is not None:
+      # check is already running
+      return
+
     logging.debug("Starting python check")
     pythonSlicerExecutablePath = os.path.dirname(sys.executable) + "/PythonSlicer"
     if os.name == "nt":
         pythonSlicerExecutablePath += ".exe"
 
-    commandLine = [pythonSlicerExecutablePath, "-m", "pip", "list", "--outdated"]
+    # only query the versions of idc-index instead of listing all outdated packages
+    commandLine = [pythonSlicerExecutablePath, "-m", "pip", "index", "versions", "idc-index",
+                   "--disable-pip-version-check", "--timeout", "10"]
 
     import subprocess, tempfile
-    self.pipOutdatedLibrariesOutputFile = tempfile.TemporaryFile()
+    self.pipVersionsOutputFile = tempfile.TemporaryFile()
     startupEnv = slicer.util.startupEnvironment()
-    self.pipOutdatedLibrariesProc = subprocess.Popen(
+    self.pipVersionsProc = subprocess.Popen(
         commandLine,
-        stdout=self.pipOutdatedLibrariesOutputFile,
+        stdout=self.pipVersionsOutputFile,
         stderr=subprocess.DEVNULL,
         env=startupEnv,
     )
@@ -482,30 +762,49 @@ class IDCBrowserWidget(ScriptedLoadableModuleWidget):
     self.pythonRequirementsCheckTimer.start()
 
   def onPythonRequirementsCheckTimeout(self):
-    returnCode = self.pipOutdatedLibrariesProc.poll()
+    returnCode = self.pipVersionsProc.poll()
     if returnCode is None:
         return
 
     self.pythonRequirementsCheckTimer.stop()
-
-    self.pipOutdatedLibrariesOutputFile.seek(0)
-    outdatedLibrariesOutput = self.pipOutdatedLibrariesOutputFile.read().decode()
-    self.pipOutdatedLibrariesOutputFile.close()
-
-    requiredLibraries = [
-      "idc-index"
-    ]
-    outdatedLibraries = []
-    for line in outdatedLibrariesOutput.splitlines():
-      parts = line.split()
-      if len(parts) >= 1 and parts[0] in requiredLibraries:
-          outdatedLibraries.append(parts[0])
-
-    if len(outdatedLibraries) > 0:
-      logging.info(f"Required libraries are outdated: {outdatedLibraries}, updating on restart")
-      self.settings.setValue("IDCBrowser/PipUpdateRequested", True)
-    else:
-      logging.info("Required libraries are up to date")
+    self.pipVersionsProc = None
+
+    self.pipVersionsOutputFile.seek(0)
+    versionsOutput = self.pipVersionsOutputFile.read().decode()
+    self.pipVersionsOutputFile.close()
+
+    # first line of the output is "idc-index (<latest version>)"
+    latestVersion = None
+    if returnCode == 0:
+      for line in versionsOutput.splitlines():
+        parts = line.split()
+        if len(parts) == 2 and parts[0] == "idc-index":
+          latestVersion = parts[1].strip("()")
+          break
+    if latestVersion is None:
+      logging.info("Could not check for idc-index updates, will try again after the check interval")
+
+    # failed checks are cached as well, so offline computers do not retry in every session
+    self.settings.setValue("IDCBrowser/UpdateCheckTime", time.time())
+    if latestVersion is not None:
+      self.settings.setValue("IDCBrowser/LatestIdcIndexVersion", latestVersion)
+    self.updatePipUpdateRequested(latestVersion)
+
+  def updatePipUpdateRequested(self, latestVersion):
+    """Request an idc-index update on restart if latestVersion is newer than the installed version."""
+    if latestVersion:
+      try:
+        from importlib.metadata import version
+        installedVersion = version("idc-index")
+        outdated = pkg_resources.parse_version(latestVersion) > pkg_resources.parse_version(installedVersion)
+      except Exception as error:
+        logging.debug("Failed to compare idc-index versions: {0}".format(error))
+        outdated = False
+      if outdated:
+        logging.info(f"idc-index {installedVersion} is outdated, {latestVersion} is available, updating on restart")
+      else:
+        logging.info("Required libraries are up to date")
+      self.settings.setValue("IDCBrowser/PipUpdateRequested", outdated)
 
     self.updateUpgradeRequiredWidget()
 
@@ -543,9 +842,19 @@ class IDCBrowserWidget(ScriptedLoadableModuleWidget):
               self.dataProbeHasBeenTemporarilyHidden = False
 
   def cleanup(self):
-    pass
+    self.downloadTimer.stop()
+    if self.downloadScheduler is not None:
+      self.downloadScheduler.cancel()
+    self.queryResultTimer.stop()
+    self.queryExecutor.shutdown()
 
   def onShowBrowserButton(self):
+    if self.IDCClient is None and not self.queryExecutor.isPending("client"):
+      # loading the index failed before, try again
+      self.startIDCClientInitialization()
+    elif self.IDCClient is not None and not self.initialConnection:
+      # getting the collections failed before, try again
+      self.getCollectionValues()
     if self.showBrowserButton.checked:
       self.showBrowser()
     else:
@@ -562,13 +871,18 @@ class IDCBrowserWidget(ScriptedLoadableModuleWidget):
 
   def onUnifiedSearchTextChanged(self, searchText):
     """
-    Debounce the search - restarts the timer on each text change.
+    Update incremental search hits and debounce the exact match search - restarts the timer on each text change.
     """
+    if searchText in self.searchHitsByLabel:
+      # text was set by the search completer, handled in onSearchHitActivated
+      return
     self.pendingSearchText = searchText.strip()
     if not self.pendingSearchText:
       self.searchWarningLabel.hide()
       return
 
+    self.updateSearchHits(self.pendingSearchText)
+
     # Reset the timer on each keystroke
     self.searchDebounceTimer.stop()
     self.searchDebounceTimer.start()
@@ -595,185 +909,274 @@ class IDCBrowserWidget(ScriptedLoadableModuleWidget):
     self.isSearchingForSpecificSeries = False
 
     # Clear existing selections before starting search
-    self.patientsTableWidget.clearSelection()
-    self.studiesTableWidget.clearSelection()
-    self.seriesTableWidget.clearSelection()
+    self.patientsTableView.clearSelection()
+    self.studiesTableView.clearSelection()
+    self.seriesTableView.clearSelection()
 
     # Check if IDCClient is initialized
-    if not hasattr(self, 'IDCClient') or self.IDCClient is None:
+    if not hasattr(self, 'IDCClient') or self.IDCClient is None or self.logic.identifierIndex is None:
       logging.error("IDCClient not initialized")
       self.searchWarningLabel.setText('Search unavailable - IDC client not initialized.')
       self.searchWarningLabel.show()
       return
 
-    matchFound = False
-
     try:
-      # First, check if it matches a collection_id
-      collections = self.IDCClient.get_collections()
-      logging.debug(f"Checking against {len(collections)} collections")
-      if searchText in collections:
-        matchFound = True
-        logging.info(f"Found matching collection: {searchText}")
-        # Select the collection in the combo box
-        index = self.collectionSelector.findText(searchText)
-        if index >= 0:
-          logging.debug(f"Selecting collection at index {index}")
-          self.collectionSelector.setCurrentIndex(index)
-          return
-        else:
-          logging.warning(f"Collection '{searchText}' found in list but not in combo box")
-
-      # Check if it matches a PatientID
-      try:
-        # Search across all collections for this patient
-        logging.debug(f"Searching for PatientID: {searchText}")
-        patient_matches = self.IDCClient.index[self.IDCClient.index['PatientID'] == searchText]
-        if not patient_matches.empty:
-          matchFound = True
-          # Get the collection for this patient
-          collection_id = patient_matches.iloc[0]['collection_id']
-          logging.info(f"Found patient '{searchText}' in collection '{collection_id}'")
-          # Select the collection
-          index = self.collectionSelector.findText(collection_id)
-          if index >= 0:
-            self.collectionSelector.setCurrentIndex(index)
-            self.selectPatientInTable(searchText)
-          else:
-            self.searchWarningLabel.setText('Collection for the found series is not available in the selector.')
-            self.searchWarningLabel.show()
-          return
-      except Exception as e:
-        logging.debug(f"Error searching for PatientID: {e}")
-
-      # Check if it matches a StudyInstanceUID
-      if '.' in searchText:
-        try:
-          logging.debug(f"Searching for StudyInstanceUID: {searchText}")
-          study_matches = self.IDCClient.index[self.IDCClient.index['StudyInstanceUID'] == searchText]
-          if not study_matches.empty:
-            matchFound = True
-            # Get collection and patient for this study
-            collection_id = study_matches.iloc[0]['collection_id']
-            patient_id = study_matches.iloc[0]['PatientID']
-            logging.info(f"Found study '{searchText}' for patient '{patient_id}' in collection '{collection_id}'")
-            # Select collection
-            index = self.collectionSelector.findText(collection_id)
-            if index >= 0:
-              self.collectionSelector.setCurrentIndex(index)
-              self.selectPatientAndStudy(patient_id, searchText)
-            else:
-              self.searchWarningLabel.setText('Collection for the found series is not available in the selector.')
-              self.searchWarningLabel.show()
-            return
-        except Exception as e:
-          logging.debug(f"Error searching for StudyInstanceUID: {e}")
-
-        # Check if it matches a SeriesInstanceUID
-        try:
-          logging.debug(f"Searching for SeriesInstanceUID: {searchText}")
-          series_matches = self.IDCClient.index[self.IDCClient.index['SeriesInstanceUID'] == searchText]
-          if not series_matches.empty:
-            matchFound = True
-            # Get collection, patient, and study for this series
-            collection_id = series_matches.iloc[0]['collection_id']
-            patient_id = series_matches.iloc[0]['PatientID']
-            study_uid = series_matches.iloc[0]['StudyInstanceUID']
-            logging.info(f"Found series '{searchText}' for study '{study_uid}' in collection '{collection_id}'")
-            # Set flag to prevent auto-selecting all series
-            self.isSearchingForSpecificSeries = True
-            # Select collection
-            index = self.collectionSelector.findText(collection_id)
-            if index >= 0:
-              self.collectionSelector.setCurrentIndex(index)
-              self.selectPatientStudyAndSeries(patient_id, study_uid, searchText)
-            else:
-              self.searchWarningLabel.setText('Collection for the found series is not available in the selector.')
-              self.searchWarningLabel.show()
-            return
-        except Exception as e:
-          logging.debug(f"Error searching for SeriesInstanceUID: {e}")
-
-      # If no match found, show warning
-      if not matchFound:
+      match = self.logic.identifierIndex.lookup(searchText)
+      if match is None:
         self.searchWarningLabel.setText('No matching collection, patient, study, or series found.')
         self.searchWarningLabel.show()
+        return
+
+      level, (collection_id, patient_id, study_uid) = match
+      logging.info(f"Found {level} '{searchText}' in collection '{collection_id}'")
+      seriesUID = searchText if level == "series" else None
+      self.showSearchResult(level, collection_id, patient_id, study_uid, seriesUID)
 
     except Exception as error:
       logging.error(f"Error in unified search: {error}")
       self.searchWarningLabel.setText('Error performing search.')
       self.searchWarningLabel.show()
 
-  def selectPatientInTable(self, patientID):
-    """Select a patient in the patients table."""
-    for row in range(self.patientsTableWidget.rowCount):
-      item = self.patientsTableWidget.item(row, 0)
-      if item and item.text() == patientID:
-        self.patientsTableWidget.selectRow(row)
-        break
+  def showSearchResult(self, level, collectionID, patientID=None, studyUID=None, seriesUID=None):
+    """Select the collection, patient, study and series of a search result in the browser."""
+    if level == "series":
+      # Set flag to prevent auto-selecting all series
+      self.isSearchingForSpecificSeries = True
+
+    # Select the collection in the combo box
+    index = self.collectionSelector.findText(collectionID)
+    if index < 0:
+      if level == "collection":
+        logging.warning(f"Collection '{collectionID}' found in list but not in combo box")
+      else:
+        self.searchWarningLabel.setText('Collection for the found series is not available in the selector.')
+        self.searchWarningLabel.show()
+      return
 
-  def selectPatientAndStudy(self, patientID, studyUID):
-    """Select a patient and then a study in the tables."""
-    self.selectPatientInTable(patientID)
-    self.selectStudyInTable(studyUID)
+    # Tables are populated asynchronously, so the selection of each level is
+    # applied once the query of that level has delivered its results.
+    self.pendingSelection = []
+    if level in ("patient", "study", "series"):
+      self.pendingSelection.append(("patient", patientID))
+    if level in ("study", "series"):
+      self.pendingSelection.append(("study", studyUID))
+    if level == "series":
+      self.pendingSelection.append(("series", seriesUID))
+    self.collectionSelector.setCurrentIndex(index)
+    self.applyPendingSelection()
+
+  def applyPendingSelection(self):
+    """Select the next levels of a search result whose tables are populated."""
+    selectors = {
+      "patient": self.selectPatientInTable,
+      "study": self.selectStudyInTable,
+      "series": self.selectSeriesInTable,
+    }
+    channels = {"patient": "patients", "study": "studies", "series": "series"}
+    while self.pendingSelection:
+      level, identifier = self.pendingSelection[0]
+      if self.queryExecutor.isPending(channels[level]):
+        return
+      self.pendingSelection.pop(0)
+      if not selectors[level](identifier):
+        self.pendingSelection = []
+        self.isSearchingForSpecificSeries = False
+        return
 
-  def selectPatientStudyAndSeries(self, patientID, studyUID, seriesUID):
-    """Select a patient, study, and series in the tables."""
-    self.selectPatientInTable(patientID)
-    self.selectStudyAndSeries(studyUID, seriesUID)
+  def updateSearchHits(self, searchText):
+    """Show prefix and substring matches for the text typed so far in the search completer."""
+    if self.logic.incrementalSearch is None:
+      return
+    startTime = time.time()
+    hits = self.logic.incrementalSearch.search(searchText, limit=self.searchHitLimit)
+    logging.debug("Incremental search for '{0}' returned {1} hits in {2:.1f} ms".format(
+      searchText, len(hits), (time.time() - startTime) * 1000))
+    fieldLabels = {
+      "collection_id": "Collection",
+      "PatientID": "Patient ID",
+      "StudyInstanceUID": "Study UID",
+      "SeriesInstanceUID": "Series UID",
+      "StudyDescription": "Study Description",
+      "SeriesDescription": "Series Description",
+    }
+    self.searchHitsByLabel = {}
+    for hit in hits:
+      label = "{}  [{}".format(hit.value, fieldLabels.get(hit.field, hit.field))
+      if hit.level != "collection":
+        label += " in " + str(hit.path[0])
+      label += "]"
+      self.searchHitsByLabel[label] = hit
+    self.searchCompleter.model().setStringList(list(self.searchHitsByLabel.keys()))
+    if hits:
+      self.searchCompleter.complete()
+
+  def onSearchHitActivated(self, label):
+    hit = self.searchHitsByLabel.get(label)
+    if hit is None:
+      return
+    self.searchDebounceTimer.stop()
+    # The completer has already replaced the search text with the label, show the value instead
+    wasBlocked = self.unifiedSearchSelector.blockSignals(True)
+    self.unifiedSearchSelector.setText(hit.value)
+    self.unifiedSearchSelector.blockSignals(wasBlocked)
+    self.searchWarningLabel.hide()
+    self.isSearchingForSpecificSeries = False
+    self.patientsTableView.clearSelection()
+    self.studiesTableView.clearSelection()
+    self.seriesTableView.clearSelection()
+    collectionID, patientID, studyUID, seriesUID = hit.path
+    self.showSearchResult(hit.level, collectionID, patientID, studyUID, seriesUID)
 
-  def selectStudyInTable(self, studyUID):
-    """Select a study in the studies table."""
-    for row in range(self.studiesTableWidget.rowCount):
-      item = self.studiesTableWidget.item(row, 0)
-      if item and item.text() == studyUID:
-        self.studiesTableWidget.selectRow(row)
-        break
+  def selectedRows(self, tableView):
+    """Return the sorted row indices selected in a table view."""
+    return sorted(index.row() for index in tableView.selectionModel().selectedRows())
+
+  def selectPatientInTable(self, patientID):
+    """Select a patient in the patients table, return False if it is not listed."""
+    row = self.patientsModel.findRow('PatientID', patientID)
+    if row >= 0:
+      self.patientsTableView.selectRow(row)
+    return row >= 0
 
-  def selectStudyAndSeries(self, studyUID, seriesUID):
-    """Select a study and then a series in the tables."""
-    self.selectStudyInTable(studyUID)
-    self.selectSeriesInTable(seriesUID)
+  def selectStudyInTable(self, studyUID):
+    """Select a study in the studies table, return False if it is not listed."""
+    row = self.studiesModel.findRow('StudyInstanceUID', studyUID)
+    if row >= 0:
+      self.studiesTableView.selectRow(row)
+    return row >= 0
 
   def selectSeriesInTable(self, seriesUID):
-    """Select a series in the series table."""
+    """Select a series in the series table, return False if it is not listed."""
     try:
-      for row in range(self.seriesTableWidget.rowCount):
-        item = self.seriesTableWidget.item(row, 0)
-        if item and item.text() == seriesUID:
-          self.seriesTableWidget.selectRow(row)
-          break
-      # Reset the series-specific search flag after series selection completes
+      row = self.seriesModel.findRow('SeriesInstanceUID', seriesUID)
+      if row >= 0:
+        self.seriesTableView.selectRow(row)
+      return row >= 0
     finally:
+      # Reset the series-specific search flag after series selection completes
       self.isSearchingForSpecificSeries = False
 
+  def submitQuery(self, channel, function, callback, errorContext):
+    """Run a hierarchy query in the background and pass its result to callback on the GUI thread."""
+    def onError(error):
+      self.clearStatus()
+      self.pendingSelection = []
+      self.isSearchingForSpecificSeries = False
+      message = errorContext + ": Error in getting response from IDC server.\nHTTP Error:\n" + str(error)
+      qt.QMessageBox.critical(slicer.util.mainWindow(),
+                  'SlicerIDCBrowser', message, qt.QMessageBox.Ok)
+    self.queryExecutor.submit(channel, function, callback, onError)
+    self.queryResultTimer.start()
+
+  def waitForQueries(self, timeoutSeconds=60):
+    """Process events until all submitted queries have delivered their results (used in tests)."""
+    startTime = time.time()
+    while self.queryExecutor.hasPending() and time.time() - startTime < timeoutSeconds:
+      slicer.app.processEvents()
+      time.sleep(0.01)
+    self.onQueryResultTimer()
+
+  def waitForDownloads(self, timeoutSeconds=600):
+    """Process events until the background downloads have finished (used in tests)."""
+    startTime = time.time()
+    while self.downloadTimer.isActive() and time.time() - startTime < timeoutSeconds:
+      slicer.app.processEvents()
+      time.sleep(0.05)
+
+  def onQueryResultTimer(self):
+    self.queryExecutor.processResults()
+    if not self.queryExecutor.hasPending():
+      self.queryResultTimer.stop()
+      self.clearStatus()
+
   def onUseCacheStateChanged(self, state):
-    if state == 0:
-      self.useCacheFlag = False
-    elif state == 2:
-      self.useCacheFlag = True
+    self.logic.useQueryCache = (state == qt.Qt.Checked)
+    self.settings.setValue("IDCBrowser/UseQueryCache", self.logic.useQueryCache)
+
+  def onConcurrentDownloadsChanged(self, value):
+    self.settings.setValue("IDCBrowser/ConcurrentDownloads", value)
+    if self.downloadScheduler is not None:
+      self.downloadScheduler.maxConcurrent = value
+
+  def downloadOrder(self):
+    return slicer.util.settingsValue("IDCBrowser/DownloadOrder", DownloadScheduler.SMALLEST_FIRST)
+
+  def bandwidthLimit(self):
+    """Return the download bandwidth limit in bytes per second, or None if unlimited."""
+    limit = slicer.util.settingsValue("IDCBrowser/BandwidthLimitMBps", 0.0, converter=float)
+    return limit * 1000 * 1000 if limit > 0 else None
+
+  def onDownloadOrderChanged(self, index):
+    order = DownloadScheduler.QUEUE_ORDER if index == 1 else DownloadScheduler.SMALLEST_FIRST
+    self.settings.setValue("IDCBrowser/DownloadOrder", order)
+    if self.downloadScheduler is not None:
+      self.downloadScheduler.order = order
+
+  def onBandwidthLimitChanged(self, value):
+    self.settings.setValue("IDCBrowser/BandwidthLimitMBps", value)
+    if self.downloadScheduler is not None:
+      self.downloadScheduler.bandwidthLimit = self.bandwidthLimit()
+
+  def onQueryCacheClearButton(self):
+    self.logic.memoryCache.clear()
+    if self.logic.queryCache is not None:
+      self.logic.queryCache.clear()
+    self.updateQueryCacheStatistics()
+
+  def updateQueryCacheStatistics(self):
+    if self.logic.queryCache is None:
+      self.queryCacheStatisticsLabel.text = ""
+      return
+    statistics = self.logic.queryCache.statistics()
+    self.queryCacheStatisticsLabel.text = "{} hits, {} misses, {:.1f} MB".format(
+      statistics["hits"], statistics["misses"], statistics["sizeBytes"] / (1024 * 1024))
+    self.queryCacheStatisticsLabel.toolTip = "Session memory cache: {} entries, {:.0%} hit rate".format(
+      len(self.logic.memoryCache), self.logic.memoryCache.hitRate())
 
   def onContextMenuTriggered(self):
     self.clinicalPopup.getData(self.selectedCollection, self.selectedPatient)
 
   def onRemoveSeriesContextMenuTriggered(self):
-    removeList = []
-    for uid in self.seriesInstanceUIDs:
-      if uid.isSelected():
-        removeList.append(uid.text())
-    with open(self.downloadedSeriesArchiveFile, 'rb') as f:
-      self.previouslyDownloadedSeries = pickle.load(f)
-    f.close()
-    updatedDownloadSeries = []
-    for item in self.previouslyDownloadedSeries:
-      if item not in removeList:
-        updatedDownloadSeries.append(item)
-    with open(self.downloadedSeriesArchiveFile, 'wb') as f:
-      pickle.dump(updatedDownloadSeries,f)
-    f.close()
-    self.previouslyDownloadedSeries = updatedDownloadSeries
+    removeList = [self.seriesModel.value(row, 'SeriesInstanceUID') for row in self.selectedRows(self.seriesTableView)]
+    removeList = [seriesUID for seriesUID in removeList if seriesUID in self.logic.localCatalog]
+    if self.downloadScheduler is not None:
+      # the files of a series being downloaded or imported cannot be deleted yet
+      removeList = [seriesUID for seriesUID in removeList
+                    if self.downloadScheduler.job(seriesUID) is None or self.downloadScheduler.job(seriesUID).finished]
+    if not removeList:
+      return
+    response = qt.QMessageBox.question(
+      slicer.util.mainWindow(), 'SlicerIDCBrowser',
+      "Delete the downloaded files of {0} series from disk and remove them from the DICOM database?".format(len(removeList)),
+      qt.QMessageBox.Yes | qt.QMessageBox.No, qt.QMessageBox.No)
+    if response != qt.QMessageBox.Yes:
+      return
+    self.ensureDICOMDatabase()
+    errors = self.logic.removeDownloadedSeries(removeList, self.storagePath)
+    if errors:
+      qt.QMessageBox.warning(slicer.util.mainWindow(), 'SlicerIDCBrowser',
+                             "Failed to delete {0} series:\n".format(len(errors)) + "\n".join(errors[:5]))
     self.studiesTableSelectionChanged()
 
+  def onDownloadFirstContextMenuTriggered(self):
+    """Download the selected series ahead of the series already queued."""
+    seriesUIDs = [self.seriesModel.value(row, 'SeriesInstanceUID') for row in self.selectedRows(self.seriesTableView)]
+    if not seriesUIDs:
+      return
+    # lower priorities start first, the latest request goes ahead of earlier ones
+    priority = -1
+    if self.downloadScheduler is not None and not self.downloadScheduler.isFinished():
+      priority = min([job.priority for job in self.downloadScheduler.jobs] + [0]) - 1
+    for seriesUID in seriesUIDs:
+      job = self.downloadScheduler.job(seriesUID) if self.downloadScheduler is not None else None
+      if job is None or job.finished:
+        self.downloadQueue[seriesUID] = self.storagePath
+        self.downloadPriorities[seriesUID] = priority
+      else:
+        # already queued or being checked, a running transfer is not affected
+        job.priority = priority
+    self.downloadSelectedSeries()
+
   def showBrowser(self):
     slicer.app.layoutManager().setLayout(self.IDCBrowserLayout)
 
@@ -822,13 +1225,16 @@ class IDCBrowserWidget(ScriptedLoadableModuleWidget):
       self.clearStatus()
 
     except Exception as error:
-      self.connectButton.enabled = True
+      # showing the browser tries again
+      self.initialConnection = False
       self.clearStatus()
       message = "getCollectionValues: Error in getting response from IDC server.\nHTTP Error:\n" + str(error)
       qt.QMessageBox.critical(slicer.util.mainWindow(),
                   'SlicerIDCBrowser', message, qt.QMessageBox.Ok)
     self.showBrowserButton.enabled = True
-    self.showBrowser()
+    # the index is loaded in the background, the user may have switched to another module meanwhile
+    if self.parent.isEntered:
+      self.showBrowser()
 
   def enter(self):
     qt.QTimer.singleShot(0, self.showBrowser)
@@ -837,16 +1243,116 @@ class IDCBrowserWidget(ScriptedLoadableModuleWidget):
     self.closeBrowser()
 
   def onStudiesSelectAllButton(self):
-    self.studiesTableWidget.selectAll()
+    self.studiesTableView.selectAll()
 
   def onStudiesSelectNoneButton(self):
-    self.studiesTableWidget.clearSelection()
+    self.studiesTableView.clearSelection()
 
   def onSeriesSelectAllButton(self):
-    self.seriesTableWidget.selectAll()
+    self.seriesTableView.selectAll()
 
   def onSeriesSelectNoneButton(self):
-    self.seriesTableWidget.clearSelection()
+    self.seriesTableView.clearSelection()
+
+  def createFacetLists(self):
+    """Add a list of checkable values for each facet of the index to the filters panel."""
+    layout = self.facetsWidget.layout()
+    while layout.count():
+      widget = layout.takeAt(0).widget()
+      if widget:
+        widget.deleteLater()
+    self.facetSelection = {}
+    self.facetListWidgets = {}
+    self.facetItemValues = {}
+    facetIndex = self.logic.facetIndex
+    if facetIndex is None:
+      return
+    for facet in facetIndex.facets:
+      groupBox = qt.QGroupBox(facetIndex.labels[facet])
+      groupBoxLayout = qt.QVBoxLayout(groupBox)
+      listWidget = qt.QListWidget()
+      listWidget.setObjectName(facet + "FacetList")
+      listWidget.connect('itemChanged(QListWidgetItem*)', lambda item, facet=facet: self.onFacetItemChanged(facet, item))
+      groupBoxLayout.addWidget(listWidget)
+      layout.addWidget(groupBox)
+      self.facetListWidgets[facet] = listWidget
+    self.updateFacets()
+
+  def updateFacets(self):
+    """Show the value counts of all facets for the current selection."""
+    facetIndex = self.logic.facetIndex
+    if facetIndex is None:
+      return
+    startTime = time.time()
+    counts = facetIndex.counts(self.facetSelection)
+    for facet, listWidget in self.facetListWidgets.items():
+      selectedValues = self.facetSelection.get(facet, set())
+      hiddenCount = max(len(counts[facet]) - self.facetValueLimit, 0)
+      valueCounts = counts[facet][:self.facetValueLimit]
+      # selected values stay listed even if other filters leave no series for them
+      listedValues = set(value for value, _ in valueCounts)
+      valueCounts += [(value, 0) for value in selectedValues if value not in listedValues]
+      wasBlocked = listWidget.blockSignals(True)
+      listWidget.clear()
+      self.facetItemValues[facet] = []
+      for value, count in valueCounts:
+        item = qt.QListWidgetItem("{0} ({1})".format("(not specified)" if value is None else value, count))
+        item.setFlags(qt.Qt.ItemIsUserCheckable | qt.Qt.ItemIsEnabled)
+        item.setCheckState(qt.Qt.Checked if value in selectedValues else qt.Qt.Unchecked)
+        listWidget.addItem(item)
+        self.facetItemValues[facet].append(value)
+      if hiddenCount:
+        # last row, it has no entry in facetItemValues and cannot be checked
+        item = qt.QListWidgetItem("{0} more values, select other filters to narrow the list".format(hiddenCount))
+        item.setFlags(qt.Qt.NoItemFlags)
+        listWidget.addItem(item)
+      listWidget.blockSignals(wasBlocked)
+    matchCount = len(facetIndex.rows(self.facetSelection)) if self.facetSelection else 0
+    if self.facetSelection:
+      self.facetsResultLabel.text = "{0} series match the selected filters".format(matchCount)
+    else:
+      self.facetsResultLabel.text = "No filter selected"
+    self.facetsDownloadButton.enabled = matchCount > 0
+    logging.debug("Facet counts updated in {0:.1f} ms".format((time.time() - startTime) * 1000))
+
+  def onFacetItemChanged(self, facet, item):
+    value = self.facetItemValues[facet][self.facetListWidgets[facet].row(item)]
+    selectedValues = self.facetSelection.setdefault(facet, set())
+    if item.checkState() == qt.Qt.Checked:
+      selectedValues.add(value)
+    else:
+      selectedValues.discard(value)
+    if not selectedValues:
+      del self.facetSelection[facet]
+    self.updateFacets()
+
+  def onFacetsClearButton(self):
+    self.facetSelection = {}
+    self.updateFacets()
+
+  def onFacetsDownloadButton(self):
+    """Download and index the series matching the selected filters."""
+    seriesUIDs = self.logic.facetIndex.seriesInstanceUIDs(self.facetSelection)
+    if not seriesUIDs:
+      return
+    sizeMB = sum(float(size or 0) for size in self.logic.seriesLookup.values(seriesUIDs, "series_size_MB").values())
+    response = qt.QMessageBox.question(
+      slicer.util.mainWindow(),
+      'SlicerIDCBrowser',
+      # series_size_MB is in units of 10^6 bytes
+      "Download {0} series ({1:.1f} GB) matching the selected filters?".format(len(seriesUIDs), sizeMB / 1000),
+      qt.QMessageBox.Yes | qt.QMessageBox.No,
+      qt.QMessageBox.Yes
+      )
+    if response != qt.QMessageBox.Yes:
+      return
+    self.loadToScene = False
+    self.downloadQueue = {}
+    self.seriesRowNumber = {}
+    for seriesUID in seriesUIDs:
+      self.downloadQueue[seriesUID] = self.storagePath
+    self.addReferencedSeriesToDownloadQueue(seriesUIDs)
+    self.downloadSelectedSeries()
 
   def onWebWidgetToggled(self, checked):
     self.settings.setValue("IDCBrowser/ShowWebWidget", checked)
@@ -856,14 +1362,16 @@ class IDCBrowserWidget(ScriptedLoadableModuleWidget):
     if self.tabWidget is None:
       return
     showWebWidget = slicer.util.settingsValue("IDCBrowser/ShowWebWidget", False, converter=slicer.util.toBool)
+    if showWebWidget and self.webWidget is None:
+      self.createWebWidget()
     self.tabWidget.tabBar().setVisible(showWebWidget)
 
   def collectionSelected(self, item):
     self.loadButton.enabled = False
     self.indexButton.enabled = False
-    self.clearPatientsTableWidget()
-    self.clearStudiesTableWidget()
-    self.clearSeriesTableWidget()
+    self.clearPatientsTable()
+    self.clearStudiesTable()
+    self.clearSeriesTable()
     self.selectedCollection = item
 
     if not self.selectedCollection:
@@ -874,7 +1382,6 @@ class IDCBrowserWidget(ScriptedLoadableModuleWidget):
       self.logoLabel.setText("IDC release " + self.logic.idc_version)
       return
 
-    cacheFile = self.cachePath + self.selectedCollection + '.json'
     self.progressMessage = "Getting available patients for collection: " + self.selectedCollection
 
     # make collection summary
@@ -885,180 +1392,88 @@ class IDCBrowserWidget(ScriptedLoadableModuleWidget):
       summary_text = "Modalities: "+str(collection_summary.Modality).replace('\'','')+" Total size: "+str(round(float(collection_summary.series_size_MB),2))+" MB"
     self.logoLabel.setText(summary_text)
 
-    patientsList = None
-    if os.path.isfile(cacheFile) and self.useCacheFlag:
-      f = codecs.open(cacheFile, 'rb', encoding='utf8')
-      patientsList = f.read()[:]
-      f.close()
-
-      if not len(patientsList):
-        patientsList = None
-
-    if patientsList:
-      self.populatePatientsTableWidget(patientsList)
-      self.clearStatus()
-      #groupBoxTitle = 'Patients (Accessed: ' + time.ctime(os.path.getmtime(cacheFile)) + ')'
-      groupBoxTitle = 'Patients'
-      self.patientsCollapsibleGroupBox.setTitle(groupBoxTitle)
-
-    else:
-      try:
-        responseString = self.IDCClient.get_patients(collection_id=self.selectedCollection)
-        '''
-        with open(cacheFile, 'w') as outputFile:
-          self.stringBufferReadWrite(outputFile, response)
-        outputFile.close()
-        f = codecs.open(cacheFile, 'r', encoding='utf8')
-        responseString = f.read()
-        '''
-        self.populatePatientsTableWidget(responseString)
-        #groupBoxTitle = 'Patients (Accessed: ' + time.ctime(os.path.getmtime(cacheFile)) + ')'
-        groupBoxTitle = 'Patients'
-        self.patientsCollapsibleGroupBox.setTitle(groupBoxTitle)
-        self.clearStatus()
+    self.showStatus(self.progressMessage)
+    collectionID = self.selectedCollection
+    self.submitQuery("patients", lambda: self.logic.getPatients(collectionID),
+                     self.onPatientsQueryFinished, "collectionSelected")
 
-      except Exception as error:
-        self.clearStatus()
-        message = "collectionSelected: Error in getting response from IDC server.\nHTTP Error:\n" + str(error)
-        qt.QMessageBox.critical(slicer.util.mainWindow(),
-                    'SlicerIDCBrowser', message, qt.QMessageBox.Ok)
-
-  def patientsTableSelectionChanged(self):
-    self.clearStudiesTableWidget()
-    self.clearSeriesTableWidget()
-    self.studiesTableRowCount = 0
-    self.numberOfSelectedPatients = 0
-    for n in range(len(self.patientsIDs)):
-      if self.patientsIDs[n].isSelected():
-        self.numberOfSelectedPatients += 1
-        self.patientSelected(n)
-
-  def patientSelected(self, row):
+  def onPatientsQueryFinished(self, patients):
+    self.populatePatientsTable(patients)
+    self.patientsCollapsibleGroupBox.setTitle('Patients')
+    self.clearStatus()
+    self.updateQueryCacheStatistics()
+    self.applyPendingSelection()
+
+  def patientsTableSelectionChanged(self, selected=None, deselected=None):
+    self.clearStudiesTable()
+    self.clearSeriesTable()
+    selectedRows = self.selectedRows(self.patientsTableView)
+    self.numberOfSelectedPatients = len(selectedRows)
+    if selectedRows:
+      self.patientsSelected(self.patientsModel.frame['PatientID'].iloc[selectedRows].tolist())
+
+  def patientsSelected(self, patientIDs):
+    """Show the studies of all selected patients, resolved in a single query."""
     self.loadButton.enabled = False
     self.indexButton.enabled = False
-    # self.clearStudiesTableWidget()
-    self.clearSeriesTableWidget()
-    self.selectedPatient = self.patientsIDs[row].text()
-    cacheFile = self.cachePath + self.selectedPatient + '.json'
-    self.progressMessage = "Getting available studies for patient ID: " + self.selectedPatient
-    self.showStatus(self.progressMessage)
-    if os.path.isfile(cacheFile) and self.useCacheFlag:
-      f = codecs.open(cacheFile, 'rb', encoding='utf8')
-      responseString = f.read()[:]
-      f.close()
-      self.populateStudiesTableWidget(responseString)
-      self.clearStatus()
-      if self.numberOfSelectedPatients == 1:
-        #groupBoxTitle = 'Studies (Accessed: ' + time.ctime(os.path.getmtime(cacheFile)) + ')'
-        groupBoxTitle = 'Studies '
-      else:
-        groupBoxTitle = 'Studies '
-
-      self.studiesCollapsibleGroupBox.setTitle(groupBoxTitle)
-
+    self.selectedPatient = patientIDs[-1]
+    if len(patientIDs) == 1:
+      self.progressMessage = "Getting available studies for patient ID: " + self.selectedPatient
     else:
-      try:
-        responseString = self.IDCClient.get_dicom_studies(patientId=self.selectedPatient)
-        '''
-        with open(cacheFile, 'wb') as outputFile:
-          outputFile.write(responseString)
-          outputFile.close()
-        f = codecs.open(cacheFile, 'rb', encoding='utf8')
-        responseString = f.read()[:]
-        '''
-        self.populateStudiesTableWidget(responseString)
-        if self.numberOfSelectedPatients == 1:
-          #groupBoxTitle = 'Studies (Accessed: ' + time.ctime(os.path.getmtime(cacheFile)) + ')'
-          groupBoxTitle = 'Studies '
-        else:
-          groupBoxTitle = 'Studies '
-
-        self.studiesCollapsibleGroupBox.setTitle(groupBoxTitle)
-        self.clearStatus()
+      self.progressMessage = "Getting available studies for {} patients".format(len(patientIDs))
+    self.showStatus(self.progressMessage)
+    self.submitQuery("studies", lambda: self.logic.getStudies(patientIDs),
+                     self.onStudiesQueryFinished, "patientsSelected")
 
-      except Exception as error:
-        self.clearStatus()
-        message = "patientSelected: Error in getting response from IDC server.\nHTTP Error:\n" + str(error)
-        qt.QMessageBox.critical(slicer.util.mainWindow(),
-                    'SlicerIDCBrowser', message, qt.QMessageBox.Ok)
-
-  def studiesTableSelectionChanged(self):
-    self.clearSeriesTableWidget()
-    self.seriesTableRowCount = 0
-    self.numberOfSelectedStudies = 0
-    for n in range(len(self.studyInstanceUIDs)):
-      if self.studyInstanceUIDs[n].isSelected():
-        self.numberOfSelectedStudies += 1
-        self.studySelected(n)
-
-  def studySelected(self, row):
+  def onStudiesQueryFinished(self, studies):
+    self.populateStudiesTable(studies)
+    self.studiesCollapsibleGroupBox.setTitle('Studies ')
+    self.clearStatus()
+    self.updateQueryCacheStatistics()
+    self.applyPendingSelection()
+
+  def studiesTableSelectionChanged(self, selected=None, deselected=None):
+    self.clearSeriesTable()
+    selectedRows = self.selectedRows(self.studiesTableView)
+    self.numberOfSelectedStudies = len(selectedRows)
+    if selectedRows:
+      self.selectedStudyRow = selectedRows[-1]
+      self.studiesSelected(self.studiesModel.frame['StudyInstanceUID'].iloc[selectedRows].tolist())
+
+  def studiesSelected(self, studyUIDs):
+    """Show the series of all selected studies, resolved in a single query."""
     self.loadButton.enabled = False
     self.indexButton.enabled = False
-    self.selectedStudy = self.studyInstanceUIDs[row].text()
-    self.selectedStudyRow = row
-    self.progressMessage = "Getting available series for studyInstanceUID: " + self.selectedStudy
-    self.showStatus(self.progressMessage)
-    cacheFile = self.cachePath + self.selectedStudy + '.json'
-    if os.path.isfile(cacheFile) and self.useCacheFlag:
-      logging.debug("studySelected: using cache file: " + cacheFile)
-      f = codecs.open(cacheFile, 'rb', encoding='utf8')
-      responseString = f.read()[:]
-      f.close()
-      self.populateSeriesTableWidget(responseString)
-      self.clearStatus()
-      if self.numberOfSelectedStudies == 1:
-        #groupBoxTitle = 'Series (Accessed: ' + time.ctime(os.path.getmtime(cacheFile)) + ')'
-        groupBoxTitle = 'Series '
-      else:
-        groupBoxTitle = 'Series '
-
-      self.seriesCollapsibleGroupBox.setTitle(groupBoxTitle)
-
-    else:
+    self.selectedStudy = studyUIDs[-1]
+    if len(studyUIDs) == 1:
       self.progressMessage = "Getting available series for studyInstanceUID: " + self.selectedStudy
-      self.showStatus(self.progressMessage)
-      try:
-        responseString = self.IDCClient.get_dicom_series(studyInstanceUID=self.selectedStudy)
-        '''
-        with open(cacheFile, 'wb') as outputFile:
-          outputFile.write(responseString)
-          outputFile.close()
-        '''
-
-        self.populateSeriesTableWidget(responseString)
-
-        if self.numberOfSelectedStudies == 1:
-          #groupBoxTitle = 'Series (Accessed: ' + time.ctime(os.path.getmtime(cacheFile)) + ')'
-          groupBoxTitle = 'Series '
-        else:
-          groupBoxTitle = 'Series '
-
-        self.seriesCollapsibleGroupBox.setTitle(groupBoxTitle)
-        self.clearStatus()
+    else:
+      self.progressMessage = "Getting available series for {} studies".format(len(studyUIDs))
+    self.showStatus(self.progressMessage)
+    self.submitQuery("series", lambda: self.logic.getSeries(studyUIDs),
+                     self.onSeriesQueryFinished, "studiesSelected")
 
-      except Exception as error:
-        self.clearStatus()
-        message = "studySelected: Error in getting response from IDC server.\nHTTP Error:\n" + str(error)
-        qt.QMessageBox.critical(slicer.util.mainWindow(),
-                    'SlicerIDCBrowser', message, qt.QMessageBox.Ok)
+  def onSeriesQueryFinished(self, series):
+    self.populateSeriesTable(series)
+    self.seriesCollapsibleGroupBox.setTitle('Series ')
+    self.clearStatus()
+    self.updateQueryCacheStatistics()
 
     # Only auto-select all series if we're not searching for a specific series
     if not getattr(self, 'isSearchingForSpecificSeries', False):
       self.onSeriesSelectAllButton()
-    # self.loadButton.enabled = True
-    # self.indexButton.enabled = True
+    self.applyPendingSelection()
 
-  def seriesSelected(self):
+  def seriesSelected(self, selected=None, deselected=None):
+    selectedRows = self.selectedRows(self.seriesTableView)
     self.imagesToDownloadCount = 0
     self.imagesToDownloadSize = 0
-    self.loadButton.enabled = False
-    self.indexButton.enabled = False
-    for n in range(len(self.seriesInstanceUIDs)):
-      if self.seriesInstanceUIDs[n].isSelected():
-        self.imagesToDownloadCount += int(self.imageCounts[n].text())
-        self.imagesToDownloadSize += float(self.imageSizes[n])
-        self.loadButton.enabled = True
-        self.indexButton.enabled = True
+    if selectedRows:
+      selectedFrame = self.seriesModel.frame.iloc[selectedRows]
+      self.imagesToDownloadCount = int(selectedFrame['ImageCount'].astype(float).sum())
+      self.imagesToDownloadSize = float(selectedFrame['series_size_MB'].astype(float).sum())
+    self.loadButton.enabled = len(selectedRows) > 0
+    self.indexButton.enabled = len(selectedRows) > 0
     if self.imagesToDownloadSize > 1000:
       self.imagesToDownloadSize = self.imagesToDownloadSize / 1000
       unit = 'GB'
@@ -1070,7 +1485,6 @@ class IDCBrowserWidget(ScriptedLoadableModuleWidget):
   def onIndexButton(self):
     self.loadToScene = False
     self.addSelectedToDownloadQueue()
-    # self.addFilesToDatabase()
 
   def onLoadButton(self):
     self.loadToScene = True
@@ -1079,9 +1493,13 @@ class IDCBrowserWidget(ScriptedLoadableModuleWidget):
     logging.info('onLoadButton: Done in {0:.2f} seconds.'.format(time.time() - startTime))
 
   def onCancelDownloadButton(self):
-    self.cancelDownload = True
     self.downloadQueue = {}
+    self.downloadPriorities = {}
     self.seriesRowNumber = {}
+    self.seriesToLoad = []
+    if self.downloadScheduler is not None:
+      self.downloadScheduler.cancel()
+      self.onDownloadTimer()
     self.hideProgressBar()
 
   def hideProgressBar(self):
@@ -1091,87 +1509,46 @@ class IDCBrowserWidget(ScriptedLoadableModuleWidget):
   def showProgressBar(self):
     self.downloadProgressBar.show()
 
-  def addFilesToDatabase(self, directory=None):
-    self.progressMessage = "Adding Files to DICOM Database "
-    self.showStatus(self.progressMessage)
-
-    indexer = ctk.ctkDICOMIndexer()
-    # DICOM indexer uses the current DICOM database folder as the basis for relative paths,
-    # therefore we must convert the folder path to absolute to ensure this code works
-    # even when a relative path is used as self.extractedFilesDirectories.
-    if not directory:
-      for extractedFilesDirectory in self.extractedFilesDirectories:
-        indexer.addDirectory(slicer.app.dicomDatabase(), os.path.abspath(extractedFilesDirectory))
-    else:
-      indexer.addDirectory(slicer.app.dicomDatabase(), os.path.abspath(directory))
-    indexer.waitForImportFinished()
-    self.clearStatus()
-
   def addSelectedToDownloadQueue(self):
-    self.cancelDownload = False
     allSelectedSeriesUIDs = []
     self.downloadQueue = {}
     self.seriesRowNumber = {}
 
-    for n in range(len(self.seriesInstanceUIDs)):
-      if self.seriesInstanceUIDs[n].isSelected():
-        selectedCollection = self.selectedCollection
-        selectedPatient = self.selectedPatient
-        selectedStudy = self.selectedStudy
-        selectedSeries = self.seriesInstanceUIDs[n].text()
-        allSelectedSeriesUIDs.append(selectedSeries)
-        # selectedSeries = self.selectedSeriesUIdForDownload
-        self.selectedSeriesNicknamesDic[selectedSeries] = str(selectedPatient
-                                    ) + '-' + str(
-          self.selectedStudyRow + 1) + '-' + str(n + 1)
-
-        # create download queue
-        self.showProgressBar()
-        self.downloadQueue[selectedSeries] = self.storagePath
-        self.seriesRowNumber[selectedSeries] = n
+    for n in self.selectedRows(self.seriesTableView):
+      selectedCollection = self.selectedCollection
+      selectedPatient = self.selectedPatient
+      selectedStudy = self.selectedStudy
+      selectedSeries = self.seriesModel.value(n, 'SeriesInstanceUID')
+      allSelectedSeriesUIDs.append(selectedSeries)
+      # selectedSeries = self.selectedSeriesUIdForDownload
+      self.selectedSeriesNicknamesDic[selectedSeries] = str(selectedPatient
+                                  ) + '-' + str(
+        self.selectedStudyRow + 1) + '-' + str(n + 1)
+
+      # create download queue
+      self.showProgressBar()
+      self.downloadQueue[selectedSeries] = self.storagePath
+      self.seriesRowNumber[selectedSeries] = n
 
     self.addReferencedSeriesToDownloadQueue(allSelectedSeriesUIDs)
 
-    self.seriesTableWidget.clearSelection()
-    self.patientsTableWidget.enabled = False
-    self.studiesTableWidget.enabled = False
-    self.collectionSelector.enabled = False
-    self.downloadSelectedSeries()
-
+    self.seriesTableView.clearSelection()
     if self.loadToScene:
-      failedSeriesCount = 0
-      for seriesUID in allSelectedSeriesUIDs:
-        logging.debug("Loading series: " + seriesUID)
-        #if any(seriesUID == s for s in self.previouslyDownloadedSeries):
-        if True:
-          self.progressMessage = "Examine Files to Load"
-          self.showStatus(self.progressMessage, '')
-          plugin = slicer.modules.dicomPlugins['DICOMScalarVolumePlugin']()
-          seriesUID = seriesUID.replace("'", "")
-          dicomDatabase = slicer.app.dicomDatabase()
-          fileList = slicer.app.dicomDatabase().filesForSeries(seriesUID)
-          loadables = []
+      self.seriesToLoad.extend(allSelectedSeriesUIDs)
+    self.downloadSelectedSeries()
 
-          try:
-            loadables = plugin.examine([fileList])
-          except Exception as error:
-            failedSeriesCount += 1
-
-          self.clearStatus()
-          if len(loadables)>0:
-            volume = plugin.load(loadables[0])
-            if volume:
-              logging.debug("Loaded volume: " + volume.GetName())
-            else:
-              failedSeriesCount += 1
-          else:
-            failedSeriesCount += 1
+  def loadSeries(self, seriesUIDs):
+    """Load downloaded and indexed series into the scene."""
+    self.progressMessage = "Examine Files to Load"
+    self.showStatus(self.progressMessage, '')
+    failedSeriesUIDs = self.logic.loadSeries(seriesUIDs)
+    self.clearStatus()
 
-      if failedSeriesCount > 0:
-        message = "Download was successful, but failed to load " + str(failedSeriesCount) + \
-          " series into the Slicer scene. You can retry loading from DICOM Browser!"
-        qt.QMessageBox.critical(slicer.util.mainWindow(),
-                    'SlicerIDCBrowser', message, qt.QMessageBox.Ok)
+    if failedSeriesUIDs:
+      message = "Download was successful, but failed to load " + str(len(failedSeriesUIDs)) + \
+        " series into the Slicer scene. You can retry loading from DICOM Browser!"
+      qt.QMessageBox.critical(slicer.util.mainWindow(),
+                  'SlicerIDCBrowser', message, qt.QMessageBox.Ok)
 
   def addReferencedSeriesToDownloadQueue(self, selectedSeriesUIDs):
     referencedSeriesMap = self.getReferencedSeriesForSelection(selectedSeriesUIDs)
@@ -1179,10 +1556,11 @@ class IDCBrowserWidget(ScriptedLoadableModuleWidget):
       return
 
     referenceCount = len(referencedSeriesMap["orderedReferenceUIDs"])
-    modalityBySeriesUID = self.getSeriesMetadataLookup("Modality")
-    descriptionBySeriesUID = self.getSeriesMetadataLookup("SeriesDescription")
+    promptSeriesUIDs = referencedSeriesMap["orderedReferenceUIDs"] + list(selectedSeriesUIDs)
+    modalityBySeriesUID = self.getSeriesMetadataLookup("Modality", promptSeriesUIDs)
+    descriptionBySeriesUID = self.getSeriesMetadataLookup("SeriesDescription", promptSeriesUIDs)
     promptLines = [
-      "The selected SEG/RTSTRUCT series reference {} additional image series.".format(referenceCount),
+      "The selected series reference {} additional series.".format(referenceCount),
       "Would you like to download those referenced series too?",
       ""
     ]
@@ -1213,44 +1591,47 @@ class IDCBrowserWidget(ScriptedLoadableModuleWidget):
     for referencedUID in referencedSeriesMap["orderedReferenceUIDs"]:
       self.downloadQueue[referencedUID] = self.storagePath
 
+  def waitForReferenceGraph(self, timeoutSeconds=300):
+    """Return the reference graph of the current IDC release, or None if it cannot be built.
+
+    Building the graph downloads the reference tables of the index, it runs
+    on the query worker while the user interface keeps processing events.
+    """
+    if self.logic.isReferenceGraphLoaded():
+      return self.logic.referenceGraph
+    result = {}
+    self.queryExecutor.submit("references", self.logic.getReferenceGraph,
+                              lambda graph: result.update(graph=graph), lambda error: result.update(error=error))
+    self.queryResultTimer.start()
+    self.showStatus("Looking up referenced series", '')
+    startTime = time.time()
+    while not result and self.queryExecutor.isPending("references") and time.time() - startTime < timeoutSeconds:
+      slicer.app.processEvents()
+      time.sleep(0.01)
+    self.onQueryResultTimer()
+    if "error" in result:
+      logging.error("Failed to build the reference graph, referenced series are not added: {0}".format(result["error"]))
+    return result.get("graph")
+
   def getReferencedSeriesForSelection(self, selectedSeriesUIDs):
     selectedUIDs = [uid for uid in selectedSeriesUIDs if uid]
     if not selectedUIDs:
       return None
 
-    modalityBySeriesUID = self.getSeriesMetadataLookup("Modality")
-    selectedUIDSet = set(selectedUIDs)
-    referenceUIDsBySource = {}
-
-    modalityTableSpecs = {
-      "SEG": ("seg_index", "segmented_SeriesInstanceUID"),
-      "RTSTRUCT": ("rtstruct_index", "referenced_SeriesInstanceUID"),
-    }
-
-    for modality, (tableName, referenceColumn) in modalityTableSpecs.items():
-      modalitySeriesUIDs = [uid for uid in selectedUIDs if modalityBySeriesUID.get(uid) == modality]
-      if not modalitySeriesUIDs:
-        continue
-      referencesForModality = self.queryReferencedSeriesUIDs(modalitySeriesUIDs, tableName, referenceColumn)
-      for sourceUID, referencedUID in referencesForModality:
-        if not referencedUID or referencedUID in selectedUIDSet:
-          continue
-        if referencedUID not in modalityBySeriesUID:
-          logging.warning("Referenced series %s for %s was not found in IDCClient.index", referencedUID, sourceUID)
-          continue
-        referenceUIDsBySource.setdefault(sourceUID, set()).add(referencedUID)
-
-    if not referenceUIDsBySource:
+    modalities = set(self.logic.getSeriesModalities(selectedUIDs).values())
+    if not modalities & REFERENCING_MODALITIES:
+      # none of the selected series refers to other series, no need for the reference graph
       return None
-
-    sourceSeriesUIDsByReference = {}
-    orderedReferenceUIDs = []
-    for sourceUID in selectedUIDs:
-      for referencedUID in sorted(referenceUIDsBySource.get(sourceUID, [])):
-        if referencedUID not in sourceSeriesUIDsByReference:
-          sourceSeriesUIDsByReference[referencedUID] = set()
-          orderedReferenceUIDs.append(referencedUID)
-        sourceSeriesUIDsByReference[referencedUID].add(sourceUID)
+    referenceGraph = self.waitForReferenceGraph()
+    if referenceGraph is None:
+      return None
+    orderedReferenceUIDs, sourceSeriesUIDsByReference = referenceGraph.expand(selectedUIDs)
+    for referencedUID in orderedReferenceUIDs:
+      if referencedUID not in self.logic.seriesLookup:
+        logging.warning("Referenced series %s for %s was not found in IDCClient.index",
+                        referencedUID, ", ".join(sorted(sourceSeriesUIDsByReference[referencedUID])))
+        del sourceSeriesUIDsByReference[referencedUID]
+    orderedReferenceUIDs = [uid for uid in orderedReferenceUIDs if uid in sourceSeriesUIDsByReference]
 
     if not orderedReferenceUIDs:
       return None
@@ -1260,151 +1641,121 @@ class IDCBrowserWidget(ScriptedLoadableModuleWidget):
       "sourceSeriesUIDsByReference": sourceSeriesUIDsByReference,
     }
 
-  def queryReferencedSeriesUIDs(self, sourceSeriesUIDs, tableName, referenceColumn):
-    try:
-      self.IDCClient.fetch_index(tableName)
-      quotedSeriesUIDs = ", ".join(self.quoteSqlString(uid) for uid in sourceSeriesUIDs)
-      query = """
-        SELECT SeriesInstanceUID, {referenceColumn}
-        FROM {tableName}
-        WHERE SeriesInstanceUID IN ({quotedSeriesUIDs})
-          AND {referenceColumn} IS NOT NULL
-          AND {referenceColumn} != ''
-      """.format(
-        referenceColumn=referenceColumn,
-        tableName=tableName,
-        quotedSeriesUIDs=quotedSeriesUIDs
-      )
-      results = self.IDCClient.sql_query(query)
-      return [
-        (str(row["SeriesInstanceUID"]), str(row[referenceColumn]))
-        for _, row in results.iterrows()
-      ]
-    except Exception as error:
-      logging.warning("Failed to query %s for referenced series: %s", tableName, error)
-      return []
-
-  def getSeriesMetadataLookup(self, columnName):
-    try:
-      if columnName not in self.IDCClient.index.columns:
-        return {}
-      metadataSeries = self.IDCClient.index.set_index("SeriesInstanceUID")[columnName]
-      return metadataSeries.to_dict()
-    except Exception as error:
-      logging.warning("Failed to build %s lookup: %s", columnName, error)
+  def getSeriesMetadataLookup(self, columnName, seriesUIDs):
+    """Return a SeriesInstanceUID -> value dict of columnName for seriesUIDs."""
+    if columnName not in self.logic.browserIndex.columns:
       return {}
+    return self.logic.seriesLookup.values(seriesUIDs, columnName)
 
   def describeSeriesForPrompt(self, seriesUID, modalityBySeriesUID=None, descriptionBySeriesUID=None):
     if modalityBySeriesUID is None:
-      modalityBySeriesUID = self.getSeriesMetadataLookup("Modality")
+      modalityBySeriesUID = self.getSeriesMetadataLookup("Modality", [seriesUID])
     if descriptionBySeriesUID is None:
-      descriptionBySeriesUID = self.getSeriesMetadataLookup("SeriesDescription")
+      descriptionBySeriesUID = self.getSeriesMetadataLookup("SeriesDescription", [seriesUID])
     modality = modalityBySeriesUID.get(seriesUID, "Series")
     description = descriptionBySeriesUID.get(seriesUID)
     if description and description != "None":
       return "{} ({})".format(modality, description)
     return "{} ({})".format(modality, seriesUID)
 
-  def quoteSqlString(self, value):
-    return "'" + str(value).replace("'", "''") + "'"
-
   def downloadSelectedSeries(self):
-
+    """Download the series of downloadQueue in the background, one s5cmd transfer per series."""
     if len(self.downloadQueue) == 0:
       logging.debug("No series selected for download")
       return
 
-    self.extractedFilesDirectories = set()
-
-    downloadQueueData = { 'SeriesInstanceUID': self.downloadQueue.keys(),
-             'DownloadFolder': self.downloadQueue.values() }
-
-    import pandas as pd
-    manifest_df = pd.DataFrame.from_dict(downloadQueueData)
-    manifest_df = manifest_df.merge(self.IDCClient.index, on='SeriesInstanceUID', how='left')
-    manifestContents = "\n".join(
-      f"cp {url} {folder}"
-      for url, folder in zip(manifest_df["series_aws_url"], manifest_df["DownloadFolder"])
-      )
+    self.ensureDICOMDatabase()
+    maxConcurrent = slicer.util.settingsValue("IDCBrowser/ConcurrentDownloads", 4, converter=int)
+    if self.downloadScheduler is None or self.downloadScheduler.isFinished():
+      self.downloadScheduler = self.logic.createDownloadScheduler(maxConcurrent, self.downloadOrder(), self.bandwidthLimit())
+    # series that are queued or transferred already are skipped, failed and cancelled ones are downloaded again
+    jobs = [job for job in self.logic.getDownloadJobs(self.downloadQueue, self.downloadPriorities)
+            if self.downloadScheduler.job(job.seriesInstanceUID) is None
+            or self.downloadScheduler.job(job.seriesInstanceUID).finished]
+    self.downloadQueue = {}
+    self.downloadPriorities = {}
+    for job in jobs:
+      self.downloadScheduler.addJob(job)
+    # series that are already on disk are indexed instead of being transferred again
+    self.logic.checkLocalDownloadJobs(jobs, self.downloadScheduler)
 
     self.cancelDownloadButton.enabled = True
-
-    self.extractedFilesDirectories.update(manifest_df["DownloadFolder"].tolist())
-    for downloadFolderPath in self.extractedFilesDirectories:
-      if not os.path.exists(downloadFolderPath):
-        logging.debug("Creating directory to keep the downloads: " + downloadFolderPath)
-        os.makedirs(downloadFolderPath)
-
+    self.showProgressBar()
     self.progressMessage = "Downloading Images for selected series"
-    self.showStatus(self.progressMessage)
+    self.showStatus(self.progressMessage, '')
     logging.debug(self.progressMessage)
+    self.downloadStartTime = time.time()
+    self.onDownloadTimer()
+    self.downloadTimer.start()
 
-    try:
-      start_time = time.time()
-
-      # write manifest to a temporary file
-      manifest_file = tempfile.NamedTemporaryFile(delete=False, mode='w')
-      manifest_file.write(manifestContents)
-      manifest_file.close()
-      logging.debug("Manifest file created: " + manifest_file.name)
-
-      self.downloadFromManifestFile(manifest_file.name, self.storagePath)
-
-      os.remove(manifest_file.name)
-      slicer.app.processEvents()
-      logging.debug("Downloaded images in %s seconds" % (time.time() - start_time))
+  def onDownloadTimer(self):
+    if self.downloadScheduler is None:
+      self.downloadTimer.stop()
+      return
+    for job in self.downloadScheduler.poll():
+      if job.state == DownloadJob.DONE:
+        self.logic.importDownloadedSeries(job)
+    jobs = self.downloadScheduler.jobs
+    finishedCount = sum(1 for job in jobs if job.finished)
+    self.setProgressBar(self.downloadScheduler.downloadedBytes(), self.downloadScheduler.totalBytes(),
+                        description="{} of {} series".format(finishedCount, len(jobs)),
+                        etaSeconds=self.downloadScheduler.etaSeconds())
+    # status column text is computed from the scheduler, repaint to update it
+    self.seriesTableView.viewport().update()
+    if not self.downloadScheduler.isFinished():
+      return
+    if self.logic.isImporting():
+      self.showStatus("Adding Files to DICOM Database ", '')
+      return
+    self.downloadTimer.stop()
+    self.onDownloadsFinished()
 
-      try:
-        start_time = time.time()
-        for directory in self.extractedFilesDirectories:
-          self.addFilesToDatabase(directory)
-        logging.debug("Added files to database in %s seconds" % (time.time() - start_time))
-
-        for selectedSeries in self.downloadQueue.keys():
-          self.previouslyDownloadedSeries.append(selectedSeries)
-          if selectedSeries in self.seriesRowNumber:
-            n = self.seriesRowNumber[selectedSeries]
-            table = self.seriesTableWidget
-            item = table.item(n, 1)
-            item.setIcon(self.storedlIcon)
+  def onDownloadsFinished(self):
+    jobs = self.downloadScheduler.jobs
+    doneJobs = [job for job in jobs if job.state == DownloadJob.DONE]
+    failedJobs = [job for job in jobs if job.state == DownloadJob.FAILED]
+    self.hideProgressBar()
+    self.cancelDownloadButton.enabled = False
 
-      except Exception as error:
-        import traceback
-        traceback.print_exc()
-        logging.error("Failed to add images to the database!")
+    importedCount, skippedCount = self.logic.finishImport()
+    logging.debug("Downloaded and indexed {0} series in {1:.2f} seconds, imported {2} files, skipped {3}".format(
+      len(doneJobs), time.time() - self.downloadStartTime, importedCount, skippedCount))
+    # status icons are computed from the local catalog, repaint to update them
+    self.seriesTableView.viewport().update()
+    self.clearStatus()
 
-    except Exception as error:
-      import traceback
-      traceback.print_exc()
-      self.clearStatus()
-      message = "downloadSelectedSeries: Failed to download " + str(error)
+    if failedJobs:
+      message = "downloadSelectedSeries: Failed to download {} series:\n".format(len(failedJobs))
+      message += "\n".join("{}: {}".format(job.seriesInstanceUID, job.error) for job in failedJobs[:5])
       qt.QMessageBox.critical(slicer.util.mainWindow(),
                   'SlicerIDCBrowser', message, qt.QMessageBox.Ok)
 
-    finally:
-      self.hideProgressBar()
-
-    self.downloadQueue = {}
-    self.cancelDownloadButton.enabled = False
-    self.collectionSelector.enabled = True
-    self.patientsTableWidget.enabled = True
-    self.studiesTableWidget.enabled = True
+    doneSeriesUIDs = set(job.seriesInstanceUID for job in doneJobs)
+    seriesToLoad = [seriesUID for seriesUID in self.seriesToLoad if seriesUID in doneSeriesUIDs]
+    self.seriesToLoad = []
+    if seriesToLoad:
+      self.loadSeries(seriesToLoad)
 
   def stringBufferReadWrite(self, dstFile, responseString, bufferSize=819):
       dstFile.write(responseString)
 
-  def updateProgressBar(self, currentValue, totalValue, unit="B", description=""):
+  def setProgressBar(self, currentValue, totalValue, unit="B", description="", etaSeconds=None):
     units = ["B", "kB", "MB", "GB", "TB", "PB", "EB", "ZB"]
-    self.downloadProgressBar.setMaximum(int(totalValue))
-    self.downloadProgressBar.setValue(int(currentValue))
+    # progress bar values are 32-bit integers, use per mille rather than bytes
+    self.downloadProgressBar.setMaximum(1000)
+    self.downloadProgressBar.setValue(int(1000 * min(currentValue / totalValue, 1.0)) if totalValue else 0)
     for currentUnit in units:
         unit = currentUnit
         if abs(totalValue) < 1000.0 or currentUnit == units[-1]:
             break
         totalValue /= 1000.0
         currentValue /= 1000.0
-    self.downloadProgressBar.setFormat(f"{description + ' ' if description else ''}%p% ({currentValue:.2f}{unit}/{totalValue:.2f}{unit})")
-    slicer.app.processEvents()
+    eta = ""
+    if etaSeconds is not None:
+      minutes, seconds = divmod(int(etaSeconds), 60)
+      hours, minutes = divmod(minutes, 60)
+      eta = f" ETA {hours}:{minutes:02d}:{seconds:02d}"
+    self.downloadProgressBar.setFormat(f"{description + ' ' if description else ''}%p% ({currentValue:.2f}{unit}/{totalValue:.2f}{unit}){eta}")
 
   def unzip(self, sourceFilename, destinationDir):
     totalItems = 0
@@ -1429,8 +1780,7 @@ class IDCBrowserWidget(ScriptedLoadableModuleWidget):
     return totalItems
 
   def getSeriesSize(self, seriesInstanceUID):
-    size = self.IDCClient.get_series_size(seriesInstanceUID)
-    return size
+    return float(self.logic.seriesLookup.value(seriesInstanceUID, "series_size_MB", 0.0))
 
   def populateCollectionsTreeView(self, responseString):
       collectionNames = sorted(responseString)
@@ -1454,205 +1804,103 @@ class IDCBrowserWidget(ScriptedLoadableModuleWidget):
       self.collectionCompleter.setModel(self.collectionSelector.model())
 
 
-  def populatePatientsTableWidget(self, responseString):
-    logging.debug("populatePatientsTableWidget")
-    self.clearPatientsTableWidget()
-    table = self.patientsTableWidget
-    patients = responseString
-    table.setRowCount(len(patients))
-    n = 0
-    for patient in patients:
-      keys = patient.keys()
-      for key in keys:
-        if key == 'PatientID':
-          logging.debug("PatientID: %s" % patient['PatientID'])
-          patientIDString = str(patient['PatientID'])
-          patientID = qt.QTableWidgetItem(patientIDString)
-          self.patientsIDs.append(patientID)
-          table.setItem(n, 0, patientID)
-          if patientIDString[0:4] == 'TCGA':
-            patientID.setIcon(self.reportIcon)
-        if key == 'PatientSex':
-          patientSex = qt.QTableWidgetItem(str(patient['PatientSex']))
-          self.patientSexes.append(patientSex)
-          table.setItem(n, 1, patientSex)
-        if key == 'PatientAge':
-          patientAge = qt.QTableWidgetItem(str(patient['PatientAge']))
-          self.patientAges.append(patientAge)
-          table.setItem(n, 2, patientAge)
-      n += 1
-    self.patientsTableWidget.resizeColumnsToContents()
-    self.patientsTableWidgetHeader.setStretchLastSection(True)
-
-  def populateStudiesTableWidget(self, responseString):
+  def populatePatientsTable(self, responseString):
+    logging.debug("populatePatientsTable")
+    import pandas as pd
+    self.clearPatientsTable()
+    self.patientsModel.setFrame(pd.DataFrame(responseString))
+    self.patientsTableView.resizeColumnsToContents()
+    self.patientsTableViewHeader.setStretchLastSection(True)
+
+  def populateStudiesTable(self, responseString):
+    import pandas as pd
     self.studiesSelectAllButton.enabled = True
     self.studiesSelectNoneButton.enabled = True
-    # self.clearStudiesTableWidget()
-    table = self.studiesTableWidget
-    studies = responseString
-
-    n = self.studiesTableRowCount
-    table.setRowCount(n + len(studies))
-
-    for study in studies:
-      keys = study.keys()
-      for key in keys:
-        if key == 'StudyInstanceUID':
-          studyInstanceUID = qt.QTableWidgetItem(str(study['StudyInstanceUID']))
-          self.studyInstanceUIDs.append(studyInstanceUID)
-          table.setItem(n, 0, studyInstanceUID)
-        if key == 'StudyDate':
-          studyDate = qt.QTableWidgetItem(str(study['StudyDate']))
-          self.studyDates.append(studyDate)
-          table.setItem(n, 1, studyDate)
-        if key == 'StudyDescription':
-          studyDescription = qt.QTableWidgetItem(str(study['StudyDescription']))
-          self.studyDescriptions.append(studyDescription)
-          table.setItem(n, 2, studyDescription)
-        if key == 'SeriesCount':
-          seriesCount = qt.QTableWidgetItem(str(study['SeriesCount']))
-          self.seriesCounts.append(seriesCount)
-          table.setItem(n, 3, seriesCount)
-      n += 1
-    self.studiesTableWidget.resizeColumnsToContents()
-    self.studiesTableWidgetHeader.setStretchLastSection(True)
-    self.studiesTableRowCount = n
-
-  def populateSeriesTableWidget(self, responseString):
-    logging.debug("populateSeriesTableWidget")
-    # self.clearSeriesTableWidget()
-    table = self.seriesTableWidget
-    seriesCollection = responseString
+    self.studiesModel.setFrame(pd.DataFrame(responseString))
+    self.studiesTableView.resizeColumnsToContents()
+    self.studiesTableViewHeader.setStretchLastSection(True)
+
+  def populateSeriesTable(self, responseString):
+    logging.debug("populateSeriesTable")
+    import pandas as pd
     self.seriesSelectAllButton.enabled = True
     self.seriesSelectNoneButton.enabled = True
+    self.seriesModel.setFrame(pd.DataFrame(responseString))
+    if self.seriesModel.frame is not None and self.seriesModel.frame['SeriesInstanceUID'].isin(self.logic.localCatalog.seriesUIDs).any():
+      self.removeSeriesAction.enabled = True
+    self.seriesTableView.resizeColumnsToContents()
+    self.seriesTableViewHeader.setStretchLastSection(True)
+
+  def patientsTableDecoration(self, row, column):
+    if column == 0 and str(self.patientsModel.value(row, 'PatientID'))[0:4] == 'TCGA':
+      return self.reportIcon
+    return None
+
+  def seriesTableStatusText(self, row, column):
+    """Show the progress of series that are being downloaded in the status column."""
+    if column != 1 or self.downloadScheduler is None:
+      return None
+    job = self.downloadScheduler.job(self.seriesModel.value(row, 'SeriesInstanceUID'))
+    if job is None or job.state == DownloadJob.DONE:
+      return None
+    if job.state == DownloadJob.DOWNLOADING:
+      return "{:.0%}".format(job.progress)
+    return job.state
+
+  def seriesTableDecoration(self, row, column):
+    if column != 1:
+      return None
+    if self.seriesModel.value(row, 'SeriesInstanceUID') in self.logic.localCatalog:
+      return self.storedlIcon
+    return self.downloadIcon
 
-    n = self.seriesTableRowCount
-    table.setRowCount(n + len(seriesCollection))
-
-    for series in seriesCollection:
-      keys = series.keys()
-      for key in keys:
-        if key == 'SeriesInstanceUID':
-          seriesInstanceUID = str(series['SeriesInstanceUID'])
-          seriesInstanceUIDItem = qt.QTableWidgetItem(seriesInstanceUID)
-          self.seriesInstanceUIDs.append(seriesInstanceUIDItem)
-          table.setItem(n, 0, seriesInstanceUIDItem)
-          if any(seriesInstanceUID == s for s in self.previouslyDownloadedSeries):
-            self.removeSeriesAction.enabled = True
-            icon = self.storedlIcon
-          else:
-            icon = self.downloadIcon
-          downloadStatusItem = qt.QTableWidgetItem(str(''))
-          downloadStatusItem.setTextAlignment(qt.Qt.AlignCenter)
-          downloadStatusItem.setIcon(icon)
-          self.downloadStatusCollection.append(downloadStatusItem)
-          table.setItem(n, 1, downloadStatusItem)
-        if key == 'Modality':
-          modality = qt.QTableWidgetItem(str(series['Modality']))
-          self.modalities.append(modality)
-          table.setItem(n, 2, modality)
-        if key == 'SeriesDate':
-          seriesDate = qt.QTableWidgetItem(str(series['SeriesDate']))
-          self.seriesDates.append(seriesDate)
-          table.setItem(n, 3, seriesDate)
-        if key == 'SeriesDescription':
-          seriesDescription = qt.QTableWidgetItem(str(series['SeriesDescription']))
-          self.seriesDescriptions.append(seriesDescription)
-          table.setItem(n, 4, seriesDescription)
-        if key == 'BodyPartExamined':
-          bodyPartExamined = qt.QTableWidgetItem(str(series['BodyPartExamined']))
-          self.bodyPartsExamined.append(bodyPartExamined)
-          table.setItem(n, 5, bodyPartExamined)
-        if key == 'SeriesNumber':
-          seriesNumber = qt.QTableWidgetItem(str(series['SeriesNumber']))
-          self.seriesNumbers.append(seriesNumber)
-          table.setItem(n, 6, seriesNumber)
-        if key == 'Manufacturer':
-          manufacturer = qt.QTableWidgetItem(str(series['Manufacturer']))
-          self.manufacturers.append(manufacturer)
-          table.setItem(n, 7, manufacturer)
-        if key == 'ManufacturerModelName':
-          manufacturerModelName = qt.QTableWidgetItem(str(series['ManufacturerModelName']))
-          self.manufacturerModelNames.append(manufacturerModelName)
-          table.setItem(n, 8, manufacturerModelName)
-        if key == 'ImageCount':
-          imageCount = qt.QTableWidgetItem(str(series['ImageCount']))
-          self.imageCounts.append(imageCount)
-          self.imageSizes.append(float(series['series_size_MB']))
-          table.setItem(n, 9, imageCount)
-      n += 1
-    self.seriesTableWidget.resizeColumnsToContents()
-    self.seriesTableRowCount = n
-    self.seriesTableWidgetHeader.setStretchLastSection(True)
-
-  def clearPatientsTableWidget(self):
-    table = self.patientsTableWidget
+  def clearPatientsTable(self):
+    # results of a query still running for the previous selection are stale now
+    self.queryExecutor.cancel("patients")
     self.patientsCollapsibleGroupBox.setTitle('Patients')
-    self.patientsIDs = []
-    self.patientNames = []
-    self.patientBirthDates = []
-    self.patientSexes = []
-    self.patientAges = []
-    self.ethnicGroups = []
-    # self.collections = []
-    table.clear()
-    table.setHorizontalHeaderLabels(self.patientsTableHeaderLabels)
-
-  def clearStudiesTableWidget(self):
-    self.studiesTableRowCount = 0
-    table = self.studiesTableWidget
+    self.patientsModel.setFrame(None)
+
+  def clearStudiesTable(self):
+    self.queryExecutor.cancel("studies")
     self.studiesCollapsibleGroupBox.setTitle('Studies')
-    self.studyInstanceUIDs = []
-    self.studyDates = []
-    self.studyDescriptions = []
-    self.admittingDiagnosesDescriptions = []
-    self.studyIDs = []
-    self.patientAges = []
-    self.seriesCounts = []
-    table.clear()
-    table.setHorizontalHeaderLabels(self.studiesTableHeaderLabels)
-
-  def clearSeriesTableWidget(self):
-    self.seriesTableRowCount = 0
-    table = self.seriesTableWidget
+    self.studiesModel.setFrame(None)
+
+  def clearSeriesTable(self):
+    self.queryExecutor.cancel("series")
     self.seriesCollapsibleGroupBox.setTitle('Series')
-    self.seriesInstanceUIDs = []
-    self.downloadStatusCollection = []
-    self.modalities = []
-    self.protocolNames = []
-    self.seriesDates = []
-    self.seriesDescriptions = []
-    self.bodyPartsExamined = []
-    self.seriesNumbers = []
-    self.annotationsFlags = []
-    self.manufacturers = []
-    self.manufacturerModelNames = []
-    self.softwareVersionsCollection = []
-    self.imageCounts = []
-    self.imageSizes = []
-    table.clear()
-    table.setHorizontalHeaderLabels(self.seriesTableHeaderLabels)
+    self.seriesModel.setFrame(None)
 
   def downloadFromManifestFile(self, filePath, downloadDir=None):
+    """Queue the series of an s5cmd manifest for download, return True if any series was found.
+
+    The series are downloaded in the background like the ones selected in
+    the browser, so the download can be cancelled and resumed.
+    """
+    if self.waitForIDCClient() is None:
+      return False
     if downloadDir is None:
         downloadDir = self.downloadDestinationSelector.directory
 
     try:
-      self.showProgressBar()
-      slicer.app.processEvents()
-      if 'progress_callback' in inspect.signature(self.IDCClient.download_from_manifest).parameters:
-        self.IDCClient.download_from_manifest(manifestFile=filePath, downloadDir=downloadDir, progress_callback=self.updateProgressBar)
-      else:
-        self.IDCClient.download_from_manifest(manifestFile=filePath, downloadDir=downloadDir)
+      manifestUrls = readManifestUrls(filePath)
+      seriesUIDs = self.logic.resolveSeriesUIDs(manifestUrls=manifestUrls)
     except Exception as error:
-      self.download_status.setText('Download from manifest failed.')
       logging.error('Download from manifest failed.')
       logging.error(error)
-      return
-    finally:
-      self.hideProgressBar()
-      slicer.app.processEvents()
+      self.showStatus('Download from manifest failed.', '')
+      return False
+    if not seriesUIDs:
+      logging.error('None of the {0} urls of manifest {1} refers to a series of IDC release {2}'.format(
+        len(manifestUrls), filePath, self.logic.idc_version))
+      self.showStatus('No series of the manifest found in the IDC index.', '')
+      return False
+    if len(seriesUIDs) < len(set(manifestUrls)):
+      logging.warning('{0} of the {1} urls of manifest {2} could not be resolved'.format(
+        len(set(manifestUrls)) - len(seriesUIDs), len(set(manifestUrls)), filePath))
 
+    for seriesUID in seriesUIDs:
+      self.downloadQueue[seriesUID] = downloadDir
+    self.downloadSelectedSeries()
     return True
 
 #
@@ -1670,7 +1918,458 @@ class IDCBrowserLogic(ScriptedLoadableModuleLogic):
   def __init__(self):
     self.idc_index_location = None
     self.idc_version = None
-    pass
+    self.IDCClient = None
+    # index the browser structures and hierarchy queries are built on, see initializeIDCClient
+    self.browserIndex = None
+    self.seriesLookup = None
+    self.facetIndex = None
+    self.indexLoadReport = None
+    self.indexMemoryReport = None
+    self.identifierIndex = None
+    self.incrementalSearch = None
+    self.queryCache = None
+    self.referenceGraph = None
+    self.useQueryCache = True
+    self.memoryCache = LRUCache()
+    self.localCatalog = None
+    # Indexer importing downloaded series in the background, and the files
+    # handed to it that are not recorded in the import manifest yet, by series
+    self.dicomIndexer = None
+    self.importManifest = None
+    self.pendingImportFiles = {}
+    self.skippedImportFileCount = 0
+    self.loadTimings = []
+    # (SeriesInstanceUID, file count) -> (plugin name, loadable) of examined
+    # series, belongs to the DICOM database it was filled from
+    self.loadableCache = LRUCache(maxEntries=256)
+
+  def initializeIDCClient(self, compact=False, searchIndexes=True):
+    """Create the IDC client and the search structures built on top of its index.
+
+    The browser works on its own columns of the index (BROWSER_COLUMNS),
+    memory mapped from the Arrow copy kept with the query cache (see
+    IndexStore). If compact is set, they are further compacted (see
+    IndexCompaction). The client keeps its full index, so SQL queries through
+    IDCClient.sql_query can still use every column.
+
+    Without searchIndexes only the series lookup is built, which is all that
+    resolving and downloading series needs. The identifier, incremental and
+    facet search of the module widget are skipped.
+    """
+    from idc_index import index
+
+    logging.info("Initializing IDC client ...")
+    startTime = time.time()
+    self.IDCClient = index.IDCClient()
+    logging.info("IDC Client initialized in {0:.2f} seconds.".format(time.time() - startTime))
+
+    # stored with the query cache, so it is removed together with the cache of a previous release
+    indexStore = IndexStore(self.queryCache.directory if self.queryCache is not None else None,
+                            *findIndexFiles(self.idc_index_location))
+    self.browserIndex = indexStore.loadColumns(BROWSER_COLUMNS, self.IDCClient.index)
+    self.indexLoadReport = indexStore.lastReport
+    if compact:
+      self.browserIndex, self.indexMemoryReport = compactIndex(self.browserIndex)
+      logging.info(formatMemoryReport(self.indexMemoryReport))
+
+    self.seriesLookup = SeriesLookup(self.browserIndex)
+    self.loadableCache.clear()
+    if searchIndexes:
+      self.identifierIndex = IdentifierIndex(self.browserIndex, self.seriesLookup)
+      self.incrementalSearch = IncrementalSearch(self.browserIndex)
+      self.facetIndex = FacetIndex(self.browserIndex)
+    return self.IDCClient
+
+  def setupQueryCache(self, cacheDirectory, maxSizeMB=256):
+    """Keep hierarchy query results in cacheDirectory, separately for each IDC release."""
+    self.queryCache = PersistentQueryCache(cacheDirectory, self.idc_version, maxSizeBytes=maxSizeMB * 1024 * 1024)
+
+  def isReferenceGraphLoaded(self):
+    return self.referenceGraph is not None and self.referenceGraph.version == self.idc_version
+
+  def getReferenceGraph(self):
+    """Return the reference graph of the current IDC release, built on first use and then loaded from disk."""
+    if self.isReferenceGraphLoaded():
+      return self.referenceGraph
+    # stored with the query cache, so it is removed together with the cache of a previous release
+    graphPath = os.path.join(self.queryCache.directory, "ReferenceGraph.pickle") if self.queryCache is not None else None
+    self.referenceGraph = ReferenceGraph.load(graphPath, self.idc_version) if graphPath else None
+    if self.referenceGraph is None:
+      self.referenceGraph = ReferenceGraph.build(self.IDCClient, self.idc_version)
+      if graphPath:
+        self.referenceGraph.save(graphPath)
+    return self.referenceGraph
+
+  def getReferencedSeries(self, seriesUIDs):
+    """Return the series of the index that seriesUIDs refer to directly or indirectly, breadth first.
+
+    The given series themselves are not included. The reference graph is
+    only loaded if one of the series is of a modality that refers to others.
+    """
+    modalities = set(self.getSeriesModalities(seriesUIDs).values())
+    if not modalities & REFERENCING_MODALITIES:
+      return []
+    referencedUIDs, _ = self.getReferenceGraph().expand(seriesUIDs)
+    missingCount = sum(1 for uid in referencedUIDs if uid not in self.seriesLookup)
+    if missingCount:
+      logging.warning("{0} referenced series are not in IDC index version {1}".format(missingCount, self.idc_version))
+    return [uid for uid in referencedUIDs if uid in self.seriesLookup]
+
+  def cachedQuery(self, kind, key, query):
+    """Return the result of query(), looking it up in the session memory cache first
+    and in the on-disk cache second."""
+    self.memoryCache.validate(self.idc_version)
+    result = self.memoryCache.get((kind, key))
+    if result is not None:
+      return result
+    if self.queryCache is not None and self.useQueryCache:
+      result = self.queryCache.get(kind, key)
+      if result is None:
+        result = query()
+        self.queryCache.put(kind, key, result)
+      logging.debug("Query cache: {} hits, {} misses".format(self.queryCache.hits, self.queryCache.misses))
+    else:
+      result = query()
+    self.memoryCache.put((kind, key), result)
+    return result
+
+  def getPatients(self, collectionID):
+    return self.cachedQuery("patients", collectionID,
+                            lambda: HierarchyQueries.getPatients(self.browserIndex, collectionID))
+
+  def getStudies(self, patientIDs):
+    return self.cachedQuery("studies", tuple(patientIDs),
+                            lambda: HierarchyQueries.getStudies(self.browserIndex, patientIDs))
+
+  def getSeries(self, studyUIDs):
+    return self.cachedQuery("series", tuple(studyUIDs),
+                            lambda: HierarchyQueries.getSeries(self.browserIndex, studyUIDs))
+
+  def getDownloadJobs(self, downloadFolders, priorities=None):
+    """Return a DownloadJob for each SeriesInstanceUID -> download folder item of downloadFolders.
+
+    priorities maps SeriesInstanceUIDs to the priority of their job, see DownloadJob.
+    """
+    priorities = priorities or {}
+    series = self.seriesLookup.rows(
+      downloadFolders.keys(),
+      DownloadScheduler.SERIES_FOLDER_COLUMNS + ["series_aws_url", "series_size_MB", "instanceCount"])
+    jobs = []
+    for row in series.itertuples(index=False):
+      destination = DownloadScheduler.seriesFolder(downloadFolders[row.SeriesInstanceUID], row.collection_id, row.PatientID,
+                                                   row.StudyInstanceUID, row.Modality, row.SeriesInstanceUID)
+      jobs.append(DownloadJob(row.SeriesInstanceUID, row.series_aws_url, destination,
+                              int(float(row.series_size_MB) * 1000 * 1000), int(row.instanceCount),
+                              priorities.get(row.SeriesInstanceUID, 0)))
+    return jobs
+
+  def resolveSeriesUIDs(self, sql=None, seriesUIDs=None, manifestUrls=None):
+    """Return the SeriesInstanceUIDs selected by a query, a list of UIDs and/or the urls of a manifest.
+
+    sql is run against the IDC index and must return a SeriesInstanceUID
+    column. Manifest urls (s3://<bucket>/<series folder>/*) are matched on the
+    series folder, so manifests that refer to another bucket also resolve.
+    The result is restricted to series of the current index, in input order.
+    """
+    requested = []
+    if sql:
+      result = self.IDCClient.sql_query(sql)
+      if "SeriesInstanceUID" not in result.columns:
+        raise ValueError("Query must return a SeriesInstanceUID column")
+      requested.extend(result["SeriesInstanceUID"].tolist())
+    if seriesUIDs:
+      requested.extend(seriesUIDs)
+    index = self.browserIndex
+    if manifestUrls:
+      # the last path segment, str.rsplit(...).str[-1] does not work on Arrow backed columns
+      folders = index["series_aws_url"].str.rstrip("/*").str.replace(r".*/", "", regex=True)
+      requestedFolders = set(url.rstrip("/*").rsplit("/", 1)[-1] for url in manifestUrls)
+      requested.extend(index.loc[folders.isin(requestedFolders), "SeriesInstanceUID"].tolist())
+    missingCount = sum(1 for uid in requested if uid not in self.seriesLookup)
+    if missingCount:
+      logging.warning("{0} requested series are not in IDC index version {1}".format(missingCount, self.idc_version))
+    return [uid for uid in dict.fromkeys(requested) if uid in self.seriesLookup]
+
+  def defaultStoragePath(self):
+    """Return the download folder configured in the application settings."""
+    settings = qt.QSettings()
+    if settings.contains("IDCCustomStoragePath"):
+      return settings.value("IDCCustomStoragePath")
+    return os.path.join(slicer.dicomDatabase.databaseDirectory, "IDCLocal")
+
+  def setupLocalCatalog(self, storagePath):
+    """Open the catalog of the series downloaded into storagePath."""
+    self.localCatalog = LocalCatalog(os.path.join(storagePath, "LocalCatalog.sqlite"))
+    # previous versions kept a pickled list of downloaded series in archive.p
+    self.localCatalog.migrateArchive(storagePath + 'archive.p')
+    return self.localCatalog
+
+  def createDownloadScheduler(self, maxConcurrent=4, order=DownloadScheduler.SMALLEST_FIRST, bandwidthLimit=None):
+    return DownloadScheduler(self.IDCClient.s5cmdPath, maxConcurrent, order=order, bandwidthLimit=bandwidthLimit)
+
+  def checkLocalDownloadJobs(self, jobs, downloadScheduler):
+    """Have the scheduler check for local copies of the series of jobs before transferring them.
+
+    A series that is complete in its destination folder is not transferred again.
+    A series that the local catalog records in another folder is hard linked (or
+    copied, across file systems) into the destination if that copy is complete.
+    The checks run off the GUI thread, see DownloadScheduler.checkLocal().
+    """
+    for job in jobs:
+      entry = self.localCatalog.entry(job.seriesInstanceUID) if job.seriesInstanceUID in self.localCatalog else None
+      downloadScheduler.checkLocal(job, entry["path"] if entry is not None and entry["path"] else None)
+
+  def getImportManifest(self):
+    """Return the manifest of files already imported into the current DICOM database."""
+    databaseDirectory = slicer.dicomDatabase.databaseDirectory
+    manifestPath = os.path.join(databaseDirectory, "IDCBrowserImportManifest.txt")
+    if self.importManifest is None or self.importManifest.manifestPath != manifestPath:
+      self.importManifest = ImportManifest(manifestPath)
+    if len(self.importManifest) and not slicer.dicomDatabase.patients():
+      # the database has been emptied since the files were imported
+      self.importManifest.clear()
+    return self.importManifest
+
+  def importDownloadedSeries(self, job):
+    """Import the folder of a downloaded series into the DICOM database and record it in the local catalog.
+
+    The import runs in the background, so it overlaps with the series that
+    are still downloading. Only the files of the series folder that were not
+    imported before are passed to the indexer. Call finishImport() once
+    isImporting() returns False.
+    """
+    if self.dicomIndexer is None:
+      self.dicomIndexer = ctk.ctkDICOMIndexer()
+      self.dicomIndexer.database = slicer.dicomDatabase
+      self.dicomIndexer.backgroundImportEnabled = True
+    importManifest = self.getImportManifest()
+    if not slicer.dicomDatabase.filesForSeries(job.seriesInstanceUID):
+      # the series was removed from the database (or never reached it), import all of its files again
+      importManifest.forget(job.destination)
+    # DICOM indexer uses the current DICOM database folder as the basis for relative paths
+    files, skippedCount = importManifest.newFiles(os.path.abspath(job.destination))
+    self.skippedImportFileCount += skippedCount
+    if files:
+      self.dicomIndexer.addListOfFiles([path for path, _, _ in files])
+      self.pendingImportFiles.setdefault(job.seriesInstanceUID, []).extend(files)
+    self.localCatalog.add(job.seriesInstanceUID, job.destination, job.downloadedBytes, len(files) + skippedCount)
+
+  def isImporting(self):
+    return self.dicomIndexer is not None and self.dicomIndexer.isImporting()
+
+  def removeDownloadedSeries(self, seriesUIDs, storagePath):
+    """Delete the folders of downloaded series, return the descriptions of the series that failed.
+
+    The series are removed from the local catalog, their files from the import
+    manifest, and the series from the DICOM database if its files were in the
+    deleted folder. Series folders of catalog entries without a path (migrated
+    from previous versions) are looked up in the index.
+    """
+    importManifest = self.getImportManifest()
+    folders = {}
+    for seriesUID in seriesUIDs:
+      entry = self.localCatalog.entry(seriesUID)
+      if entry is not None and entry["path"]:
+        folders[seriesUID] = entry["path"]
+    missingFolderUIDs = [seriesUID for seriesUID in seriesUIDs if seriesUID not in folders]
+    folders.update((job.seriesInstanceUID, job.destination)
+                   for job in self.getDownloadJobs({seriesUID: storagePath for seriesUID in missingFolderUIDs}))
+
+    errors = []
+    removedUIDs = []
+    for seriesUID in seriesUIDs:
+      folder = os.path.abspath(folders[seriesUID]) if seriesUID in folders else None
+      if folder is not None and not os.path.basename(folder).endswith("_" + seriesUID):
+        # not a series folder of the download layout, do not delete anything else
+        errors.append("{0}: unexpected folder {1}".format(seriesUID, folder))
+        continue
+      if folder is not None and os.path.isdir(folder):
+        try:
+          shutil.rmtree(folder)
+        except OSError as error:
+          errors.append("{0}: {1}".format(seriesUID, error))
+          continue
+        self.removeEmptyParentFolders(folder, storagePath)
+      if folder is not None:
+        importManifest.forget(folder)
+        prefix = os.path.join(os.path.normcase(folder), "")
+        databaseFiles = slicer.dicomDatabase.filesForSeries(seriesUID)
+        if databaseFiles and all(os.path.normcase(os.path.abspath(path)).startswith(prefix) for path in databaseFiles):
+          slicer.dicomDatabase.removeSeries(seriesUID)
+      removedUIDs.append(seriesUID)
+    self.localCatalog.remove(removedUIDs)
+    self.loadableCache.clear()
+    logging.info("Deleted {0} downloaded series".format(len(removedUIDs)))
+    return errors
+
+  @staticmethod
+  def removeEmptyParentFolders(folder, storagePath):
+    """Remove the empty study, patient and collection folders above a deleted series folder."""
+    storagePath = os.path.normcase(os.path.abspath(storagePath))
+    parent = os.path.dirname(os.path.abspath(folder))
+    while os.path.normcase(parent).startswith(os.path.join(storagePath, "")):
+      try:
+        os.rmdir(parent)
+      except OSError:
+        # not empty
+        break
+      parent = os.path.dirname(parent)
+
+  def finishImport(self):
+    """Record the files of the finished imports, return (importedFileCount, skippedFileCount).
+
+    Only files that reached the DICOM database are recorded, the others are
+    passed to the indexer again on the next import.
+    """
+    importedFiles = []
+    pendingCount = 0
+    for seriesUID, files in self.pendingImportFiles.items():
+      pendingCount += len(files)
+      databaseFiles = set(os.path.normcase(os.path.abspath(path)) for path in slicer.dicomDatabase.filesForSeries(seriesUID))
+      importedFiles.extend(file for file in files if os.path.normcase(file[0]) in databaseFiles)
+    skippedCount = self.skippedImportFileCount
+    logging.info("Imported {0} new files into the DICOM database, skipped {1} already imported files".format(
+      len(importedFiles), skippedCount))
+    if len(importedFiles) < pendingCount:
+      logging.warning("{0} files did not reach the DICOM database".format(pendingCount - len(importedFiles)))
+    self.getImportManifest().markImported(importedFiles)
+    self.pendingImportFiles = {}
+    self.skippedImportFileCount = 0
+    return len(importedFiles), skippedCount
+
+  def getSeriesModalities(self, seriesUIDs):
+    """Return a SeriesInstanceUID -> Modality dict of seriesUIDs from the IDC index."""
+    return self.seriesLookup.values(seriesUIDs, "Modality")
+
+  def examineSeries(self, seriesUID, fileList, pluginNames, plugins):
+    """Return (plugin name, loadable) of the best loadable of a series, or (None, None).
+
+    pluginNames are the plugins to examine the series with, plugins caches
+    their instances. Results are kept in self.loadableCache, so a series is
+    examined only once even if loading it is retried. The cache is dropped
+    when another DICOM database is opened.
+    """
+    self.loadableCache.validate(slicer.dicomDatabase.databaseFilename)
+    cacheKey = (seriesUID, len(fileList))
+    cached = self.loadableCache.get(cacheKey)
+    if cached is not None:
+      return cached
+    best = (None, None)
+    for pluginName in pluginNames:
+      if pluginName not in plugins:
+        plugins[pluginName] = slicer.modules.dicomPlugins[pluginName]()
+      try:
+        loadables = plugins[pluginName].examine([fileList])
+      except Exception as error:
+        logging.warning("{0} failed to examine series {1}: {2}".format(pluginName, seriesUID, error))
+        continue
+      for loadable in loadables:
+        if not loadable.selected:
+          continue
+        if best[1] is None or loadable.confidence > best[1].confidence:
+          best = (pluginName, loadable)
+      if best[1] is not None and len(pluginNames) > 1 and best[1].confidence >= 1.0:
+        break
+    self.loadableCache.put(cacheKey, best)
+    return best
+
+  def loadSeries(self, seriesUIDs):
+    """Load series from the DICOM database into the scene, return the UIDs that failed to load.
+
+    The DICOM plugin is chosen from the modality of the series in the IDC
+    index. Only series of unknown modality are examined by every plugin, and
+    each plugin is instantiated once. Images are loaded before the
+    segmentations, structure sets and reports that refer to them.
+
+    Examining reads the header tags the DICOM database cached when the files
+    were imported, so the files are only read again by the plugin loading
+    them. Per-series timings are kept in self.loadTimings.
+    """
+    seriesUIDs = [seriesUID.replace("'", "") for seriesUID in seriesUIDs]
+    modalityBySeriesUID = self.getSeriesModalities(seriesUIDs)
+    seriesUIDs = sortForLoading(seriesUIDs, modalityBySeriesUID)
+    availablePluginNames = list(slicer.modules.dicomPlugins.keys())
+    plugins = {}
+    self.loadTimings = []
+    failedSeriesUIDs = []
+    for seriesUID in seriesUIDs:
+      modality = modalityBySeriesUID.get(seriesUID)
+      pluginNames = pluginNamesForModality(modality, availablePluginNames)
+      if pluginNames is None:
+        pluginNames = availablePluginNames
+      if not pluginNames:
+        logging.warning("No DICOM plugin available to load {0} series {1}".format(modality, seriesUID))
+        failedSeriesUIDs.append(seriesUID)
+        continue
+      logging.debug("Loading series: " + seriesUID)
+      listStartTime = time.time()
+      fileList = slicer.dicomDatabase.filesForSeries(seriesUID)
+      examineStartTime = time.time()
+      loaded = False
+      pluginName, loadable = self.examineSeries(seriesUID, fileList, pluginNames, plugins) if fileList else (None, None)
+      loadStartTime = time.time()
+      if loadable is not None:
+        try:
+          loaded = bool(plugins[pluginName].load(loadable))
+        except Exception as error:
+          logging.error("Failed to load series {0}: {1}".format(seriesUID, error))
+      endTime = time.time()
+      self.loadTimings.append({
+        "SeriesInstanceUID": seriesUID,
+        "Modality": modality,
+        "plugin": pluginName,
+        "loaded": loaded,
+        "listSeconds": round(examineStartTime - listStartTime, 3),
+        "examineSeconds": round(loadStartTime - examineStartTime, 3),
+        "loadSeconds": round(endTime - loadStartTime, 3),
+      })
+      if loaded:
+        logging.debug("Loaded {0} with {1} (list {2:.2f} s, examine {3:.2f} s, load {4:.2f} s)".format(
+          loadable.name, pluginName, examineStartTime - listStartTime, loadStartTime - examineStartTime,
+          endTime - loadStartTime))
+      else:
+        failedSeriesUIDs.append(seriesUID)
+      # keep the application responsive between series
+      slicer.app.processEvents()
+    return failedSeriesUIDs
+
+  def downloadSeries(self, seriesUIDs, downloadDir, maxConcurrent=4, order=DownloadScheduler.SMALLEST_FIRST,
+                     bandwidthLimit=None, importToDatabase=True, progressCallback=None, pollInterval=0.5):
+    """Download, verify and import series without user interface, return the DownloadScheduler.
+
+    This is the blocking counterpart of the download pipeline of the module
+    widget. progressCallback(downloadScheduler, finishedJobs) is called after
+    every poll of the running transfers.
+    """
+    downloadScheduler = self.createDownloadScheduler(maxConcurrent, order, bandwidthLimit)
+    jobs = self.getDownloadJobs({seriesUID: downloadDir for seriesUID in seriesUIDs})
+    for job in jobs:
+      downloadScheduler.addJob(job)
+    try:
+      self.checkLocalDownloadJobs(jobs, downloadScheduler)
+      finishedJobs = []
+      while True:
+        if importToDatabase:
+          for job in finishedJobs:
+            if job.state == DownloadJob.DONE:
+              self.importDownloadedSeries(job)
+        if progressCallback is not None:
+          progressCallback(downloadScheduler, finishedJobs)
+        if downloadScheduler.isFinished():
+          break
+        # the background indexer reports through Qt events
+        slicer.app.processEvents()
+        time.sleep(pollInterval)
+        finishedJobs = downloadScheduler.poll()
+    except KeyboardInterrupt:
+      downloadScheduler.cancel()
+      raise
+    if importToDatabase:
+      while self.isImporting():
+        slicer.app.processEvents()
+        time.sleep(pollInterval)
+      self.finishImport()
+    return downloadScheduler
 
   def setupPythonRequirements(self):
     try:
@@ -1764,8 +2463,9 @@ class IDCBrowserLogic(ScriptedLoadableModuleLogic):
     return True
 
   def getIDCIndexPath(self):
-    idc_index_pip_dir = os.path.dirname(self.idc_index_location)
-    return os.path.join(idc_index_pip_dir,'idc_index.csv.zip')
+    """Return the index file shipped with idc-index, Parquet in recent versions, zipped CSV in older ones."""
+    parquetPath, csvZipPath = findIndexFiles(self.idc_index_location)
+    return parquetPath or csvZipPath or os.path.join(os.path.dirname(self.idc_index_location), 'idc_index.csv.zip')
 
 class IDCBrowserFileReader:
   def __init__(self, parent):
@@ -1795,10 +2495,8 @@ class IDCBrowserFileReader:
     slicer.util.selectModule("IDCBrowser")
     slicer.app.processEvents()
     idcBrowserWidget = slicer.modules.idcbrowser.widgetRepresentation().self()
-    success = idcBrowserWidget.downloadFromManifestFile(fileName, idcBrowserWidget.storagePath)
-    slicer.app.processEvents()
-    idcBrowserWidget.addFilesToDatabase(idcBrowserWidget.storagePath)
-    return success
+    # series are imported into the DICOM database as their download finishes
+    return idcBrowserWidget.downloadFromManifestFile(fileName, idcBrowserWidget.storagePath)
 
 class IDCBrowserTest(ScriptedLoadableModuleTest):
   """
@@ -1837,39 +2535,42 @@ class IDCBrowserTest(ScriptedLoadableModuleTest):
   def testBrowserDownloadAndLoad(self):
     self.delayDisplay("Starting the test")
     widget = IDCBrowserWidget(None)
-    widget.getCollectionValues()
+    widget.waitForIDCClient()
     browserWindow = widget.browserWidget
     collectionsCombobox = browserWindow.findChildren('QComboBox')[0]
     print('Number of collections: {}'.format(collectionsCombobox.count))
     if collectionsCombobox.count > 0:
       collectionsCombobox.setCurrentIndex(randint(0, collectionsCombobox.count - 1))
+      widget.waitForQueries()
       currentCollection = collectionsCombobox.currentText
       if currentCollection != '':
         print('connected to the server successfully')
         print('current collection: {}'.format(currentCollection))
 
-      tableWidgets = browserWindow.findChildren('QTableWidget')
+      tableViews = browserWindow.findChildren('QTableView')
 
-      patientsTable = tableWidgets[0]
-      if patientsTable.rowCount > 0:
-        selectedRow = randint(0, patientsTable.rowCount - 1)
-        selectedPatient = patientsTable.item(selectedRow, 0).text()
+      patientsTable = tableViews[0]
+      if patientsTable.model().rowCount() > 0:
+        selectedRow = randint(0, patientsTable.model().rowCount() - 1)
+        selectedPatient = patientsTable.model().index(selectedRow, 0).data()
         if selectedPatient != '':
           print('selected patient: {}'.format(selectedPatient))
           patientsTable.selectRow(selectedRow)
+          widget.waitForQueries()
 
-        studiesTable = tableWidgets[1]
-        if studiesTable.rowCount > 0:
-          selectedRow = randint(0, studiesTable.rowCount - 1)
-          selectedStudy = studiesTable.item(selectedRow, 0).text()
+        studiesTable = tableViews[1]
+        if studiesTable.model().rowCount() > 0:
+          selectedRow = randint(0, studiesTable.model().rowCount() - 1)
+          selectedStudy = studiesTable.model().index(selectedRow, 0).data()
           if selectedStudy != '':
             print('selected study: {}'.format(selectedStudy))
             studiesTable.selectRow(selectedRow)
+            widget.waitForQueries()
 
-          seriesTable = tableWidgets[2]
-          if seriesTable.rowCount > 0:
-            selectedRow = randint(0, seriesTable.rowCount - 1)
-            selectedSeries = seriesTable.item(selectedRow, 0).text()
+          seriesTable = tableViews[2]
+          if seriesTable.model().rowCount() > 0:
+            selectedRow = randint(0, seriesTable.model().rowCount() - 1)
+            selectedSeries = seriesTable.model().index(selectedRow, 0).data()
             if selectedSeries != '':
               print('selected series to download: {}'.format(selectedSeries))
               seriesTable.selectRow(selectedRow)
@@ -1882,6 +2583,7 @@ class IDCBrowserTest(ScriptedLoadableModuleTest):
 
             if loadButton != None:
               loadButton.click()
+              widget.waitForDownloads()
             else:
               print('could not find Load button')
     else:
@@ -0,0 +1,173 @@
+"""Download IDC series without the module user interface.
+
+Run it with the Slicer executable, for example::
+
+  Slicer --no-main-window --python-script <module folder>/IDCBrowserLib/BatchDownload.py -- \\
+    --sql "SELECT SeriesInstanceUID FROM index WHERE collection_id = 'rider_pilot'" --workers 8
+
+Series are selected with --sql, --series, --series-file and/or --manifest,
+with --include-references also the series that the selected segmentations,
+structure sets and annotations refer to, then downloaded in parallel,
+verified and imported into the DICOM database, the same way as from the
+module widget. Progress is written to standard output as one JSON object per
+line, with an "event" field of "resolved", "series", "progress", "loaded" or
+"summary".
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+
+def readSeriesFile(seriesFilePath):
+  """Return the SeriesInstanceUIDs of a text file with one UID per line."""
+  with open(seriesFilePath, encoding="utf-8") as f:
+    return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+
+def emit(event, **fields):
+  fields["event"] = event
+  print(json.dumps(fields), flush=True)
+
+
+class ProgressReporter:
+  """Write the state of a download as JSON lines, at most once per interval."""
+
+  def __init__(self, interval=1.0):
+    self.interval = interval
+    self.startTime = time.time()
+    self.lastReportTime = 0.0
+
+  def __call__(self, downloadScheduler, finishedJobs):
+    for job in finishedJobs:
+      emit("series", SeriesInstanceUID=job.seriesInstanceUID, state=job.state, destination=job.destination,
+           bytes=job.transferredBytes, attempts=job.attempts, error=job.error,
+           seconds=round(job.endTime - job.startTime, 3) if job.startTime and job.endTime else None)
+    now = time.time()
+    if now - self.lastReportTime < self.interval and not downloadScheduler.isFinished():
+      return
+    self.lastReportTime = now
+    jobs = downloadScheduler.jobs
+    emit("progress", elapsedSeconds=round(now - self.startTime, 3),
+         finishedSeries=sum(1 for job in jobs if job.finished), totalSeries=len(jobs),
+         downloadedBytes=downloadScheduler.downloadedBytes(), totalBytes=downloadScheduler.totalBytes(),
+         etaSeconds=downloadScheduler.etaSeconds())
+
+
+def parseArguments(argv):
+  parser = argparse.ArgumentParser(prog="BatchDownload", description=__doc__.split("\n\n")[0])
+  selection = parser.add_argument_group("series selection")
+  selection.add_argument("--sql", help="query on the IDC index returning a SeriesInstanceUID column")
+  selection.add_argument("--series", nargs="+", default=[], metavar="UID", help="SeriesInstanceUIDs")
+  selection.add_argument("--series-file", help="text file with one SeriesInstanceUID per line")
+  selection.add_argument("--manifest", help="s5cmd manifest file exported from the IDC portal")
+  selection.add_argument("--include-references", action="store_true",
+                         help="also download the series that selected segmentations, structure sets and annotations "
+                              "refer to, for example the segmented images")
+  parser.add_argument("--output", help="download folder, defaults to the folder configured in the module")
+  parser.add_argument("--workers", type=int, default=4, help="number of concurrent series transfers")
+  parser.add_argument("--order", choices=["smallest", "queue"], default="smallest",
+                      help="transfer the smallest series first, or in the order they were selected")
+  parser.add_argument("--bandwidth-limit", type=float, default=0, metavar="MB/S",
+                      help="total transfer rate limit in MB/s, 0 for no limit")
+  parser.add_argument("--database", help="DICOM database folder, defaults to the database of the application")
+  parser.add_argument("--no-import", action="store_true", help="download only, do not import into the DICOM database")
+  parser.add_argument("--load", action="store_true", help="load the downloaded series into the scene")
+  parser.add_argument("--progress-interval", type=float, default=1.0, metavar="SECONDS",
+                      help="minimum time between progress events")
+  arguments = parser.parse_args(argv)
+  if not (arguments.sql or arguments.series or arguments.series_file or arguments.manifest):
+    parser.error("select series with --sql, --series, --series-file or --manifest")
+  if arguments.load and arguments.no_import:
+    parser.error("--load requires importing into the DICOM database")
+  return arguments
+
+
+def main(argv=None):
+  """Run a batch download, return the process exit code (0 if all series succeeded)."""
+  arguments = parseArguments(sys.argv[1:] if argv is None else argv)
+
+  import slicer
+  from IDCBrowser import IDCBrowserLogic
+  from IDCBrowserLib import DownloadJob, readManifestUrls
+
+  try:
+    from idc_index import index
+  except ImportError:
+    emit("summary", error="idc-index is not installed, open the IDC Browser module once to install it")
+    return 2
+
+  if arguments.database:
+    from DICOMLib import DICOMUtils
+    DICOMUtils.openDatabase(arguments.database)
+  if not arguments.no_import and not slicer.dicomDatabase.isOpen:
+    emit("summary", error="no DICOM database is open, specify one with --database")
+    return 2
+
+  startTime = time.time()
+  logic = IDCBrowserLogic()
+  logic.idc_version = index.IDCClient.get_idc_version()
+  logic.idc_index_location = index.__file__
+  # the search structures of the module widget are not needed here
+  logic.initializeIDCClient(searchIndexes=False)
+  storagePath = logic.defaultStoragePath()
+  logic.setupLocalCatalog(storagePath)
+  downloadDir = arguments.output or storagePath
+
+  seriesUIDs = list(arguments.series)
+  if arguments.series_file:
+    seriesUIDs.extend(readSeriesFile(arguments.series_file))
+  seriesUIDs = logic.resolveSeriesUIDs(
+    sql=arguments.sql, seriesUIDs=seriesUIDs,
+    manifestUrls=readManifestUrls(arguments.manifest) if arguments.manifest else None)
+  referencedUIDs = []
+  if arguments.include_references:
+    # the reference graph is saved with the query cache of the module, so it is built once per IDC release
+    logic.setupQueryCache(os.path.join(storagePath, "ServerResponseCache"))
+    referencedUIDs = logic.getReferencedSeries(seriesUIDs)
+    # images first, so the series referring to them can be loaded on top of them
+    seriesUIDs = referencedUIDs + seriesUIDs
+  resolveTime = time.time()
+  emit("resolved", series=len(seriesUIDs), referencedSeries=len(referencedUIDs), idcVersion=logic.idc_version,
+       downloadDir=downloadDir, seconds=round(resolveTime - startTime, 3))
+
+  bandwidthLimit = arguments.bandwidth_limit * 1000 * 1000 if arguments.bandwidth_limit > 0 else None
+  downloadScheduler = logic.downloadSeries(
+    seriesUIDs, downloadDir, maxConcurrent=arguments.workers, order=arguments.order, bandwidthLimit=bandwidthLimit,
+    importToDatabase=not arguments.no_import, progressCallback=ProgressReporter(arguments.progress_interval))
+  downloadTime = time.time()
+
+  doneUIDs = [job.seriesInstanceUID for job in downloadScheduler.jobs if job.state == DownloadJob.DONE]
+  failedLoadUIDs = []
+  if arguments.load:
+    failedLoadUIDs = logic.loadSeries(doneUIDs)
+    for timing in logic.loadTimings:
+      emit("loaded", **timing)
+  loadTime = time.time()
+
+  failedUIDs = [job.seriesInstanceUID for job in downloadScheduler.jobs if job.state != DownloadJob.DONE]
+  emit("summary", series=len(seriesUIDs), doneSeries=len(doneUIDs), failedSeries=failedUIDs,
+       failedLoadSeries=failedLoadUIDs, transferredBytes=downloadScheduler.transferredBytes(), totalBytes=downloadScheduler.totalBytes(),
+       resolveSeconds=round(resolveTime - startTime, 3), downloadSeconds=round(downloadTime - resolveTime, 3),
+       loadSeconds=round(loadTime - downloadTime, 3), totalSeconds=round(loadTime - startTime, 3))
+  logic.localCatalog.close()
+  return 1 if failedUIDs or failedLoadUIDs else 0
+
+
+if __name__ == "__main__":
+  # Slicer keeps running after the script unless it is told to exit, so exit on errors too
+  exitCode = 2
+  try:
+    exitCode = main()
+  except SystemExit as error:
+    # argparse errors and --help
+    exitCode = error.code if isinstance(error.code, int) else 2
+  except BaseException as error:
+    import traceback
+    traceback.print_exc()
+    emit("summary", error="{0}: {1}".format(type(error).__name__, error))
+  finally:
+    import slicer
+    slicer.util.exit(exitCode)
@@ -0,0 +1,462 @@
+import concurrent.futures
+import logging
+import os
+import shutil
+import signal
+import subprocess
+import tempfile
+import time
+
+
+def countFiles(path, extension=".dcm"):
+  """Return the number of files with the given extension directly or indirectly below path."""
+  count = 0
+  for _, _, fileNames in os.walk(path):
+    count += sum(1 for fileName in fileNames if fileName.lower().endswith(extension))
+  return count
+
+
+def folderSize(path):
+  """Return the total size in bytes of the files below path."""
+  total = 0
+  try:
+    with os.scandir(path) as it:
+      for entry in it:
+        try:
+          if entry.is_file(follow_symlinks=False):
+            total += entry.stat(follow_symlinks=False).st_size
+          elif entry.is_dir(follow_symlinks=False):
+            total += folderSize(entry.path)
+        except OSError:
+          pass
+  except OSError:
+    pass
+  return total
+
+
+# series_size_MB of the index is rounded, allow for that when comparing sizes
+SIZE_TOLERANCE = 0.01
+
+
+def verifySeriesFolder(folder, expectedInstanceCount=None, expectedBytes=None, folderBytes=None):
+  """Return None if folder holds a complete series, otherwise a description of the problem."""
+  if not os.path.isdir(folder):
+    return "folder does not exist"
+  if expectedInstanceCount:
+    instanceCount = countFiles(folder)
+    if instanceCount < expectedInstanceCount:
+      return "{} of {} instances downloaded".format(instanceCount, expectedInstanceCount)
+  if expectedBytes:
+    if folderBytes is None:
+      folderBytes = folderSize(folder)
+    if folderBytes < expectedBytes * (1 - SIZE_TOLERANCE):
+      return "{} of {} bytes downloaded".format(folderBytes, expectedBytes)
+  return None
+
+
+def linkSeriesFolder(sourceFolder, destinationFolder):
+  """Hard link the files of sourceFolder into destinationFolder, copying where links are not possible.
+
+  Returns the number of files linked or copied.
+  """
+  fileCount = 0
+  for root, _, fileNames in os.walk(sourceFolder):
+    targetRoot = os.path.join(destinationFolder, os.path.relpath(root, sourceFolder))
+    os.makedirs(targetRoot, exist_ok=True)
+    for fileName in fileNames:
+      source = os.path.join(root, fileName)
+      target = os.path.join(targetRoot, fileName)
+      if os.path.exists(target) and os.path.getsize(target) == os.path.getsize(source):
+        continue
+      try:
+        if os.path.exists(target):
+          os.remove(target)
+        os.link(source, target)
+      except OSError:
+        # different file system or no hard link support
+        shutil.copy2(source, target)
+      fileCount += 1
+  return fileCount
+
+
+def completeLocalSeries(destination, expectedInstanceCount=None, expectedBytes=None, sourceFolder=None):
+  """Return (complete, folder bytes) of a series folder, linking it from sourceFolder first if needed.
+
+  The series is complete if destination already holds it, or if
+  sourceFolder holds it and could be linked (or copied) into destination.
+  """
+  if verifySeriesFolder(destination, expectedInstanceCount, expectedBytes) is None:
+    return True, folderSize(destination)
+  if sourceFolder and verifySeriesFolder(sourceFolder, expectedInstanceCount, expectedBytes) is None:
+    logging.debug("Linking series folder {0} from {1}".format(destination, sourceFolder))
+    linkSeriesFolder(sourceFolder, destination)
+    folderBytes = folderSize(destination)
+    return verifySeriesFolder(destination, expectedInstanceCount, expectedBytes, folderBytes) is None, folderBytes
+  return False, 0
+
+
+def readManifestUrls(manifestPath):
+  """Return the s3:// urls listed in an s5cmd manifest file."""
+  urls = []
+  with open(manifestPath, encoding="utf-8") as f:
+    for line in f:
+      urls.extend(token.strip('"') for token in line.split() if token.strip('"').startswith("s3://"))
+  return urls
+
+
+class DownloadJob:
+  """Download of a single series with s5cmd.
+
+  expectedInstanceCount and expectedBytes come from the IDC index and are used
+  to verify the downloaded series.
+  """
+
+  QUEUED = "queued"
+  CHECKING = "checking"
+  DOWNLOADING = "downloading"
+  DONE = "done"
+  FAILED = "failed"
+  CANCELLED = "cancelled"
+
+  def __init__(self, seriesInstanceUID, url, destination, expectedBytes=0, expectedInstanceCount=None, priority=0):
+    self.seriesInstanceUID = seriesInstanceUID
+    self.url = url
+    self.destination = destination
+    self.expectedBytes = expectedBytes
+    self.expectedInstanceCount = expectedInstanceCount
+    # jobs with lower priority values are started first
+    self.priority = priority
+    self.state = DownloadJob.QUEUED
+    self.attempts = 0
+    self.downloadedBytes = 0
+    # bytes that were already on disk when the transfer started
+    self.initialBytes = 0
+    self.paused = False
+    self.process = None
+    self.errorFile = None
+    self.error = None
+    self.startTime = None
+    self.endTime = None
+    # a retried job is not started again before this time
+    self.retryTime = None
+
+  @property
+  def finished(self):
+    return self.state in (DownloadJob.DONE, DownloadJob.FAILED, DownloadJob.CANCELLED)
+
+  @property
+  def transferredBytes(self):
+    return max(self.downloadedBytes - self.initialBytes, 0)
+
+  @property
+  def progress(self):
+    """Fraction of the expected size downloaded so far, between 0 and 1."""
+    if self.state == DownloadJob.DONE:
+      return 1.0
+    if not self.expectedBytes:
+      return 0.0
+    return min(self.downloadedBytes / self.expectedBytes, 1.0)
+
+
+class DownloadScheduler:
+  """Run per-series s5cmd downloads, at most maxConcurrent at a time.
+
+  The scheduler does not block: call poll() periodically (for example from a
+  QTimer) to start queued jobs, update progress and collect the jobs that
+  finished since the previous call. Jobs passed to checkLocal() are first
+  checked for a complete local copy on a worker thread, since verifying and
+  linking series folders can take long.
+
+  Transfers use ``s5cmd sync --size-only``, which skips instances already
+  present with the expected size, so an interrupted series only fetches the
+  missing or truncated files when it is downloaded again. A finished transfer
+  is verified against the instance count and size of the index. Transfers
+  that fail, for example on a network error or throttling, or that miss
+  instances are retried up to maxAttempts times, waiting retryDelay seconds
+  before the first retry and twice as long before each further one.
+
+  Queued jobs are started smallest first (order SMALLEST_FIRST) or in the
+  order they were added (QUEUE_ORDER), after their priority. If bandwidthLimit
+  (bytes per second) is set, running transfers are paused with SIGSTOP while
+  the measured throughput exceeds it; where processes cannot be paused only
+  the start of new transfers is held back.
+  """
+
+  SMALLEST_FIRST = "smallest"
+  QUEUE_ORDER = "queue"
+
+  # allowed burst above bandwidthLimit, in seconds of transfer at the limit
+  BURST_SECONDS = 2.0
+  # weight of the latest measurement in the throughput average
+  THROUGHPUT_SMOOTHING = 0.3
+
+  # Index columns that determine the folder of a downloaded series, the layout
+  # is the same as the default dirTemplate of idc-index.
+  SERIES_FOLDER_COLUMNS = ["collection_id", "PatientID", "StudyInstanceUID", "Modality", "SeriesInstanceUID"]
+
+  @staticmethod
+  def seriesFolder(downloadDir, collectionID, patientID, studyUID, modality, seriesUID):
+    """Return the folder a series is downloaded into."""
+    return os.path.join(downloadDir, str(collectionID), str(patientID), str(studyUID),
+                        "{}_{}".format(modality, seriesUID))
+
+  def __init__(self, s5cmdPath, maxConcurrent=4, endpointUrl="https://s3.amazonaws.com", maxAttempts=3,
+               order=SMALLEST_FIRST, bandwidthLimit=None, retryDelay=2.0):
+    self.s5cmdPath = s5cmdPath
+    self.maxConcurrent = max(1, int(maxConcurrent))
+    self.maxAttempts = maxAttempts
+    self.retryDelay = retryDelay
+    self.endpointUrl = endpointUrl
+    self.order = order
+    self.bandwidthLimit = bandwidthLimit
+    self.jobs = []
+    self._jobsBySeries = {}
+    # job -> future of completeLocalSeries()
+    self._localChecks = {}
+    self._checkPool = None
+
+    # measured throughput in bytes per second
+    self.throughput = 0.0
+    self._lastPollTime = None
+    self._lastTransferredBytes = 0
+    self._bandwidthTokens = 0.0
+
+  def addJob(self, job):
+    """Add job, replacing a finished (done, failed or cancelled) job of the same series."""
+    previousJob = self._jobsBySeries.get(job.seriesInstanceUID)
+    if previousJob is not None:
+      if not previousJob.finished:
+        raise ValueError("Series {0} is already being downloaded".format(job.seriesInstanceUID))
+      self.jobs.remove(previousJob)
+    self.jobs.append(job)
+    self._jobsBySeries[job.seriesInstanceUID] = job
+    return job
+
+  def job(self, seriesInstanceUID):
+    return self._jobsBySeries.get(seriesInstanceUID)
+
+  def activeJobs(self):
+    return [job for job in self.jobs if job.state == DownloadJob.DOWNLOADING]
+
+  def isFinished(self):
+    return all(job.finished for job in self.jobs)
+
+  def totalBytes(self):
+    return sum(job.expectedBytes for job in self.jobs)
+
+  def downloadedBytes(self):
+    return sum(job.expectedBytes if job.state == DownloadJob.DONE else job.downloadedBytes for job in self.jobs)
+
+  def transferredBytes(self):
+    return sum(job.transferredBytes for job in self.jobs)
+
+  def etaSeconds(self):
+    """Return the estimated time until all jobs are done from the measured throughput, or None."""
+    if self.throughput <= 0:
+      return None
+    return max(self.totalBytes() - self.downloadedBytes(), 0) / self.throughput
+
+  def queuedJobs(self):
+    """Return the queued jobs in the order they will be started."""
+    queuedJobs = [job for job in self.jobs if job.state == DownloadJob.QUEUED]
+    if self.order == DownloadScheduler.SMALLEST_FIRST:
+      return sorted(queuedJobs, key=lambda job: (job.priority, job.expectedBytes))
+    return sorted(queuedJobs, key=lambda job: job.priority)
+
+  def commandLine(self, job):
+    return [self.s5cmdPath, "--no-sign-request", "--endpoint-url", self.endpointUrl,
+            "sync", "--size-only", job.url, job.destination + os.sep]
+
+  def startJob(self, job):
+    os.makedirs(job.destination, exist_ok=True)
+    if job.attempts == 0:
+      job.initialBytes = folderSize(job.destination)
+      job.downloadedBytes = job.initialBytes
+    # s5cmd prints one line per copied file, a temporary file cannot fill up like a pipe
+    job.errorFile = tempfile.TemporaryFile(mode="w+")
+    try:
+      job.process = subprocess.Popen(self.commandLine(job), stdout=subprocess.DEVNULL, stderr=job.errorFile)
+    except OSError as error:
+      job.errorFile.close()
+      job.errorFile = None
+      job.state = DownloadJob.FAILED
+      job.error = str(error)
+      job.endTime = time.time()
+      return
+    job.state = DownloadJob.DOWNLOADING
+    job.attempts += 1
+    if job.startTime is None:
+      job.startTime = time.time()
+    logging.debug("Started download of series {0} into {1}".format(job.seriesInstanceUID, job.destination))
+
+  def finishJob(self, job, returnCode):
+    job.endTime = time.time()
+    job.downloadedBytes = folderSize(job.destination)
+    if job.state == DownloadJob.CANCELLED:
+      pass
+    else:
+      if returnCode == 0:
+        job.error = self.verify(job)
+      else:
+        job.errorFile.seek(0)
+        job.error = job.errorFile.read().strip() or "s5cmd exited with code {}".format(returnCode)
+      if job.error is None:
+        job.state = DownloadJob.DONE
+      elif job.attempts < self.maxAttempts:
+        logging.warning("Retrying download of series {0}: {1}".format(job.seriesInstanceUID, job.error))
+        job.state = DownloadJob.QUEUED
+        job.retryTime = job.endTime + self.retryDelay * 2 ** (job.attempts - 1)
+      else:
+        job.state = DownloadJob.FAILED
+        logging.error("Download of series {0} failed: {1}".format(job.seriesInstanceUID, job.error))
+    job.errorFile.close()
+    job.errorFile = None
+    job.process = None
+
+  def verify(self, job):
+    """Return None if the downloaded series is complete, otherwise a description of the problem."""
+    return verifySeriesFolder(job.destination, job.expectedInstanceCount, job.expectedBytes, job.downloadedBytes)
+
+  def checkLocal(self, job, sourceFolder=None):
+    """Complete a queued job without transfer if its series is already on disk.
+
+    The destination folder is verified, and linked from sourceFolder if that
+    holds a complete copy, on a worker thread. poll() returns the job as
+    done if the series is complete, otherwise it is downloaded as usual.
+    """
+    if self._checkPool is None:
+      self._checkPool = concurrent.futures.ThreadPoolExecutor(max_workers=2, thread_name_prefix="IDCBrowserCheck")
+    job.state = DownloadJob.CHECKING
+    self._localChecks[job] = self._checkPool.submit(
+      completeLocalSeries, job.destination, job.expectedInstanceCount, job.expectedBytes, sourceFolder)
+
+  def finishLocalChecks(self):
+    """Apply the finished local checks, return the jobs they completed or failed."""
+    finishedJobs = []
+    for job, future in list(self._localChecks.items()):
+      if not future.done():
+        continue
+      del self._localChecks[job]
+      if job.state != DownloadJob.CHECKING:
+        # cancelled meanwhile
+        continue
+      try:
+        complete, folderBytes = future.result()
+      except Exception as error:
+        # for example a full disk while copying from another file system
+        job.state = DownloadJob.FAILED
+        job.error = "Failed to use the local copy of the series: {0}".format(error)
+        job.endTime = time.time()
+        logging.error("Series {0}: {1}".format(job.seriesInstanceUID, job.error))
+        finishedJobs.append(job)
+        continue
+      if not complete:
+        job.state = DownloadJob.QUEUED
+        continue
+      logging.debug("Series {0} is already available locally".format(job.seriesInstanceUID))
+      job.downloadedBytes = folderBytes
+      job.initialBytes = folderBytes
+      job.state = DownloadJob.DONE
+      job.startTime = job.endTime = time.time()
+      finishedJobs.append(job)
+    return finishedJobs
+
+  def setPaused(self, job, paused):
+    if job.paused == paused or not hasattr(signal, "SIGSTOP"):
+      return
+    try:
+      job.process.send_signal(signal.SIGSTOP if paused else signal.SIGCONT)
+      job.paused = paused
+    except OSError:
+      pass
+
+  def updateThroughput(self, now):
+    transferredBytes = self.transferredBytes()
+    if self._lastPollTime is None:
+      elapsed = 0.0
+      transferred = 0
+    else:
+      elapsed = now - self._lastPollTime
+      transferred = max(transferredBytes - self._lastTransferredBytes, 0)
+    self._lastPollTime = now
+    self._lastTransferredBytes = transferredBytes
+    if elapsed > 0:
+      self.throughput += self.THROUGHPUT_SMOOTHING * (transferred / elapsed - self.throughput)
+    return transferred, elapsed
+
+  def throttle(self, transferred, elapsed):
+    """Pause or resume running transfers to stay below bandwidthLimit, return True if over the limit."""
+    if not self.bandwidthLimit:
+      for job in self.activeJobs():
+        self.setPaused(job, False)
+      return False
+    # token bucket: the limit adds tokens over time, transferred bytes consume them
+    self._bandwidthTokens = min(self._bandwidthTokens + self.bandwidthLimit * elapsed,
+                                self.bandwidthLimit * self.BURST_SECONDS) - transferred
+    overLimit = self._bandwidthTokens < 0
+    for job in self.activeJobs():
+      self.setPaused(job, overLimit)
+    return overLimit
+
+  def poll(self):
+    """Start queued jobs, update progress and return the jobs finished since the last call."""
+    finishedJobs = self.finishLocalChecks()
+    for job in self.activeJobs():
+      returnCode = job.process.poll()
+      if returnCode is None:
+        job.downloadedBytes = folderSize(job.destination)
+      else:
+        self.finishJob(job, returnCode)
+        if job.finished:
+          finishedJobs.append(job)
+
+    transferred, elapsed = self.updateThroughput(time.time())
+    if self.throttle(transferred, elapsed):
+      return finishedJobs
+
+    runningCount = len(self.activeJobs())
+    now = time.time()
+    for job in self.queuedJobs():
+      if runningCount >= self.maxConcurrent:
+        break
+      if job.retryTime is not None and job.retryTime > now:
+        continue
+      self.startJob(job)
+      if job.state == DownloadJob.DOWNLOADING:
+        runningCount += 1
+      else:
+        finishedJobs.append(job)
+    return finishedJobs
+
+  def cancel(self, timeout=5.0):
+    """Drop queued jobs and stop the running transfers, return the affected jobs.
+
+    Running s5cmd processes are terminated and killed if they have not exited
+    within timeout seconds. Instances already transferred are kept, so
+    downloading the series again resumes them.
+    """
+    runningJobs = self.activeJobs()
+    cancelledJobs = []
+    for job in self.jobs:
+      if job.state in (DownloadJob.QUEUED, DownloadJob.CHECKING, DownloadJob.DOWNLOADING):
+        job.state = DownloadJob.CANCELLED
+        cancelledJobs.append(job)
+    for future in self._localChecks.values():
+      future.cancel()
+
+    for job in runningJobs:
+      # a stopped process would not handle the termination signal
+      self.setPaused(job, False)
+      job.process.terminate()
+    deadline = time.time() + timeout
+    for job in runningJobs:
+      try:
+        returnCode = job.process.wait(max(0.0, deadline - time.time()))
+      except subprocess.TimeoutExpired:
+        logging.warning("s5cmd did not stop for series {0}, killing it".format(job.seriesInstanceUID))
+        job.process.kill()
+        returnCode = job.process.wait()
+      self.finishJob(job, returnCode)
+      logging.info("Cancelled download of series {0}, kept {1} bytes for resuming".format(
+        job.seriesInstanceUID, job.downloadedBytes))
+    return cancelledJobs
@@ -0,0 +1,123 @@
+import logging
+import time
+
+import numpy as np
+
+
+class FacetIndex:
+  """Faceted filtering of the series of the IDC index.
+
+  Every facet column is encoded once as an integer code per row, and the rows
+  of each value are kept as a contiguous slice of one array sorted by code,
+  so the row set of a value is a view, not a copy. A selection maps facets to
+  accepted values: rows must match one of the values of every selected facet.
+  Counts are computed with np.bincount over the codes of the matching rows,
+  each facet ignoring its own selection so that its other values stay
+  selectable.
+  """
+
+  # (column, label), SeriesYear is derived from SeriesDate
+  FACETS = [
+    ("collection_id", "Collection"),
+    ("Modality", "Modality"),
+    ("BodyPartExamined", "Body Part Examined"),
+    ("Manufacturer", "Manufacturer"),
+    ("ManufacturerModelName", "Manufacturer Model Name"),
+    ("SeriesYear", "Series Year"),
+  ]
+
+  def __init__(self, index, facets=None):
+    import pandas as pd
+
+    startTime = time.time()
+    self.rowCount = len(index)
+    self._seriesUIDs = index["SeriesInstanceUID"].array
+    self.facets = []
+    self.labels = {}
+    self._values = {}
+    self._codes = {}
+    self._rowsByCode = {}
+    self._offsets = {}
+    for column, label in (facets or self.FACETS):
+      if column == "SeriesYear" and "SeriesDate" in index.columns:
+        columnValues = pd.to_datetime(index["SeriesDate"], errors="coerce").dt.year.astype("Int64")
+      elif column in index.columns:
+        columnValues = index[column]
+      else:
+        continue
+      codes, values = pd.factorize(columnValues, sort=True, use_na_sentinel=True)
+      values = [str(value) for value in values]
+      # missing values get the last code
+      codes = np.where(codes < 0, len(values), codes).astype(np.int32 if len(values) >= 32767 else np.int16)
+      values.append(None)
+      counts = np.bincount(codes, minlength=len(values))
+      self.facets.append(column)
+      self.labels[column] = label
+      self._values[column] = values
+      self._codes[column] = codes
+      self._rowsByCode[column] = np.argsort(codes, kind="stable")
+      self._offsets[column] = np.concatenate(([0], np.cumsum(counts)))
+    self._maskCache = {}
+    logging.info("FacetIndex built for {0} facets of {1} series in {2:.2f} seconds".format(
+      len(self.facets), self.rowCount, time.time() - startTime))
+
+  def values(self, facet):
+    """Return the values of a facet, None stands for series without a value."""
+    return self._values[facet]
+
+  def valueRows(self, facet, value):
+    """Return the row positions of the series with value in facet."""
+    try:
+      code = self._values[facet].index(value)
+    except ValueError:
+      return np.empty(0, dtype=np.int64)
+    offsets = self._offsets[facet]
+    return self._rowsByCode[facet][offsets[code]:offsets[code + 1]]
+
+  def _facetMask(self, facet, values):
+    """Return the boolean row mask of the series matching one of values in facet."""
+    key = (facet, frozenset(values))
+    mask = self._maskCache.get(key)
+    if mask is None:
+      mask = np.zeros(self.rowCount, dtype=bool)
+      for value in values:
+        mask[self.valueRows(facet, value)] = True
+      if len(self._maskCache) > 64:
+        self._maskCache.clear()
+      self._maskCache[key] = mask
+    return mask
+
+  def _mask(self, selection, excludedFacet=None):
+    """Return the row mask of selection without the facet excludedFacet, None if nothing is filtered."""
+    mask = None
+    for facet, values in selection.items():
+      if facet == excludedFacet or not values or facet not in self._codes:
+        continue
+      facetMask = self._facetMask(facet, values)
+      mask = facetMask.copy() if mask is None else np.logical_and(mask, facetMask, out=mask)
+    return mask
+
+  def rows(self, selection):
+    """Return the row positions of the series matching selection, a facet -> values dict."""
+    mask = self._mask(selection)
+    return np.arange(self.rowCount) if mask is None else np.flatnonzero(mask)
+
+  def seriesInstanceUIDs(self, selection):
+    """Return the SeriesInstanceUIDs of the series matching selection."""
+    return [str(uid) for uid in self._seriesUIDs.take(self.rows(selection))]
+
+  def counts(self, selection):
+    """Return facet -> [(value, count), ...] of the values with matching series, most frequent first.
+
+    The counts of a facet apply the selection of all other facets, they are
+    the number of series that selecting the value would add.
+    """
+    counts = {}
+    for facet in self.facets:
+      codes = self._codes[facet]
+      mask = self._mask(selection, excludedFacet=facet)
+      valueCounts = np.bincount(codes if mask is None else codes[mask], minlength=len(self._values[facet]))
+      order = np.argsort(-valueCounts, kind="stable")
+      values = self._values[facet]
+      counts[facet] = [(values[code], int(valueCounts[code])) for code in order if valueCounts[code]]
+    return counts
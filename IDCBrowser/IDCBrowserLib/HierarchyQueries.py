@@ -0,0 +1,49 @@
+"""Collection, patient, study and series queries over the IDC index.
+
+Each query takes the full list of selected parents and resolves all of
+them in a single isin/groupby pass, instead of one query per selected
+table row. Groupings use observed=True, so they also work on an index with
+categorical columns (see IndexCompaction).
+"""
+
+PATIENT_COLUMNS = ["PatientID", "PatientSex", "PatientAge"]
+STUDY_COLUMNS = ["StudyInstanceUID", "StudyDate", "StudyDescription", "SeriesCount", "PatientID"]
+SERIES_COLUMNS = ["SeriesInstanceUID", "Modality", "SeriesDate", "SeriesDescription", "BodyPartExamined",
+                  "SeriesNumber", "Manufacturer", "ManufacturerModelName", "ImageCount", "series_size_MB",
+                  "StudyInstanceUID", "PatientID", "collection_id"]
+
+
+def _orderBy(frame, column, values):
+  """Sort frame rows by the position of frame[column] in values (stable within a value)."""
+  import pandas as pd
+  order = pd.Categorical(frame[column], categories=pd.unique(pd.Series(values)), ordered=True)
+  return frame.iloc[order.argsort(kind="stable")].reset_index(drop=True)
+
+
+def getPatients(index, collectionID):
+  """Return one row per patient of the collection, sorted by PatientID."""
+  rows = index.loc[index["collection_id"] == collectionID, PATIENT_COLUMNS]
+  patients = rows.groupby("PatientID", sort=True, dropna=False, observed=True).first().reset_index()
+  return patients[PATIENT_COLUMNS]
+
+
+def getStudies(index, patientIDs):
+  """Return one row per study of all the given patients, in the order of patientIDs."""
+  rows = index.loc[index["PatientID"].isin(patientIDs),
+                   ["PatientID", "StudyInstanceUID", "StudyDate", "StudyDescription", "SeriesInstanceUID"]]
+  studies = rows.groupby("StudyInstanceUID", sort=False, dropna=False, observed=True).agg(
+    StudyDate=("StudyDate", "first"),
+    StudyDescription=("StudyDescription", "first"),
+    SeriesCount=("SeriesInstanceUID", "nunique"),
+    PatientID=("PatientID", "first"),
+  ).reset_index()
+  studies = studies.sort_values("StudyDate", kind="stable", na_position="last")
+  return _orderBy(studies, "PatientID", patientIDs)[STUDY_COLUMNS]
+
+
+def getSeries(index, studyUIDs):
+  """Return one row per series of all the given studies, in the order of studyUIDs."""
+  columns = [column for column in SERIES_COLUMNS if column != "ImageCount"]
+  series = index.loc[index["StudyInstanceUID"].isin(studyUIDs), columns + ["instanceCount"]]
+  series = series.rename(columns={"instanceCount": "ImageCount"})
+  return _orderBy(series, "StudyInstanceUID", studyUIDs)[SERIES_COLUMNS]
@@ -0,0 +1,94 @@
+import logging
+import time
+
+
+class IdentifierIndex:
+  """Hash-based lookup of collection, patient, study and series identifiers.
+
+  The index is built once from ``IDCClient.index`` and maps each identifier
+  to its (collection_id, PatientID, StudyInstanceUID) hierarchy path, so that
+  resolving a search string does not require scanning the whole DataFrame.
+  If a SeriesLookup of the same index is given, its series UID hash table is
+  reused instead of building another one.
+  """
+
+  PATH_COLUMNS = ["collection_id", "PatientID", "StudyInstanceUID"]
+
+  def __init__(self, index, seriesLookup=None):
+    import pandas as pd
+
+    startTime = time.time()
+    paths = index[self.PATH_COLUMNS + ["SeriesInstanceUID"]]
+
+    self.collections = set(paths["collection_id"].dropna().unique())
+
+    # Each level keeps one row per identifier (first occurrence, matching
+    # the previous behavior of taking iloc[0] of the boolean mask) and a
+    # hash-backed pandas Index pointing at the row position of the path.
+    self._levels = {}
+    if seriesLookup is not None:
+      seriesPaths = paths if seriesLookup.rowPositions is None else paths.iloc[seriesLookup.rowPositions]
+      self._levels["series"] = (seriesLookup.keys, seriesPaths[self.PATH_COLUMNS].to_numpy())
+    for level, column in (("series", "SeriesInstanceUID"),
+                          ("study", "StudyInstanceUID"),
+                          ("patient", "PatientID")):
+      if level in self._levels:
+        continue
+      levelPaths = paths.drop_duplicates(subset=column, keep="first")
+      keys = pd.Index(levelPaths[column].to_numpy())
+      # pandas builds the hash table lazily, do it now rather than on the first keystroke
+      if len(keys):
+        keys.get_loc(keys[0])
+      self._levels[level] = (keys, levelPaths[self.PATH_COLUMNS].to_numpy())
+
+    logging.info("IdentifierIndex built for {0} series in {1:.2f} seconds.".format(
+      len(self._levels["series"][0]), time.time() - startTime))
+
+  def __len__(self):
+    return len(self._levels["series"][0])
+
+  def _find(self, level, identifier):
+    keys, levelPaths = self._levels[level]
+    try:
+      position = keys.get_loc(identifier)
+    except (KeyError, TypeError):
+      return None
+    if not isinstance(position, int):
+      # get_loc returns a slice or mask for duplicated keys, which cannot
+      # happen after drop_duplicates, but be defensive.
+      return None
+    collectionID, patientID, studyUID = levelPaths[position]
+    return (collectionID, patientID, studyUID)
+
+  def findPatient(self, patientID):
+    path = self._find("patient", patientID)
+    return None if path is None else (path[0], path[1], None)
+
+  def findStudy(self, studyUID):
+    return self._find("study", studyUID)
+
+  def findSeries(self, seriesUID):
+    return self._find("series", seriesUID)
+
+  def lookup(self, identifier):
+    """Resolve an identifier to ``(level, path)``.
+
+    level is one of "collection", "patient", "study" or "series", path is
+    the (collection_id, PatientID, StudyInstanceUID) tuple with entries below
+    the matched level set to None. Returns None if nothing matches.
+    Identifiers are tried in the same order as the previous scan based search.
+    """
+    if identifier in self.collections:
+      return ("collection", (identifier, None, None))
+    path = self.findPatient(identifier)
+    if path is not None:
+      return ("patient", path)
+    if '.' not in identifier:
+      return None
+    path = self.findStudy(identifier)
+    if path is not None:
+      return ("study", path)
+    path = self.findSeries(identifier)
+    if path is not None:
+      return ("series", path)
+    return None
@@ -0,0 +1,111 @@
+import logging
+import os
+
+
+class ImportManifest:
+  """Record of the files already imported into a DICOM database.
+
+  Each imported file is stored with its modification time and size in an
+  append-only text file (one tab separated line per file), so unchanged
+  files can be skipped without asking the indexer to parse them again.
+  A file is imported again if its modification time or size changed.
+  """
+
+  def __init__(self, manifestPath):
+    self.manifestPath = manifestPath
+    self._files = {}
+    self.load()
+
+  def __len__(self):
+    return len(self._files)
+
+  def __contains__(self, path):
+    return os.path.abspath(path) in self._files
+
+  def load(self):
+    self._files = {}
+    lineCount = 0
+    try:
+      with open(self.manifestPath, encoding="utf-8") as f:
+        for line in f:
+          lineCount += 1
+          fields = line.rstrip("\n").split("\t")
+          if len(fields) != 3:
+            # line of an interrupted write
+            continue
+          path, modifiedTime, size = fields
+          try:
+            self._files[path] = (int(modifiedTime), int(size))
+          except ValueError:
+            continue
+    except FileNotFoundError:
+      pass
+    if lineCount > 1000 and lineCount > 2 * len(self._files):
+      # re-imported files are appended again, drop the outdated lines
+      self.compact()
+
+  def compact(self):
+    temporaryPath = self.manifestPath + ".tmp"
+    try:
+      with open(temporaryPath, "w", encoding="utf-8") as f:
+        f.writelines("{}\t{}\t{}\n".format(path, modifiedTime, size)
+                     for path, (modifiedTime, size) in self._files.items())
+      os.replace(temporaryPath, self.manifestPath)
+    except OSError as error:
+      logging.warning("Failed to compact import manifest {0}: {1}".format(self.manifestPath, error))
+
+  def clear(self):
+    self._files = {}
+    try:
+      os.remove(self.manifestPath)
+    except OSError:
+      pass
+
+  def forget(self, directory):
+    """Drop the entries of the files below directory, so they are imported again. Return their count."""
+    prefix = os.path.join(os.path.abspath(directory), "")
+    forgotten = [path for path in self._files if path.startswith(prefix)]
+    for path in forgotten:
+      del self._files[path]
+    if forgotten:
+      self.compact()
+    return len(forgotten)
+
+  def newFiles(self, directory):
+    """Return (files, skippedCount) for the files below directory that were not imported yet.
+
+    files is a list of (path, modifiedTime, size) tuples, pass it to markImported()
+    once the import finished.
+    """
+    files = []
+    skippedCount = 0
+    for root, dirNames, fileNames in os.walk(os.path.abspath(directory)):
+      for fileName in fileNames:
+        path = os.path.join(root, fileName)
+        try:
+          stat = os.stat(path)
+        except OSError:
+          continue
+        signature = (stat.st_mtime_ns, stat.st_size)
+        if self._files.get(path) == signature:
+          skippedCount += 1
+        else:
+          files.append((path, stat.st_mtime_ns, stat.st_size))
+    return files, skippedCount
+
+  def markImported(self, files):
+    if not files:
+      return
+    lines = []
+    for path, modifiedTime, size in files:
+      if "\t" in path or "\n" in path:
+        # cannot be stored in the manifest, it will just be imported again next time
+        continue
+      self._files[path] = (modifiedTime, size)
+      lines.append("{}\t{}\t{}\n".format(path, modifiedTime, size))
+    try:
+      os.makedirs(os.path.dirname(self.manifestPath), exist_ok=True)
+      with open(self.manifestPath, "a", encoding="utf-8") as f:
+        f.writelines(lines)
+    except OSError as error:
+      logging.warning("Failed to update import manifest {0}: {1}".format(self.manifestPath, error))
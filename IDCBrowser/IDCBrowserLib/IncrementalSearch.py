@@ -0,0 +1,169 @@
+import bisect
+import collections
+import logging
+import time
+
+import numpy as np
+
+
+SearchHit = collections.namedtuple("SearchHit", ["field", "value", "level", "path", "matchType"])
+SearchHit.__doc__ = """A single incremental search result.
+
+path is the (collection_id, PatientID, StudyInstanceUID, SeriesInstanceUID)
+tuple of the first index row holding the value, truncated below level.
+matchType is one of "exact", "prefix" or "substring".
+"""
+
+
+class IncrementalSearch:
+  """Prefix and substring search over identifiers and descriptions of the IDC index.
+
+  All distinct values of the searched columns are kept lowercased in one sorted
+  list, so prefix queries are answered by bisection. Substring queries scan a
+  single joined buffer of the descriptive fields with ``str.find`` and, while
+  the user keeps typing, only re-check the previous result set instead of the
+  whole buffer.
+  """
+
+  PATH_COLUMNS = ["collection_id", "PatientID", "StudyInstanceUID", "SeriesInstanceUID"]
+
+  # (column, level) in ranking order
+  FIELDS = [
+    ("collection_id", "collection"),
+    ("PatientID", "patient"),
+    ("StudyInstanceUID", "study"),
+    ("SeriesInstanceUID", "series"),
+    ("StudyDescription", "study"),
+    ("SeriesDescription", "series"),
+  ]
+
+  # UIDs are only matched by prefix: every UID contains the same root
+  # segments, so substring matches on them are meaningless and expensive.
+  SUBSTRING_FIELDS = ["collection_id", "PatientID", "StudyDescription", "SeriesDescription"]
+  MIN_SUBSTRING_LENGTH = 3
+  MAX_SUBSTRING_CANDIDATES = 1000
+
+  LEVEL_DEPTH = {"collection": 1, "patient": 2, "study": 3, "series": 4}
+
+  def __init__(self, index):
+    startTime = time.time()
+
+    # the column arrays themselves, to_numpy() would copy categorical and Arrow string columns
+    self._pathArrays = [index[column].array for column in self.PATH_COLUMNS]
+
+    values = []
+    keys = []
+    fieldCodes = []
+    rows = []
+    for fieldCode, (column, level) in enumerate(self.FIELDS):
+      if column not in index.columns:
+        continue
+      columnValues = index[column]
+      firstRows = np.flatnonzero(~columnValues.duplicated(keep="first").to_numpy() & columnValues.notna().to_numpy())
+      for row, value in zip(firstRows, columnValues.to_numpy()[firstRows]):
+        value = str(value)
+        if not value or value == "None":
+          continue
+        values.append(value)
+        keys.append(value.lower())
+        fieldCodes.append(fieldCode)
+        rows.append(row)
+
+    # Object arrays rather than lists: the garbage collector does not traverse
+    # them, which would otherwise cause pauses of tens of ms while typing.
+    order = sorted(range(len(keys)), key=keys.__getitem__)
+    self._values = np.array([values[i] for i in order], dtype=object)
+    self._keys = np.array([keys[i] for i in order], dtype=object)
+    self._fieldCodes = np.asarray(fieldCodes, dtype=np.int8)[order]
+    self._rows = np.asarray(rows, dtype=np.int64)[order]
+
+    # Joined buffer of the descriptive fields for substring scans, "\n" never
+    # appears in the values so a match cannot span two entries.
+    substringFieldCodes = [fieldCode for fieldCode, (column, _) in enumerate(self.FIELDS) if column in self.SUBSTRING_FIELDS]
+    self._substringEntries = np.flatnonzero(np.isin(self._fieldCodes, substringFieldCodes))
+    substringKeys = self._keys[self._substringEntries]
+    self._substringBuffer = "\n".join(substringKeys)
+    self._substringOffsets = np.cumsum([0] + [len(key) + 1 for key in substringKeys])
+
+    self._lastQuery = None
+    self._lastCandidates = None
+
+    logging.info("IncrementalSearch built for {0} values in {1:.2f} seconds.".format(
+      len(self._keys), time.time() - startTime))
+
+  def __len__(self):
+    return len(self._keys)
+
+  def _hit(self, entry, matchType):
+    column, level = self.FIELDS[self._fieldCodes[entry]]
+    row = self._rows[entry]
+    depth = self.LEVEL_DEPTH[level]
+    path = tuple(self._pathArrays[i][row] if i < depth else None for i in range(len(self.PATH_COLUMNS)))
+    return SearchHit(column, self._values[entry], level, path, matchType)
+
+  def _prefixRange(self, query):
+    first = bisect.bisect_left(self._keys, query)
+    last = bisect.bisect_left(self._keys, query + "\U0010ffff", first)
+    return first, last
+
+  def _substringCandidates(self, query):
+    """Return (entries, complete) for entries of the substring buffer containing query.
+    """
+    if (self._lastQuery is not None and query.startswith(self._lastQuery)
+        and self._lastCandidates is not None and self._lastCandidates[1]):
+      # Typing narrows the previous result set, no need to rescan the buffer
+      entries = [entry for entry in self._lastCandidates[0] if query in self._keys[entry]]
+      return entries, True
+
+    entries = []
+    buffer = self._substringBuffer
+    offsets = self._substringOffsets
+    position = buffer.find(query)
+    while position >= 0:
+      if len(entries) >= self.MAX_SUBSTRING_CANDIDATES:
+        return entries, False
+      substringIndex = bisect.bisect_right(offsets, position) - 1
+      entries.append(int(self._substringEntries[substringIndex]))
+      position = buffer.find(query, int(offsets[substringIndex + 1]))
+    return entries, True
+
+  def search(self, query, limit=20):
+    """Return up to limit SearchHit for query, best matches first.
+
+    Exact matches come first, then prefix matches in lexicographic order,
+    then substring matches of collection IDs, patient IDs and descriptions.
+    The substring buffer is only scanned if prefix matches do not fill limit.
+    """
+    query = query.strip().lower()
+    if not query:
+      self._lastQuery = None
+      self._lastCandidates = None
+      return []
+
+    hits = []
+    seen = set()
+    first, last = self._prefixRange(query)
+    # exact matches sort at the beginning of the prefix range
+    for entry in range(first, last):
+      if len(hits) >= limit:
+        break
+      matchType = "exact" if self._keys[entry] == query else "prefix"
+      hits.append(self._hit(entry, matchType))
+      seen.add(entry)
+    hits.sort(key=lambda hit: hit.matchType != "exact")
+
+    if len(hits) < limit and len(query) >= self.MIN_SUBSTRING_LENGTH:
+      entries, complete = self._substringCandidates(query)
+      self._lastQuery = query
+      self._lastCandidates = (entries, complete)
+      for entry in entries:
+        if len(hits) >= limit:
+          break
+        if entry in seen:
+          continue
+        hits.append(self._hit(entry, "substring"))
+    else:
+      self._lastQuery = None
+      self._lastCandidates = None
+
+    return hits
@@ -0,0 +1,118 @@
+"""Compact in-memory representation of the IDC index.
+
+The index is kept in memory for the whole session. Most of its columns are
+Python object strings: identifiers and descriptions that repeat on many rows
+(collection_id, Modality, Manufacturer, StudyInstanceUID, ...) and unique
+series UIDs. compactIndex() stores repeated values as categoricals, unique
+strings in Arrow string buffers (if pyarrow is installed), and drops the
+columns the browser does not read.
+"""
+
+import logging
+import time
+
+from . import HierarchyQueries
+from .DownloadScheduler import DownloadScheduler
+from .IdentifierIndex import IdentifierIndex
+from .IncrementalSearch import IncrementalSearch
+
+# Columns read by the browser, idc-index uses the last ones to download series
+BROWSER_COLUMNS = list(dict.fromkeys(
+  HierarchyQueries.PATIENT_COLUMNS
+  + HierarchyQueries.STUDY_COLUMNS
+  + HierarchyQueries.SERIES_COLUMNS
+  + DownloadScheduler.SERIES_FOLDER_COLUMNS
+  + IdentifierIndex.PATH_COLUMNS
+  + IncrementalSearch.PATH_COLUMNS
+  + [column for column, _ in IncrementalSearch.FIELDS]
+  + ["instanceCount", "series_size_MB", "series_aws_url", "crdc_series_uuid", "aws_bucket"]))
+
+# String columns with at most this ratio of distinct values to rows are stored as categoricals
+CATEGORY_MAX_RATIO = 0.5
+
+
+def memoryUsage(frame):
+  """Return a column -> bytes dict of the memory used by frame, including the string objects."""
+  return {column: int(size) for column, size in frame.memory_usage(deep=True, index=False).items()}
+
+
+def compactIndex(index, keepColumns=BROWSER_COLUMNS, categoryMaxRatio=CATEGORY_MAX_RATIO):
+  """Return (compact index, report) for an IDC index DataFrame.
+
+  Columns not in keepColumns are dropped (pass None to keep all). String
+  columns with few distinct values become categoricals, the other string
+  columns become Arrow strings when pyarrow is available. The report holds
+  the memory used before and after, per column and in total.
+  """
+  import pandas as pd
+
+  startTime = time.time()
+  usageBefore = memoryUsage(index)
+
+  try:
+    import pyarrow  # noqa: F401
+    arrowStringDtype = pd.StringDtype("pyarrow")
+  except ImportError:
+    arrowStringDtype = None
+
+  droppedColumns = []
+  if keepColumns is not None:
+    droppedColumns = [column for column in index.columns if column not in keepColumns]
+  compact = index.drop(columns=droppedColumns)
+
+  categoryColumns = []
+  arrowColumns = []
+  for column in compact.columns:
+    values = compact[column]
+    if not (pd.api.types.is_object_dtype(values.dtype) or pd.api.types.is_string_dtype(values.dtype)):
+      continue
+    if isinstance(values.dtype, pd.CategoricalDtype):
+      continue
+    try:
+      distinctCount = values.nunique(dropna=True)
+    except TypeError:
+      # unhashable values, for example lists
+      continue
+    if len(values) and distinctCount <= categoryMaxRatio * len(values):
+      compact[column] = values.astype("category")
+      categoryColumns.append(column)
+    elif isinstance(values.dtype, pd.ArrowDtype):
+      # already Arrow strings, memory mapped from the index store
+      continue
+    elif arrowStringDtype is not None and values.dtype != arrowStringDtype:
+      try:
+        compact[column] = values.astype(arrowStringDtype)
+      except (TypeError, ValueError) as error:
+        # not a plain string column, for example lists of values
+        logging.debug("Keeping column {0} as is: {1}".format(column, error))
+        continue
+      arrowColumns.append(column)
+
+  usageAfter = memoryUsage(compact)
+  report = {
+    "beforeBytes": sum(usageBefore.values()),
+    "afterBytes": sum(usageAfter.values()),
+    "columnsBefore": usageBefore,
+    "columnsAfter": usageAfter,
+    "droppedColumns": droppedColumns,
+    "categoryColumns": categoryColumns,
+    "arrowColumns": arrowColumns,
+    "seconds": time.time() - startTime,
+  }
+  return compact, report
+
+
+def formatMemoryReport(report, maxColumns=10):
+  """Return a human readable summary of a compactIndex() report."""
+  megabyte = 1024 * 1024
+  lines = ["IDC index memory: {0:.1f} MB -> {1:.1f} MB in {2:.2f} seconds "
+           "({3} columns dropped, {4} categorical, {5} Arrow strings)".format(
+             report["beforeBytes"] / megabyte, report["afterBytes"] / megabyte, report["seconds"],
+             len(report["droppedColumns"]), len(report["categoryColumns"]), len(report["arrowColumns"]))]
+  savings = sorted(report["columnsBefore"].items(),
+                   key=lambda item: item[1] - report["columnsAfter"].get(item[0], 0), reverse=True)
+  for column, before in savings[:maxColumns]:
+    after = report["columnsAfter"].get(column)
+    lines.append("  {0}: {1:.1f} MB -> {2}".format(
+      column, before / megabyte, "dropped" if after is None else "{0:.1f} MB".format(after / megabyte)))
+  return "\n".join(lines)
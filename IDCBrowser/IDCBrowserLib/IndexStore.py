@@ -0,0 +1,218 @@
+import glob
+import logging
+import os
+import time
+
+
+def residentMemoryBytes():
+  """Return the resident memory of the process in bytes, or None if it cannot be determined."""
+  try:
+    with open("/proc/self/statm") as f:
+      return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+  except (OSError, ValueError, AttributeError):
+    pass
+  try:
+    import psutil
+    return psutil.Process().memory_info().rss
+  except ImportError:
+    return None
+
+
+def findIndexFiles(idcIndexLocation):
+  """Return (parquet path, csv zip path) of the index files shipped with idc-index, None if missing."""
+  parquetPath = None
+  try:
+    import idc_index_data
+    parquetPath = idc_index_data.IDC_INDEX_PARQUET_FILEPATH
+  except (ImportError, AttributeError):
+    pass
+  packageDirectory = os.path.dirname(idcIndexLocation) if idcIndexLocation else None
+  if (parquetPath is None or not os.path.isfile(str(parquetPath))) and packageDirectory:
+    candidates = sorted(glob.glob(os.path.join(packageDirectory, "idc_index*.parquet")))
+    parquetPath = candidates[0] if candidates else None
+  csvZipPath = os.path.join(packageDirectory, "idc_index.csv.zip") if packageDirectory else None
+  return (str(parquetPath) if parquetPath and os.path.isfile(str(parquetPath)) else None,
+          csvZipPath if csvZipPath and os.path.isfile(csvZipPath) else None)
+
+
+class IndexStore:
+  """Loads the IDC index from the fastest available local format.
+
+  In order of preference:
+  - "arrow": an uncompressed Arrow IPC file in cacheDirectory, memory mapped,
+    so only the pages of the columns actually used are read from disk, and
+    string columns stay in the mapped Arrow buffers
+  - "parquet": the Parquet file shipped with idc-index
+  - "csv.zip": the zipped CSV file of older idc-index versions
+
+  Loading from Parquet or CSV writes the Arrow file for the next session.
+  Arrow and Parquet need pyarrow. Only the requested columns are read.
+  Each load records its format, duration and resident memory growth in
+  lastReport, Util/benchmarkIndexStore.py compares the formats.
+
+  The browser gets its columns through loadColumns(), which writes the
+  index already parsed by IDCClient to the Arrow file once and then maps it.
+  """
+
+  ARROW_FILE_NAME = "idc_index.arrow"
+
+  def __init__(self, cacheDirectory=None, parquetPath=None, csvZipPath=None):
+    self.arrowPath = os.path.join(cacheDirectory, self.ARROW_FILE_NAME) if cacheDirectory else None
+    self.parquetPath = parquetPath
+    self.csvZipPath = csvZipPath
+    self.lastReport = None
+
+  @staticmethod
+  def hasArrow():
+    try:
+      import pyarrow  # noqa: F401
+      return True
+    except ImportError:
+      return False
+
+  def formats(self):
+    """Return the (format, path) pairs that can be loaded, fastest first."""
+    formats = []
+    if self.hasArrow():
+      if self.arrowPath and os.path.isfile(self.arrowPath):
+        formats.append(("arrow", self.arrowPath))
+      if self.parquetPath:
+        formats.append(("parquet", self.parquetPath))
+    if self.csvZipPath:
+      formats.append(("csv.zip", self.csvZipPath))
+    return formats
+
+  def sourcePath(self):
+    """Return the path of the index file shipped with idc-index."""
+    return self.parquetPath or self.csvZipPath
+
+  def load(self, columns=None, format=None):
+    """Return the index DataFrame with columns (all if None), from format or the fastest available one."""
+    formats = self.formats()
+    if format is not None:
+      formats = [(name, path) for name, path in formats if name == format]
+    if not formats:
+      raise FileNotFoundError("No IDC index file available" + (" in format " + format if format else ""))
+    errors = []
+    for name, path in formats:
+      startMemory = residentMemoryBytes()
+      startTime = time.time()
+      try:
+        frame = getattr(self, "_load" + name.replace(".", "").capitalize())(path, columns)
+      except Exception as error:
+        logging.warning("Failed to load IDC index from {0}: {1}".format(path, error))
+        errors.append(error)
+        continue
+      endMemory = residentMemoryBytes()
+      self.lastReport = {
+        "format": name,
+        "path": path,
+        "columns": len(frame.columns),
+        "rows": len(frame),
+        "seconds": time.time() - startTime,
+        "residentBytes": endMemory - startMemory if startMemory is not None and endMemory is not None else None,
+      }
+      logging.info(self.formatReport(self.lastReport))
+      if name != "arrow" and columns is None:
+        self.writeArrowCache(frame)
+      return frame
+    raise errors[-1]
+
+  def loadColumns(self, columns, index):
+    """Return columns of the IDC index, memory mapped from the Arrow file of the store.
+
+    index is the full index DataFrame held by IDCClient, it is written to the
+    Arrow file if there is none yet or if the file holds another number of
+    series. Without pyarrow, or if the Arrow file cannot be written or read,
+    the columns are selected from index instead, and lastReport records the
+    "memory" format.
+    """
+    if self.hasArrow() and self.arrowPath:
+      for attempt in range(2):
+        if not os.path.isfile(self.arrowPath) and not self.writeArrowCache(index):
+          break
+        try:
+          frame = self.load(columns, format="arrow")
+        except Exception as error:
+          logging.warning("Using the index of the IDC client: {0}".format(error))
+          break
+        if len(frame) == len(index):
+          return frame
+        logging.info("IDC index cache {0} is out of date, writing it again".format(self.arrowPath))
+        del frame
+        try:
+          os.remove(self.arrowPath)
+        except OSError as error:
+          logging.warning("Using the index of the IDC client: {0}".format(error))
+          break
+    startTime = time.time()
+    frame = index[[column for column in columns if column in index.columns]]
+    self.lastReport = {
+      "format": "memory",
+      "path": None,
+      "columns": len(frame.columns),
+      "rows": len(frame),
+      "seconds": time.time() - startTime,
+      "residentBytes": None,
+    }
+    logging.info(self.formatReport(self.lastReport))
+    return frame
+
+  def _loadArrow(self, path, columns):
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.ipc
+
+    # not closed here, the columns of the table refer to the mapped file
+    table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+    if columns is not None:
+      table = table.select([column for column in columns if column in table.column_names])
+    # strings stay in the (memory mapped) Arrow buffers instead of becoming Python objects
+    return table.to_pandas(
+      types_mapper=lambda dataType: pd.ArrowDtype(dataType)
+      if pa.types.is_string(dataType) or pa.types.is_large_string(dataType) else None)
+
+  def _loadParquet(self, path, columns):
+    import pandas as pd
+    if columns is not None:
+      import pyarrow.parquet
+      available = pyarrow.parquet.read_schema(path).names
+      columns = [column for column in columns if column in available]
+    return pd.read_parquet(path, columns=columns)
+
+  def _loadCsvzip(self, path, columns):
+    import pandas as pd
+    if columns is not None:
+      requested = set(columns)
+      return pd.read_csv(path, usecols=lambda column: column in requested, low_memory=False)
+    return pd.read_csv(path, low_memory=False)
+
+  def writeArrowCache(self, frame):
+    """Save frame as the uncompressed Arrow IPC file of the store."""
+    if not self.arrowPath or not self.hasArrow():
+      return False
+    import pyarrow as pa
+    import pyarrow.ipc
+
+    temporaryPath = self.arrowPath + ".tmp"
+    try:
+      table = pa.Table.from_pandas(frame, preserve_index=False)
+      with pa.OSFile(temporaryPath, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+          writer.write_table(table)
+      os.replace(temporaryPath, self.arrowPath)
+    except Exception as error:
+      logging.warning("Failed to write IDC index cache {0}: {1}".format(self.arrowPath, error))
+      try:
+        os.remove(temporaryPath)
+      except OSError:
+        pass
+      return False
+    return True
+
+  @staticmethod
+  def formatReport(report):
+    residentBytes = report["residentBytes"]
+    return "Loaded {0} columns of {1} series of the IDC index from {2} in {3:.2f} seconds, resident memory {4}".format(
+      report["columns"], report["rows"], report["format"], report["seconds"],
+      "unknown" if residentBytes is None else "{0:+.1f} MB".format(residentBytes / (1024 * 1024)))
@@ -0,0 +1,85 @@
+import logging
+import os
+import pickle
+import sqlite3
+import time
+
+
+class LocalCatalog:
+  """SQLite catalog of the series downloaded into the storage folder.
+
+  Every series is recorded with its folder, size, instance count and download
+  time. Each write is its own transaction in write-ahead-log mode, so a crash
+  never loses or corrupts earlier entries. The series UIDs are also kept in a
+  set, so membership checks (for example for the status column of every row
+  of the series table) do not query the database.
+  """
+
+  def __init__(self, databasePath):
+    self.databasePath = databasePath
+    os.makedirs(os.path.dirname(os.path.abspath(databasePath)), exist_ok=True)
+    self._connection = sqlite3.connect(databasePath)
+    self._connection.execute("PRAGMA journal_mode=WAL")
+    self._connection.execute("PRAGMA synchronous=NORMAL")
+    self._connection.execute(
+      "CREATE TABLE IF NOT EXISTS series ("
+      "SeriesInstanceUID TEXT PRIMARY KEY, "
+      "path TEXT, "
+      "size_bytes INTEGER, "
+      "instance_count INTEGER, "
+      "download_time REAL)")
+    self._connection.commit()
+    self.seriesUIDs = set(row[0] for row in self._connection.execute("SELECT SeriesInstanceUID FROM series"))
+
+  def __len__(self):
+    return len(self.seriesUIDs)
+
+  def __contains__(self, seriesInstanceUID):
+    return seriesInstanceUID in self.seriesUIDs
+
+  def close(self):
+    self._connection.close()
+
+  def add(self, seriesInstanceUID, path=None, sizeBytes=None, instanceCount=None, downloadTime=None):
+    """Record a downloaded series, replacing a previous entry of the same series."""
+    with self._connection:
+      self._connection.execute(
+        "INSERT OR REPLACE INTO series VALUES (?, ?, ?, ?, ?)",
+        (seriesInstanceUID, path, sizeBytes, instanceCount, downloadTime if downloadTime is not None else time.time()))
+    self.seriesUIDs.add(seriesInstanceUID)
+
+  def remove(self, seriesInstanceUIDs):
+    seriesInstanceUIDs = list(seriesInstanceUIDs)
+    with self._connection:
+      self._connection.executemany("DELETE FROM series WHERE SeriesInstanceUID = ?",
+                                   [(uid,) for uid in seriesInstanceUIDs])
+    self.seriesUIDs.difference_update(seriesInstanceUIDs)
+
+  def entry(self, seriesInstanceUID):
+    """Return a dict with the recorded fields of a series, or None."""
+    cursor = self._connection.execute(
+      "SELECT SeriesInstanceUID, path, size_bytes, instance_count, download_time FROM series "
+      "WHERE SeriesInstanceUID = ?", (seriesInstanceUID,))
+    row = cursor.fetchone()
+    if row is None:
+      return None
+    return dict(zip(["SeriesInstanceUID", "path", "sizeBytes", "instanceCount", "downloadTime"], row))
+
+  def migrateArchive(self, archivePath):
+    """Import the series list of a pickled archive file of previous versions and rename the file."""
+    if not os.path.isfile(archivePath):
+      return 0
+    try:
+      with open(archivePath, "rb") as f:
+        seriesInstanceUIDs = pickle.load(f)
+    except Exception as error:
+      logging.warning("Failed to read downloaded series archive {0}: {1}".format(archivePath, error))
+      return 0
+    newUIDs = [uid for uid in seriesInstanceUIDs if uid not in self.seriesUIDs]
+    with self._connection:
+      self._connection.executemany("INSERT OR IGNORE INTO series (SeriesInstanceUID) VALUES (?)",
+                                   [(uid,) for uid in newUIDs])
+    self.seriesUIDs.update(newUIDs)
+    os.replace(archivePath, archivePath + ".migrated")
+    logging.info("Migrated {0} downloaded series from {1} to the local catalog".format(len(newUIDs), archivePath))
+    return len(newUIDs)
@@ -0,0 +1,197 @@
+import collections
+import hashlib
+import logging
+import os
+import pickle
+import shutil
+import threading
+import zlib
+
+
+class PersistentQueryCache:
+  """On-disk cache of hierarchy query results.
+
+  Entries live in a subdirectory per IDC release (``idc_<version>``), so a new
+  index version never returns stale results and the directories of previous
+  versions are removed. Each entry is a zlib compressed pickle of the result
+  DataFrame. When the total size exceeds maxSizeBytes the least recently used
+  entries (by file modification time, refreshed on every hit) are evicted.
+  The entry sizes are scanned once, then kept up to date by put, evict and
+  clear, so statistics() does not touch the disk.
+  """
+
+  FILE_EXTENSION = ".pkl.z"
+
+  def __init__(self, cacheDirectory, version, maxSizeBytes=256 * 1024 * 1024):
+    self.maxSizeBytes = maxSizeBytes
+    self.hits = 0
+    self.misses = 0
+
+    versionDirectoryName = "idc_" + str(version)
+    self.directory = os.path.join(cacheDirectory, versionDirectoryName)
+    os.makedirs(self.directory, exist_ok=True)
+    for name in os.listdir(cacheDirectory):
+      path = os.path.join(cacheDirectory, name)
+      if name.startswith("idc_") and name != versionDirectoryName and os.path.isdir(path):
+        logging.info("Removing query cache of a previous IDC release: " + path)
+        shutil.rmtree(path, ignore_errors=True)
+
+    # size by entry path, entries are written on the query worker and counted on the GUI thread
+    self._lock = threading.Lock()
+    self._sizes = {path: size for _, size, path in self.entries()}
+    self._totalSize = sum(self._sizes.values())
+
+  def entryPath(self, kind, key):
+    digest = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+    return os.path.join(self.directory, kind + "_" + digest + self.FILE_EXTENSION)
+
+  def get(self, kind, key):
+    """Return the cached result or None."""
+    path = self.entryPath(kind, key)
+    try:
+      with open(path, "rb") as f:
+        storedKey, result = pickle.loads(zlib.decompress(f.read()))
+    except FileNotFoundError:
+      self.misses += 1
+      return None
+    except Exception as error:
+      logging.warning("Discarding unreadable query cache entry %s: %s", path, error)
+      self.removeEntry(path)
+      self.misses += 1
+      return None
+    if storedKey != key:
+      # hash collision, treat as a miss
+      self.misses += 1
+      return None
+    # mark as recently used
+    try:
+      os.utime(path)
+    except OSError:
+      pass
+    self.hits += 1
+    return result
+
+  def put(self, kind, key, result):
+    path = self.entryPath(kind, key)
+    temporaryPath = path + ".tmp"
+    data = zlib.compress(pickle.dumps((key, result), protocol=pickle.HIGHEST_PROTOCOL), 1)
+    try:
+      with open(temporaryPath, "wb") as f:
+        f.write(data)
+      os.replace(temporaryPath, path)
+    except OSError as error:
+      logging.warning("Failed to write query cache entry %s: %s", path, error)
+      self.removeEntry(temporaryPath)
+      return
+    with self._lock:
+      self._totalSize += len(data) - self._sizes.get(path, 0)
+      self._sizes[path] = len(data)
+      overLimit = self._totalSize > self.maxSizeBytes
+    if overLimit:
+      self.evict()
+
+  def entries(self):
+    """Return (modification time, size, path) of all entries, least recently used first."""
+    entries = []
+    with os.scandir(self.directory) as it:
+      for entry in it:
+        if not entry.name.endswith(self.FILE_EXTENSION):
+          continue
+        try:
+          stat = entry.stat()
+        except OSError:
+          continue
+        entries.append((stat.st_mtime, stat.st_size, entry.path))
+    entries.sort()
+    return entries
+
+  def evict(self):
+    """Remove the least recently used entries until the cache fits in maxSizeBytes."""
+    # only scanned when over the limit, the modification times give the usage order
+    entries = self.entries()
+    with self._lock:
+      self._sizes = {path: size for _, size, path in entries}
+      self._totalSize = sum(self._sizes.values())
+    for _, _, path in entries:
+      if self._totalSize <= self.maxSizeBytes:
+        break
+      self.removeEntry(path)
+
+  def removeEntry(self, path):
+    try:
+      os.remove(path)
+    except OSError:
+      pass
+    with self._lock:
+      self._totalSize -= self._sizes.pop(path, 0)
+
+  def clear(self):
+    for _, _, path in self.entries():
+      self.removeEntry(path)
+    with self._lock:
+      self._sizes = {}
+      self._totalSize = 0
+
+  def statistics(self):
+    requests = self.hits + self.misses
+    with self._lock:
+      entryCount = len(self._sizes)
+      sizeBytes = self._totalSize
+    return {
+      "hits": self.hits,
+      "misses": self.misses,
+      "hitRate": self.hits / requests if requests else 0.0,
+      "entries": entryCount,
+      "sizeBytes": sizeBytes,
+    }
+
+
+class LRUCache:
+  """Bounded in-memory least recently used cache of query results.
+
+  Entries belong to one IDC release, call validate() with the current
+  version before use to drop everything when the index changes.
+  """
+
+  def __init__(self, maxEntries=128):
+    self.maxEntries = maxEntries
+    self.version = None
+    self.hits = 0
+    self.misses = 0
+    self._entries = collections.OrderedDict()
+    # queries run on a worker thread while the GUI thread may clear the cache
+    self._lock = threading.Lock()
+
+  def __len__(self):
+    return len(self._entries)
+
+  def validate(self, version):
+    if version != self.version:
+      self.clear()
+      self.version = version
+
+  def get(self, key):
+    with self._lock:
+      try:
+        result = self._entries[key]
+      except KeyError:
+        self.misses += 1
+        return None
+      self._entries.move_to_end(key)
+      self.hits += 1
+      return result
+
+  def put(self, key, result):
+    with self._lock:
+      self._entries[key] = result
+      self._entries.move_to_end(key)
+      while len(self._entries) > self.maxEntries:
+        self._entries.popitem(last=False)
+
+  def clear(self):
+    with self._lock:
+      self._entries.clear()
+
+  def hitRate(self):
+    requests = self.hits + self.misses
+    return self.hits / requests if requests else 0.0
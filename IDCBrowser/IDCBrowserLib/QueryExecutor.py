@@ -0,0 +1,83 @@
+import concurrent.futures
+import logging
+import queue
+import threading
+
+
+class QueryExecutor:
+  """Run index queries on a worker thread and hand their results back to the caller's thread.
+
+  Requests are submitted on named channels (for example "patients" or
+  "studies"). Submitting on a channel supersedes the previous request of that
+  channel: it is cancelled if it has not started yet, and its result is
+  discarded when it arrives. Results are delivered by processResults(), which
+  must be called periodically from the GUI thread (e.g. from a QTimer), so
+  callbacks can safely update widgets.
+  """
+
+  def __init__(self, maxWorkers=1):
+    self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=maxWorkers, thread_name_prefix="IDCBrowserQuery")
+    self._results = queue.Queue()
+    self._lock = threading.Lock()
+    self._generations = {}
+    self._futures = {}
+
+  def submit(self, channel, function, callback, errorCallback=None):
+    """Run function() in the background and call callback(result) from processResults().
+
+    If function raises, errorCallback(error) is called instead (or the error is logged).
+    """
+    with self._lock:
+      generation = self._generations.get(channel, 0) + 1
+      self._generations[channel] = generation
+      previousFuture = self._futures.get(channel)
+      if previousFuture is not None:
+        previousFuture.cancel()
+      future = self._pool.submit(function)
+      self._futures[channel] = future
+    future.add_done_callback(
+      lambda future: self._results.put((channel, generation, future, callback, errorCallback)))
+    return generation
+
+  def cancel(self, channel):
+    """Discard the pending request of channel, if any."""
+    with self._lock:
+      self._generations[channel] = self._generations.get(channel, 0) + 1
+      future = self._futures.pop(channel, None)
+    if future is not None:
+      future.cancel()
+
+  def cancelAll(self):
+    for channel in list(self._futures.keys()):
+      self.cancel(channel)
+
+  def isPending(self, channel):
+    """Return True if a request of channel has not been delivered yet."""
+    return channel in self._futures
+
+  def hasPending(self):
+    return bool(self._futures)
+
+  def processResults(self):
+    """Deliver finished, still current results. Call from the GUI thread."""
+    while True:
+      try:
+        channel, generation, future, callback, errorCallback = self._results.get_nowait()
+      except queue.Empty:
+        return
+      with self._lock:
+        if generation != self._generations.get(channel) or future.cancelled():
+          # superseded by a newer request
+          continue
+        del self._futures[channel]
+      error = future.exception()
+      if error is None:
+        callback(future.result())
+      elif errorCallback is not None:
+        errorCallback(error)
+      else:
+        logging.error("Query on channel '{0}' failed: {1}".format(channel, error))
+
+  def shutdown(self):
+    self.cancelAll()
+    self._pool.shutdown(wait=False)
@@ -0,0 +1,128 @@
+import logging
+import os
+import pickle
+import time
+import zlib
+
+# Tables of the IDC index describing derived objects, with the column that
+# holds the SeriesInstanceUID(s) of the series they refer to. Tables missing
+# from the installed idc-index version are skipped.
+REFERENCE_TABLES = [
+  ("seg_index", "segmented_SeriesInstanceUID"),
+  ("rtstruct_index", "referenced_SeriesInstanceUID"),
+  ("ann_index", "referenced_SeriesInstanceUID"),
+]
+
+# Modalities of the series listed in REFERENCE_TABLES, series of other
+# modalities do not refer to other series
+REFERENCING_MODALITIES = {"SEG", "RTSTRUCT", "ANN"}
+
+
+class ReferenceGraph:
+  """Series level graph of the references of derived objects to other series.
+
+  Maps every series that refers to other series (segmentations, structure
+  sets, annotations, ...) to the series it refers to. Neighbors are looked up
+  in a dict, and expand() follows references transitively, so for example a
+  report referring to a segmentation also pulls in the segmented image.
+  The graph is built once per IDC release and saved to disk.
+  """
+
+  def __init__(self, version=None, references=None):
+    self.version = version
+    self.references = references if references is not None else {}
+
+  def __len__(self):
+    return len(self.references)
+
+  @classmethod
+  def build(cls, client, version=None):
+    """Build the graph from the reference tables of an IDCClient."""
+    startTime = time.time()
+    references = {}
+    for tableName, referenceColumn in REFERENCE_TABLES:
+      try:
+        client.fetch_index(tableName)
+        table = client.sql_query("SELECT SeriesInstanceUID, {0} FROM {1}".format(referenceColumn, tableName))
+      except Exception as error:
+        logging.debug("Skipping {0} in the reference graph: {1}".format(tableName, error))
+        continue
+      for sourceUID, referencedUIDs in zip(table["SeriesInstanceUID"], table[referenceColumn]):
+        if referencedUIDs is None or isinstance(referencedUIDs, float):
+          # missing value
+          continue
+        if isinstance(referencedUIDs, str):
+          referencedUIDs = [referencedUIDs]
+        targets = references.setdefault(str(sourceUID), [])
+        for referencedUID in referencedUIDs:
+          referencedUID = str(referencedUID) if referencedUID else None
+          if referencedUID and referencedUID != sourceUID and referencedUID not in targets:
+            targets.append(referencedUID)
+    references = {sourceUID: tuple(targets) for sourceUID, targets in references.items() if targets}
+    logging.info("Built reference graph of {0} series in {1:.2f} seconds".format(len(references), time.time() - startTime))
+    return cls(version, references)
+
+  @classmethod
+  def load(cls, path, version):
+    """Return the graph saved in path for version, or None."""
+    try:
+      with open(path, "rb") as f:
+        storedVersion, references = pickle.loads(zlib.decompress(f.read()))
+    except FileNotFoundError:
+      return None
+    except Exception as error:
+      logging.warning("Discarding unreadable reference graph {0}: {1}".format(path, error))
+      return None
+    if storedVersion != version:
+      return None
+    return cls(version, references)
+
+  def save(self, path):
+    temporaryPath = path + ".tmp"
+    try:
+      with open(temporaryPath, "wb") as f:
+        f.write(zlib.compress(pickle.dumps((self.version, self.references), protocol=pickle.HIGHEST_PROTOCOL), 1))
+      os.replace(temporaryPath, path)
+    except OSError as error:
+      logging.warning("Failed to save reference graph {0}: {1}".format(path, error))
+
+  def referencedSeries(self, seriesInstanceUID):
+    """Return the series directly referenced by a series."""
+    return self.references.get(seriesInstanceUID, ())
+
+  def expand(self, seriesInstanceUIDs):
+    """Return (referenced UIDs, sources by referenced UID) of all series reachable from seriesInstanceUIDs.
+
+    Referenced UIDs are ordered breadth first and do not include the given
+    series. The sources of a referenced series are the given series whose
+    references lead to it, references are not followed through other given
+    series.
+    """
+    seriesInstanceUIDs = list(dict.fromkeys(seriesInstanceUIDs))
+    selected = set(seriesInstanceUIDs)
+    sourcesByUID = {}
+    orderedReferencedUIDs = []
+    frontier = seriesInstanceUIDs
+    while frontier:
+      nextFrontier = []
+      for uid in frontier:
+        for referencedUID in self.references.get(uid, ()):
+          if referencedUID in selected or referencedUID in sourcesByUID:
+            continue
+          sourcesByUID[referencedUID] = set()
+          orderedReferencedUIDs.append(referencedUID)
+          nextFrontier.append(referencedUID)
+      frontier = nextFrontier
+    # a series can be reached from several given series along paths of any
+    # length, so the sources are collected with one traversal per given series
+    for sourceUID in seriesInstanceUIDs:
+      reached = set()
+      stack = [sourceUID]
+      while stack:
+        for referencedUID in self.references.get(stack.pop(), ()):
+          if referencedUID in selected or referencedUID in reached:
+            continue
+          reached.add(referencedUID)
+          sourcesByUID[referencedUID].add(sourceUID)
+          stack.append(referencedUID)
+    return orderedReferencedUIDs, sourcesByUID
@@ -0,0 +1,44 @@
+# DICOM plugins that load series of a modality, in order of preference. Several
+# of them come with extensions (QuantitativeReporting, SlicerRT) and are only
+# used when installed. An empty list marks modalities Slicer cannot load, such
+# as slide microscopy.
+MODALITY_PLUGINS = {
+  "CT": ["DICOMScalarVolumePlugin"],
+  "MR": ["DICOMScalarVolumePlugin"],
+  "PT": ["DICOMScalarVolumePlugin"],
+  "NM": ["DICOMScalarVolumePlugin"],
+  "CR": ["DICOMScalarVolumePlugin"],
+  "DX": ["DICOMScalarVolumePlugin"],
+  "MG": ["DICOMScalarVolumePlugin"],
+  "XA": ["DICOMScalarVolumePlugin"],
+  "RF": ["DICOMScalarVolumePlugin"],
+  "OT": ["DICOMScalarVolumePlugin"],
+  "US": ["DICOMScalarVolumePlugin", "DICOMImageSequencePlugin"],
+  "SEG": ["DICOMSegmentationPlugin"],
+  "RTSTRUCT": ["DicomRtImportExportPlugin"],
+  "RTDOSE": ["DicomRtImportExportPlugin"],
+  "RTPLAN": ["DicomRtImportExportPlugin"],
+  "RTIMAGE": ["DicomRtImportExportPlugin"],
+  "SR": ["DICOMTID1500Plugin"],
+  "SM": [],
+}
+
+# Series that refer to other series are loaded after the images, so that
+# segmentations and structure sets find their reference volume in the scene.
+MODALITY_LOAD_ORDER = {"SEG": 1, "RTSTRUCT": 1, "RTDOSE": 1, "RTPLAN": 1, "SR": 2}
+
+
+def pluginNamesForModality(modality, availablePluginNames):
+  """Return the available plugins to examine a series of modality with.
+
+  Returns None if the modality is unknown and all plugins have to be tried,
+  and an empty list if no plugin for the modality is available.
+  """
+  if modality not in MODALITY_PLUGINS:
+    return None
+  return [name for name in MODALITY_PLUGINS[modality] if name in availablePluginNames]
+
+
+def sortForLoading(seriesInstanceUIDs, modalityBySeriesUID):
+  """Return the series in loading order: images first, then the series that refer to them."""
+  return sorted(seriesInstanceUIDs, key=lambda uid: MODALITY_LOAD_ORDER.get(modalityBySeriesUID.get(uid), 0))
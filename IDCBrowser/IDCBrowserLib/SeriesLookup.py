@@ -0,0 +1,66 @@
+import logging
+import time
+
+
+class SeriesLookup:
+  """SeriesInstanceUID keyed access to the columns of ``IDCClient.index``.
+
+  A hash-backed pandas Index of the series UIDs is built once and maps UIDs
+  to row positions. Lookups then read only the requested rows and columns,
+  so no column of the whole index is copied into Python dicts.
+  """
+
+  def __init__(self, index):
+    import numpy as np
+    import pandas as pd
+
+    startTime = time.time()
+    self.frame = index
+    seriesUIDs = index["SeriesInstanceUID"]
+    if seriesUIDs.is_unique:
+      self.rowPositions = None
+    else:
+      # keep the first row of a series, like the rest of the module
+      firstRows = ~seriesUIDs.duplicated(keep="first").to_numpy()
+      self.rowPositions = np.flatnonzero(firstRows)
+      seriesUIDs = seriesUIDs[firstRows]
+    self.keys = pd.Index(seriesUIDs.to_numpy())
+    # pandas builds the hash table lazily, do it now rather than on the first lookup
+    if len(self.keys):
+      self.keys.get_loc(self.keys[0])
+    logging.info("SeriesLookup built for {0} series in {1:.2f} seconds.".format(len(self.keys), time.time() - startTime))
+
+  def __len__(self):
+    return len(self.keys)
+
+  def __contains__(self, seriesInstanceUID):
+    try:
+      return seriesInstanceUID in self.keys
+    except TypeError:
+      return False
+
+  def positions(self, seriesInstanceUIDs):
+    """Return the index row positions of seriesInstanceUIDs, -1 for unknown series."""
+    positions = self.keys.get_indexer(list(seriesInstanceUIDs))
+    if self.rowPositions is not None:
+      found = positions >= 0
+      positions[found] = self.rowPositions[positions[found]]
+    return positions
+
+  def rows(self, seriesInstanceUIDs, columns):
+    """Return a DataFrame with columns of the known series of seriesInstanceUIDs, in the given order."""
+    positions = self.positions(seriesInstanceUIDs)
+    columnPositions = [self.frame.columns.get_loc(column) for column in columns]
+    return self.frame.iloc[positions[positions >= 0], columnPositions].reset_index(drop=True)
+
+  def values(self, seriesInstanceUIDs, column):
+    """Return a SeriesInstanceUID -> value dict of column for the known series of seriesInstanceUIDs."""
+    seriesInstanceUIDs = list(seriesInstanceUIDs)
+    positions = self.positions(seriesInstanceUIDs)
+    found = positions >= 0
+    columnValues = self.frame.iloc[positions[found], self.frame.columns.get_loc(column)].tolist()
+    foundUIDs = [uid for uid, isFound in zip(seriesInstanceUIDs, found) if isFound]
+    return dict(zip(foundUIDs, columnValues))
+
+  def value(self, seriesInstanceUID, column, default=None):
+    return self.values([seriesInstanceUID], column).get(seriesInstanceUID, default)
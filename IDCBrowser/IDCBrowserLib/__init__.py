@@ -0,0 +1,16 @@
+from .IdentifierIndex import IdentifierIndex
+from .IncrementalSearch import IncrementalSearch, SearchHit
+from . import HierarchyQueries
+from .QueryCache import LRUCache, PersistentQueryCache
+from .QueryExecutor import QueryExecutor
+from .DownloadScheduler import DownloadJob, DownloadScheduler, linkSeriesFolder, readManifestUrls, verifySeriesFolder
+from .ImportManifest import ImportManifest
+from .FacetIndex import FacetIndex
+from .IndexCompaction import BROWSER_COLUMNS, compactIndex, formatMemoryReport
+from .IndexStore import IndexStore, findIndexFiles, residentMemoryBytes
+from .LocalCatalog import LocalCatalog
+from .ReferenceGraph import REFERENCING_MODALITIES, ReferenceGraph
+from .SeriesLookup import SeriesLookup
+from .SeriesLoader import pluginNamesForModality, sortForLoading
+# entry point of the headless batch download, it imports slicer and the module only when run
+from . import BatchDownload
@@ -0,0 +1,55 @@
+"""Unit tests of the argument and file parsing of BatchDownload, they only need the Python standard library.
+
+Run them with ``python -m pytest IDCBrowser/Testing/Python`` or through ctest.
+"""
+
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from IDCBrowserLib import BatchDownload, readManifestUrls
+
+
+class BatchDownloadTest(unittest.TestCase):
+
+  def setUp(self):
+    self.temporaryDirectory = tempfile.TemporaryDirectory()
+    self.directory = self.temporaryDirectory.name
+
+  def tearDown(self):
+    self.temporaryDirectory.cleanup()
+
+  def writeFile(self, name, text):
+    path = os.path.join(self.directory, name)
+    with open(path, "w", encoding="utf-8") as f:
+      f.write(text)
+    return path
+
+  def test_parseArguments(self):
+    arguments = BatchDownload.parseArguments(["--series", "1.2.3", "1.2.4", "--include-references", "--workers", "8"])
+    self.assertEqual(arguments.series, ["1.2.3", "1.2.4"])
+    self.assertTrue(arguments.include_references)
+    self.assertEqual(arguments.workers, 8)
+    self.assertEqual(arguments.order, "smallest")
+    self.assertFalse(BatchDownload.parseArguments(["--sql", "SELECT 1"]).include_references)
+
+  def test_parseArgumentsRequiresASelection(self):
+    for argv in ([], ["--series", "1.2.3", "--load", "--no-import"]):
+      with contextlib.redirect_stderr(io.StringIO()), self.assertRaises(SystemExit):
+        BatchDownload.parseArguments(argv)
+
+  def test_readSeriesFileSkipsEmptyLinesAndComments(self):
+    path = self.writeFile("series.txt", "# cohort\n1.2.3\n\n  1.2.4  \n")
+    self.assertEqual(BatchDownload.readSeriesFile(path), ["1.2.3", "1.2.4"])
+
+  def test_readManifestUrls(self):
+    path = self.writeFile("manifest.s5cmd", 'cp "s3://idc-open-data/abc/*" .\ncp s3://idc-open-data/def/* .\n\n')
+    self.assertEqual(readManifestUrls(path), ["s3://idc-open-data/abc/*", "s3://idc-open-data/def/*"])
+
+
+if __name__ == '__main__':
+  unittest.main()
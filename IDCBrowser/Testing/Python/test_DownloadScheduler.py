@@ -0,0 +1,231 @@
+"""Unit tests of the DownloadScheduler job states, with a fake s5cmd script instead of transfers.
+
+Run them with ``python -m pytest IDCBrowser/Testing/Python`` or through ctest.
+"""
+
+import os
+import stat
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from IDCBrowserLib import DownloadJob, DownloadScheduler
+
+# Copies the *.dcm files of the source folder like "s5cmd sync --size-only".
+# Files in the source folder change what it does:
+# - failures: number of calls left that exit with an error instead
+# - sleep: seconds to wait before copying
+# - partial: copy only the first file
+FAKE_S5CMD = '''#!{python}
+import os, shutil, sys, time
+source, destination = sys.argv[-2].rstrip("/*"), sys.argv[-1]
+
+def control(name):
+  path = os.path.join(source, name)
+  if not os.path.exists(path):
+    return None
+  with open(path) as f:
+    return f.read().strip()
+
+failures = control("failures")
+if failures and int(failures) > 0:
+  with open(os.path.join(source, "failures"), "w") as f:
+    f.write(str(int(failures) - 1))
+  sys.stderr.write("ERROR SlowDown: please reduce your request rate\\n")
+  sys.exit(1)
+time.sleep(float(control("sleep") or 0))
+fileNames = sorted(name for name in os.listdir(source) if name.endswith(".dcm"))
+if control("partial"):
+  fileNames = fileNames[:1]
+for fileName in fileNames:
+  shutil.copyfile(os.path.join(source, fileName), os.path.join(destination, fileName))
+'''
+
+
+@unittest.skipIf(os.name == "nt", "the fake s5cmd is a Python script with a shebang line")
+class DownloadSchedulerTest(unittest.TestCase):
+
+  INSTANCE_COUNT = 3
+  INSTANCE_BYTES = 100
+
+  def setUp(self):
+    self.temporaryDirectory = tempfile.TemporaryDirectory()
+    self.directory = self.temporaryDirectory.name
+    self.s5cmdPath = os.path.join(self.directory, "s5cmd")
+    with open(self.s5cmdPath, "w") as f:
+      f.write(FAKE_S5CMD.format(python=sys.executable))
+    os.chmod(self.s5cmdPath, os.stat(self.s5cmdPath).st_mode | stat.S_IXUSR)
+    self.schedulers = []
+
+  def tearDown(self):
+    for scheduler in self.schedulers:
+      scheduler.cancel()
+    self.temporaryDirectory.cleanup()
+
+  def createScheduler(self, **kwargs):
+    kwargs.setdefault("retryDelay", 0)
+    scheduler = DownloadScheduler(self.s5cmdPath, **kwargs)
+    self.schedulers.append(scheduler)
+    return scheduler
+
+  def createSeries(self, name, **control):
+    """Create the source folder of a series, return the DownloadJob downloading it."""
+    source = os.path.join(self.directory, "source", name)
+    os.makedirs(source)
+    for instance in range(self.INSTANCE_COUNT):
+      with open(os.path.join(source, "{}.dcm".format(instance)), "wb") as f:
+        f.write(b"x" * self.INSTANCE_BYTES)
+    for controlName, value in control.items():
+      with open(os.path.join(source, controlName), "w") as f:
+        f.write(str(value))
+    return DownloadJob(name, source + "/*", os.path.join(self.directory, "download", name),
+                       self.INSTANCE_COUNT * self.INSTANCE_BYTES, self.INSTANCE_COUNT)
+
+  def runUntilFinished(self, scheduler, timeout=30):
+    finishedJobs = []
+    deadline = time.time() + timeout
+    while not scheduler.isFinished():
+      self.assertLess(time.time(), deadline, "downloads did not finish")
+      finishedJobs.extend(scheduler.poll())
+      time.sleep(0.02)
+    return finishedJobs
+
+  def test_downloadsAtMostMaxConcurrentSeries(self):
+    scheduler = self.createScheduler(maxConcurrent=2)
+    jobs = [scheduler.addJob(self.createSeries("series{}".format(n), sleep=0.3)) for n in range(5)]
+    scheduler.poll()
+    self.assertEqual(len(scheduler.activeJobs()), 2)
+    self.assertEqual(len(scheduler.queuedJobs()), 3)
+    finishedJobs = []
+    deadline = time.time() + 30
+    while not scheduler.isFinished():
+      self.assertLess(time.time(), deadline)
+      finishedJobs.extend(scheduler.poll())
+      self.assertLessEqual(len(scheduler.activeJobs()), 2)
+      time.sleep(0.02)
+    self.assertEqual(sorted(job.seriesInstanceUID for job in finishedJobs), [job.seriesInstanceUID for job in jobs])
+    for job in jobs:
+      self.assertEqual(job.state, DownloadJob.DONE)
+      self.assertEqual(len(os.listdir(job.destination)), self.INSTANCE_COUNT)
+    self.assertEqual(scheduler.transferredBytes(), 5 * self.INSTANCE_COUNT * self.INSTANCE_BYTES)
+
+  def test_startsPriorityThenSmallestFirst(self):
+    scheduler = self.createScheduler(maxConcurrent=1)
+    large = scheduler.addJob(self.createSeries("large", sleep=0.2))
+    small = scheduler.addJob(self.createSeries("small", sleep=0.2))
+    small.expectedBytes = large.expectedBytes - 1
+    first = scheduler.addJob(self.createSeries("first", sleep=0.2))
+    first.priority = -1
+    self.assertEqual(scheduler.queuedJobs(), [first, small, large])
+    scheduler.poll()
+    self.assertEqual(scheduler.activeJobs(), [first])
+
+  def test_retriesFailedTransfers(self):
+    scheduler = self.createScheduler(maxAttempts=3)
+    job = scheduler.addJob(self.createSeries("series", failures=2))
+    self.assertEqual(self.runUntilFinished(scheduler), [job])
+    self.assertEqual(job.state, DownloadJob.DONE)
+    self.assertEqual(job.attempts, 3)
+
+  def test_failsAfterMaxAttemptsWithTheErrorOfS5cmd(self):
+    scheduler = self.createScheduler(maxAttempts=2)
+    job = scheduler.addJob(self.createSeries("series", failures=5))
+    self.runUntilFinished(scheduler)
+    self.assertEqual(job.state, DownloadJob.FAILED)
+    self.assertEqual(job.attempts, 2)
+    self.assertIn("SlowDown", job.error)
+
+  def test_waitsBeforeRetrying(self):
+    scheduler = self.createScheduler(retryDelay=60)
+    job = scheduler.addJob(self.createSeries("series", failures=1))
+    deadline = time.time() + 30
+    while job.attempts == 0 or job.state == DownloadJob.DOWNLOADING:
+      self.assertLess(time.time(), deadline)
+      scheduler.poll()
+      time.sleep(0.02)
+    scheduler.poll()
+    self.assertEqual(job.state, DownloadJob.QUEUED)
+    self.assertEqual(job.attempts, 1)
+    self.assertGreater(job.retryTime, time.time() + 50)
+
+  def test_addJobReplacesFinishedJobsOfTheSeries(self):
+    scheduler = self.createScheduler(maxAttempts=1)
+    failedJob = scheduler.addJob(self.createSeries("series", failures=1))
+    self.runUntilFinished(scheduler)
+    self.assertEqual(failedJob.state, DownloadJob.FAILED)
+    job = scheduler.addJob(DownloadJob("series", failedJob.url, failedJob.destination,
+                                       failedJob.expectedBytes, failedJob.expectedInstanceCount))
+    self.assertEqual(scheduler.jobs, [job])
+    self.assertIs(scheduler.job("series"), job)
+    with self.assertRaises(ValueError):
+      scheduler.addJob(DownloadJob("series", job.url, job.destination))
+    self.runUntilFinished(scheduler)
+    self.assertEqual(job.state, DownloadJob.DONE)
+
+  def test_retriesAndFailsIncompleteSeries(self):
+    scheduler = self.createScheduler(maxAttempts=2)
+    job = scheduler.addJob(self.createSeries("series", partial=1))
+    self.runUntilFinished(scheduler)
+    self.assertEqual(job.state, DownloadJob.FAILED)
+    self.assertEqual(job.attempts, 2)
+    self.assertEqual(job.error, "1 of 3 instances downloaded")
+
+  def test_cancelStopsTransfersAndDropsQueuedJobs(self):
+    scheduler = self.createScheduler(maxConcurrent=1)
+    running = scheduler.addJob(self.createSeries("running", sleep=60))
+    queued = scheduler.addJob(self.createSeries("queued"))
+    scheduler.poll()
+    self.assertEqual(running.state, DownloadJob.DOWNLOADING)
+    process = running.process
+    startTime = time.time()
+    self.assertEqual(scheduler.cancel(timeout=5), [running, queued])
+    self.assertLess(time.time() - startTime, 10)
+    self.assertIsNotNone(process.poll())
+    self.assertEqual(running.state, DownloadJob.CANCELLED)
+    self.assertEqual(queued.state, DownloadJob.CANCELLED)
+    self.assertTrue(scheduler.isFinished())
+    self.assertEqual(scheduler.poll(), [])
+
+  def test_checkLocalSkipsCompleteSeries(self):
+    scheduler = self.createScheduler()
+    job = scheduler.addJob(self.createSeries("series"))
+    os.makedirs(job.destination)
+    for instance in range(self.INSTANCE_COUNT):
+      with open(os.path.join(job.destination, "{}.dcm".format(instance)), "wb") as f:
+        f.write(b"x" * self.INSTANCE_BYTES)
+    # a transfer would fail
+    job.url = os.path.join(self.directory, "missing") + "/*"
+    scheduler.checkLocal(job)
+    self.assertEqual(job.state, DownloadJob.CHECKING)
+    self.assertEqual(self.runUntilFinished(scheduler), [job])
+    self.assertEqual(job.state, DownloadJob.DONE)
+    self.assertEqual(job.attempts, 0)
+    self.assertEqual(job.transferredBytes, 0)
+
+  def test_checkLocalLinksCompleteSeriesFromAnotherFolder(self):
+    scheduler = self.createScheduler()
+    job = scheduler.addJob(self.createSeries("series"))
+    scheduler.checkLocal(job, sourceFolder=job.url.rstrip("/*"))
+    self.runUntilFinished(scheduler)
+    self.assertEqual(job.state, DownloadJob.DONE)
+    self.assertEqual(job.attempts, 0)
+    self.assertEqual(sorted(os.listdir(job.destination)), ["0.dcm", "1.dcm", "2.dcm"])
+
+  def test_checkLocalDownloadsIncompleteSeries(self):
+    scheduler = self.createScheduler()
+    job = scheduler.addJob(self.createSeries("series"))
+    os.makedirs(job.destination)
+    with open(os.path.join(job.destination, "0.dcm"), "wb") as f:
+      f.write(b"x" * self.INSTANCE_BYTES)
+    scheduler.checkLocal(job)
+    self.runUntilFinished(scheduler)
+    self.assertEqual(job.state, DownloadJob.DONE)
+    self.assertEqual(job.attempts, 1)
+    self.assertEqual(job.initialBytes, self.INSTANCE_BYTES)
+    self.assertEqual(job.transferredBytes, 2 * self.INSTANCE_BYTES)
+
+
+if __name__ == '__main__':
+  unittest.main()
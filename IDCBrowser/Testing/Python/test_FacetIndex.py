@@ -0,0 +1,70 @@
+"""Unit tests of FacetIndex, they need pandas and numpy.
+
+Run them with ``python -m pytest IDCBrowser/Testing/Python`` or through ctest.
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from IDCBrowserLib import FacetIndex
+
+try:
+  import pandas as pd
+except ImportError:
+  pd = None
+
+
+@unittest.skipIf(pd is None, "pandas is not installed")
+class FacetIndexTest(unittest.TestCase):
+
+  def setUp(self):
+    self.index = pd.DataFrame({
+      "SeriesInstanceUID": ["1", "2", "3", "4", "5"],
+      "collection_id": ["a", "a", "b", "b", "c"],
+      "Modality": ["CT", "SEG", "CT", "MR", None],
+      "SeriesDate": ["2001-02-03", "2001-05-06", "2010-01-01", None, "2010-12-31"],
+    })
+    self.facetIndex = FacetIndex(self.index)
+
+  def test_facetsOfMissingColumnsAreSkipped(self):
+    self.assertEqual(self.facetIndex.facets, ["collection_id", "Modality", "SeriesYear"])
+    self.assertEqual(self.facetIndex.values("Modality"), ["CT", "MR", "SEG", None])
+    self.assertEqual(self.facetIndex.values("SeriesYear"), ["2001", "2010", None])
+
+  def test_emptySelectionMatchesAllSeries(self):
+    self.assertEqual(self.facetIndex.seriesInstanceUIDs({}), ["1", "2", "3", "4", "5"])
+    self.assertEqual(self.facetIndex.seriesInstanceUIDs({"Modality": set()}), ["1", "2", "3", "4", "5"])
+
+  def test_valuesOfOneFacetAreCombinedWithOr(self):
+    self.assertEqual(self.facetIndex.seriesInstanceUIDs({"Modality": {"CT", "MR"}}), ["1", "3", "4"])
+
+  def test_facetsAreCombinedWithAnd(self):
+    selection = {"collection_id": {"b", "c"}, "Modality": {"CT"}}
+    self.assertEqual(self.facetIndex.seriesInstanceUIDs(selection), ["3"])
+
+  def test_missingValuesAreSelectable(self):
+    self.assertEqual(self.facetIndex.seriesInstanceUIDs({"Modality": {None}}), ["5"])
+    self.assertEqual(self.facetIndex.seriesInstanceUIDs({"SeriesYear": {None}}), ["4"])
+    self.assertEqual(self.facetIndex.seriesInstanceUIDs({"SeriesYear": {"2010"}}), ["3", "5"])
+
+  def test_unknownValuesMatchNothing(self):
+    self.assertEqual(self.facetIndex.seriesInstanceUIDs({"Modality": {"PT"}}), [])
+
+  def test_countsAreSortedByFrequency(self):
+    counts = self.facetIndex.counts({})
+    self.assertEqual(counts["Modality"], [("CT", 2), ("MR", 1), ("SEG", 1), (None, 1)])
+    self.assertEqual(counts["collection_id"], [("a", 2), ("b", 2), ("c", 1)])
+
+  def test_countsIgnoreTheSelectionOfTheirOwnFacet(self):
+    counts = self.facetIndex.counts({"collection_id": {"b"}, "Modality": {"CT"}})
+    # collection counts only apply the Modality selection and the other way around
+    self.assertEqual(counts["collection_id"], [("a", 1), ("b", 1)])
+    self.assertEqual(counts["Modality"], [("CT", 1), ("MR", 1)])
+    # the other facets apply both selections, values without series are left out
+    self.assertEqual(counts["SeriesYear"], [("2010", 1)])
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,75 @@
+"""Unit tests of IndexCompaction, they need pandas. The SQL query test also needs duckdb.
+
+Run them with ``python -m pytest IDCBrowser/Testing/Python`` or through ctest.
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from IDCBrowserLib import BROWSER_COLUMNS, compactIndex
+
+try:
+  import pandas as pd
+except ImportError:
+  pd = None
+
+try:
+  import duckdb
+except ImportError:
+  duckdb = None
+
+
+class FakeIDCClient:
+  """Runs SQL over its index the way IDCClient.sql_query does."""
+
+  def __init__(self, index):
+    self.index = index
+
+  def sql_query(self, sql):
+    index = self.index  # noqa: F841, referenced by name in the query
+    return duckdb.query(sql).to_df()
+
+
+@unittest.skipIf(pd is None, "pandas is not installed")
+class IndexCompactionTest(unittest.TestCase):
+
+  def setUp(self):
+    seriesCount = 10
+    self.index = pd.DataFrame({
+      "collection_id": ["a", "b"] * (seriesCount // 2),
+      "PatientID": ["p{}".format(n // 2) for n in range(seriesCount)],
+      "SeriesInstanceUID": ["1.2.{}".format(n) for n in range(seriesCount)],
+      "Modality": ["CT"] * (seriesCount - 1) + [None],
+      "series_size_MB": [float(n) for n in range(seriesCount)],
+      "license_short_name": ["CC BY 4.0"] * (seriesCount - 2) + ["CC BY-NC 4.0"] * 2,
+    })
+
+  def test_compactIndexDropsColumnsTheBrowserDoesNotRead(self):
+    self.assertNotIn("license_short_name", BROWSER_COLUMNS)
+    compact, report = compactIndex(self.index)
+    self.assertEqual(list(compact.columns), ["collection_id", "PatientID", "SeriesInstanceUID", "Modality", "series_size_MB"])
+    self.assertEqual(report["droppedColumns"], ["license_short_name"])
+    self.assertIn("collection_id", report["categoryColumns"])
+    self.assertIn("Modality", report["categoryColumns"])
+    self.assertNotIn("SeriesInstanceUID", report["categoryColumns"])
+    self.assertEqual(compact["Modality"].isna().sum(), 1)
+    self.assertEqual(compact["SeriesInstanceUID"].tolist(), self.index["SeriesInstanceUID"].tolist())
+
+  def test_compactIndexKeepsItsInputUnchanged(self):
+    original = self.index.copy()
+    compactIndex(self.index)
+    pd.testing.assert_frame_equal(self.index, original)
+
+  @unittest.skipIf(duckdb is None, "duckdb is not installed")
+  def test_clientQueriesColumnsDroppedFromTheCompactIndex(self):
+    client = FakeIDCClient(self.index)
+    compact, _ = compactIndex(client.index)
+    self.assertNotIn("license_short_name", compact.columns)
+    result = client.sql_query("SELECT SeriesInstanceUID FROM index WHERE license_short_name = 'CC BY-NC 4.0'")
+    self.assertEqual(result["SeriesInstanceUID"].tolist(), ["1.2.8", "1.2.9"])
+
+
+if __name__ == '__main__':
+  unittest.main()
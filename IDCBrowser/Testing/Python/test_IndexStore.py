@@ -0,0 +1,117 @@
+"""Unit tests of IndexStore, they need pandas. The Arrow tests also need pyarrow.
+
+Run them with ``python -m pytest IDCBrowser/Testing/Python`` or through ctest.
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from IDCBrowserLib import HierarchyQueries, IndexStore, compactIndex
+
+try:
+  import pandas as pd
+except ImportError:
+  pd = None
+
+
+@unittest.skipIf(pd is None, "pandas is not installed")
+class IndexStoreTest(unittest.TestCase):
+
+  def setUp(self):
+    self.temporaryDirectory = tempfile.TemporaryDirectory()
+    self.directory = self.temporaryDirectory.name
+    self.index = pd.DataFrame({
+      "collection_id": ["a", "a", "b"],
+      "PatientID": ["p1", "p1", "p2"],
+      "PatientSex": ["F", "F", None],
+      "PatientAge": ["050Y", "050Y", "061Y"],
+      "StudyInstanceUID": ["1.1", "1.1", "1.2"],
+      "SeriesInstanceUID": ["1.1.1", "1.1.2", "1.2.1"],
+      "Modality": ["CT", None, "MR"],
+      "series_size_MB": [1.5, 2.0, 3.25],
+      "license_short_name": ["CC BY 4.0"] * 3,
+    })
+    self.columns = ["SeriesInstanceUID", "Modality", "series_size_MB", "NotInTheIndex"]
+
+  def tearDown(self):
+    self.temporaryDirectory.cleanup()
+
+  def assertSameValues(self, frame, expected):
+    self.assertEqual(list(frame.columns), list(expected.columns))
+    for column in expected.columns:
+      self.assertEqual(frame[column].astype(object).where(frame[column].notna(), None).tolist(),
+                       expected[column].astype(object).where(expected[column].notna(), None).tolist())
+
+  def test_loadColumnsWithoutCacheDirectorySelectsFromIndex(self):
+    indexStore = IndexStore()
+    frame = indexStore.loadColumns(self.columns, self.index)
+    self.assertSameValues(frame, self.index[["SeriesInstanceUID", "Modality", "series_size_MB"]])
+    self.assertEqual(indexStore.lastReport["format"], "memory")
+
+  @unittest.skipIf(IndexStore.hasArrow(), "pyarrow is installed")
+  def test_loadColumnsWithoutArrowSelectsFromIndex(self):
+    indexStore = IndexStore(self.directory)
+    indexStore.loadColumns(self.columns, self.index)
+    self.assertEqual(indexStore.lastReport["format"], "memory")
+    self.assertFalse(os.path.exists(indexStore.arrowPath))
+
+  @unittest.skipIf(not IndexStore.hasArrow(), "pyarrow is not installed")
+  def test_loadColumnsWritesTheArrowFileOnceAndMapsIt(self):
+    indexStore = IndexStore(self.directory)
+    frame = indexStore.loadColumns(self.columns, self.index)
+    self.assertEqual(indexStore.lastReport["format"], "arrow")
+    self.assertTrue(os.path.isfile(indexStore.arrowPath))
+    self.assertSameValues(frame, self.index[["SeriesInstanceUID", "Modality", "series_size_MB"]])
+    self.assertIsInstance(frame["SeriesInstanceUID"].dtype, pd.ArrowDtype)
+
+    # the next session maps the file, reading only the requested columns
+    modifiedTime = os.path.getmtime(indexStore.arrowPath)
+    indexStore = IndexStore(self.directory)
+    frame = indexStore.loadColumns(["license_short_name"], self.index)
+    self.assertEqual(indexStore.lastReport["format"], "arrow")
+    self.assertEqual(list(frame.columns), ["license_short_name"])
+    self.assertEqual(os.path.getmtime(indexStore.arrowPath), modifiedTime)
+
+  @unittest.skipIf(not IndexStore.hasArrow(), "pyarrow is not installed")
+  def test_loadColumnsRewritesAnOutOfDateArrowFile(self):
+    IndexStore(self.directory).loadColumns(self.columns, self.index.iloc[:2])
+    indexStore = IndexStore(self.directory)
+    frame = indexStore.loadColumns(self.columns, self.index)
+    self.assertEqual(indexStore.lastReport["format"], "arrow")
+    self.assertEqual(frame["SeriesInstanceUID"].tolist(), ["1.1.1", "1.1.2", "1.2.1"])
+
+  @unittest.skipIf(not IndexStore.hasArrow(), "pyarrow is not installed")
+  def test_loadColumnsFallsBackToIndexIfTheArrowFileIsUnreadable(self):
+    indexStore = IndexStore(self.directory)
+    with open(indexStore.arrowPath, "wb") as f:
+      f.write(b"not an arrow file")
+    frame = indexStore.loadColumns(self.columns, self.index)
+    self.assertEqual(indexStore.lastReport["format"], "memory")
+    self.assertSameValues(frame, self.index[["SeriesInstanceUID", "Modality", "series_size_MB"]])
+
+  @unittest.skipIf(not IndexStore.hasArrow(), "pyarrow is not installed")
+  def test_queriesOnMappedColumnsMatchTheIndex(self):
+    frame = IndexStore(self.directory).loadColumns(list(self.index.columns), self.index)
+    compact, _ = compactIndex(frame)
+    for index in (frame, compact):
+      self.assertSameValues(HierarchyQueries.getPatients(index, "a"), HierarchyQueries.getPatients(self.index, "a"))
+
+  def test_loadProjectsTheZippedCsv(self):
+    csvZipPath = os.path.join(self.directory, "idc_index.csv.zip")
+    self.index.to_csv(csvZipPath, index=False)
+    indexStore = IndexStore(csvZipPath=csvZipPath)
+    frame = indexStore.load(["SeriesInstanceUID", "Modality"], format="csv.zip")
+    self.assertEqual(sorted(frame.columns), ["Modality", "SeriesInstanceUID"])
+    self.assertEqual(indexStore.lastReport["format"], "csv.zip")
+    self.assertEqual(indexStore.lastReport["rows"], 3)
+
+  def test_loadWithoutFilesRaises(self):
+    with self.assertRaises(FileNotFoundError):
+      IndexStore(self.directory).load()
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,126 @@
+"""Unit tests of LocalCatalog.
+
+Run them with ``python -m pytest IDCBrowser/Testing/Python`` or through ctest.
+"""
+
+import os
+import pickle
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from IDCBrowserLib import LocalCatalog
+
+
+class LocalCatalogTest(unittest.TestCase):
+
+  def setUp(self):
+    self.temporaryDirectory = tempfile.TemporaryDirectory()
+    self.databasePath = os.path.join(self.temporaryDirectory.name, "catalog", "IDCBrowserCatalog.sqlite")
+    self.catalogs = []
+
+  def tearDown(self):
+    for catalog in self.catalogs:
+      catalog.close()
+    self.temporaryDirectory.cleanup()
+
+  def openCatalog(self):
+    catalog = LocalCatalog(self.databasePath)
+    self.catalogs.append(catalog)
+    return catalog
+
+  def test_createsSchema(self):
+    catalog = self.openCatalog()
+    self.assertTrue(os.path.isfile(self.databasePath))
+    self.assertEqual(len(catalog), 0)
+    connection = sqlite3.connect(self.databasePath)
+    try:
+      columns = [row[1] for row in connection.execute("PRAGMA table_info(series)")]
+      journalMode = connection.execute("PRAGMA journal_mode").fetchone()[0]
+    finally:
+      connection.close()
+    self.assertEqual(columns, ["SeriesInstanceUID", "path", "size_bytes", "instance_count", "download_time"])
+    self.assertEqual(journalMode, "wal")
+
+  def test_addAndEntry(self):
+    catalog = self.openCatalog()
+    catalog.add("1.2.3", path="/data/1.2.3", sizeBytes=1024, instanceCount=4, downloadTime=100.0)
+    self.assertIn("1.2.3", catalog)
+    self.assertNotIn("1.2.4", catalog)
+    self.assertEqual(catalog.entry("1.2.3"), {
+      "SeriesInstanceUID": "1.2.3", "path": "/data/1.2.3", "sizeBytes": 1024,
+      "instanceCount": 4, "downloadTime": 100.0})
+    self.assertIsNone(catalog.entry("1.2.4"))
+
+  def test_addDefaultsDownloadTimeToNow(self):
+    catalog = self.openCatalog()
+    catalog.add("1.2.3")
+    entry = catalog.entry("1.2.3")
+    self.assertIsNone(entry["path"])
+    self.assertGreater(entry["downloadTime"], 0)
+
+  def test_addReplacesPreviousEntry(self):
+    catalog = self.openCatalog()
+    catalog.add("1.2.3", path="/old", sizeBytes=1, instanceCount=1, downloadTime=1.0)
+    catalog.add("1.2.3", path="/new", sizeBytes=2, instanceCount=3, downloadTime=2.0)
+    self.assertEqual(len(catalog), 1)
+    entry = catalog.entry("1.2.3")
+    self.assertEqual((entry["path"], entry["sizeBytes"], entry["instanceCount"]), ("/new", 2, 3))
+
+  def test_remove(self):
+    catalog = self.openCatalog()
+    for uid in ["1", "2", "3"]:
+      catalog.add(uid)
+    catalog.remove(uid for uid in ["1", "3", "not in the catalog"])
+    self.assertEqual(catalog.seriesUIDs, {"2"})
+    self.assertIsNone(catalog.entry("1"))
+    self.assertIsNotNone(catalog.entry("2"))
+
+  def test_reopenKeepsEntries(self):
+    catalog = self.openCatalog()
+    catalog.add("1", path="/data/1", sizeBytes=10, instanceCount=1)
+    catalog.add("2")
+    catalog.remove(["2"])
+    # opened while the first connection is still open, committed writes are visible
+    reopened = self.openCatalog()
+    self.assertEqual(reopened.seriesUIDs, {"1"})
+    self.assertEqual(reopened.entry("1")["path"], "/data/1")
+
+    catalog.close()
+    self.catalogs.remove(catalog)
+    reopened.close()
+    self.catalogs.remove(reopened)
+    self.assertEqual(self.openCatalog().seriesUIDs, {"1"})
+
+  def test_migrateArchive(self):
+    catalog = self.openCatalog()
+    catalog.add("1", path="/data/1")
+    archivePath = os.path.join(self.temporaryDirectory.name, "archive.pkl")
+    with open(archivePath, "wb") as f:
+      pickle.dump(["1", "2", "3"], f)
+
+    self.assertEqual(catalog.migrateArchive(archivePath), 2)
+    self.assertEqual(catalog.seriesUIDs, {"1", "2", "3"})
+    # existing entries are kept, migrated ones have no path
+    self.assertEqual(catalog.entry("1")["path"], "/data/1")
+    self.assertIsNone(catalog.entry("2")["path"])
+    self.assertFalse(os.path.exists(archivePath))
+    self.assertTrue(os.path.isfile(archivePath + ".migrated"))
+    # migrated only once
+    self.assertEqual(catalog.migrateArchive(archivePath), 0)
+
+  def test_migrateUnreadableArchive(self):
+    catalog = self.openCatalog()
+    archivePath = os.path.join(self.temporaryDirectory.name, "archive.pkl")
+    with open(archivePath, "wb") as f:
+      f.write(b"not a pickle")
+    with self.assertLogs(level="WARNING"):
+      self.assertEqual(catalog.migrateArchive(archivePath), 0)
+    self.assertEqual(len(catalog), 0)
+    self.assertTrue(os.path.isfile(archivePath))
+
+
+if __name__ == "__main__":
+  unittest.main()
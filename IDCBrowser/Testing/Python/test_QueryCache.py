@@ -0,0 +1,134 @@
+"""Unit tests of the in-memory and on-disk query caches.
+
+Run them with ``python -m pytest IDCBrowser/Testing/Python`` or through ctest.
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from IDCBrowserLib import LRUCache, PersistentQueryCache
+
+
+class LRUCacheTest(unittest.TestCase):
+
+  def test_getCountsHitsAndMisses(self):
+    cache = LRUCache()
+    self.assertIsNone(cache.get("a"))
+    cache.put("a", 1)
+    self.assertEqual(cache.get("a"), 1)
+    self.assertEqual((cache.hits, cache.misses), (1, 1))
+    self.assertEqual(cache.hitRate(), 0.5)
+
+  def test_evictsLeastRecentlyUsed(self):
+    cache = LRUCache(maxEntries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    # reading a makes b the least recently used entry
+    cache.get("a")
+    cache.put("c", 3)
+    self.assertEqual(len(cache), 2)
+    self.assertIsNone(cache.get("b"))
+    self.assertEqual(cache.get("a"), 1)
+    self.assertEqual(cache.get("c"), 3)
+
+  def test_putRefreshesExistingEntry(self):
+    cache = LRUCache(maxEntries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.put("a", 10)
+    cache.put("c", 3)
+    self.assertEqual(cache.get("a"), 10)
+    self.assertIsNone(cache.get("b"))
+
+  def test_validateClearsOnVersionChange(self):
+    cache = LRUCache()
+    cache.validate("v1")
+    cache.put("a", 1)
+    cache.validate("v1")
+    self.assertEqual(cache.get("a"), 1)
+    cache.validate("v2")
+    self.assertEqual(len(cache), 0)
+    self.assertEqual(cache.version, "v2")
+
+
+class PersistentQueryCacheTest(unittest.TestCase):
+
+  def setUp(self):
+    self.temporaryDirectory = tempfile.TemporaryDirectory()
+    self.directory = self.temporaryDirectory.name
+
+  def tearDown(self):
+    self.temporaryDirectory.cleanup()
+
+  def test_putAndGet(self):
+    cache = PersistentQueryCache(self.directory, "v1")
+    self.assertIsNone(cache.get("studies", ("p1",)))
+    cache.put("studies", ("p1",), {"rows": [1, 2]})
+    self.assertEqual(cache.get("studies", ("p1",)), {"rows": [1, 2]})
+    self.assertIsNone(cache.get("series", ("p1",)))
+    statistics = cache.statistics()
+    self.assertEqual((statistics["hits"], statistics["misses"], statistics["entries"]), (1, 2, 1))
+
+  def test_reopenKeepsEntriesOfSameVersion(self):
+    cache = PersistentQueryCache(self.directory, "v1")
+    cache.put("studies", ("p1",), [1])
+    sizeBytes = cache.statistics()["sizeBytes"]
+
+    reopened = PersistentQueryCache(self.directory, "v1")
+    self.assertEqual(reopened.get("studies", ("p1",)), [1])
+    self.assertEqual(reopened.statistics()["sizeBytes"], sizeBytes)
+
+  def test_newVersionRemovesPreviousVersion(self):
+    cache = PersistentQueryCache(self.directory, "v1")
+    cache.put("studies", ("p1",), [1])
+
+    newCache = PersistentQueryCache(self.directory, "v2")
+    self.assertIsNone(newCache.get("studies", ("p1",)))
+    self.assertEqual(os.listdir(self.directory), ["idc_v2"])
+
+  def test_unreadableEntryIsAMiss(self):
+    cache = PersistentQueryCache(self.directory, "v1")
+    cache.put("studies", ("p1",), [1])
+    with open(cache.entryPath("studies", ("p1",)), "wb") as f:
+      f.write(b"not a cache entry")
+    self.assertIsNone(cache.get("studies", ("p1",)))
+    self.assertEqual(cache.misses, 1)
+
+  def test_evictsLeastRecentlyUsedOverSizeLimit(self):
+    cache = PersistentQueryCache(self.directory, "v1")
+    keys = [("p%d" % i,) for i in range(3)]
+    for age, key in zip((300, 200, 100), keys):
+      cache.put("studies", key, list(range(100)))
+      # modification time gives the usage order, make it independent of the clock resolution
+      os.utime(cache.entryPath("studies", key), (0, 1000000 - age))
+
+    # room for the two newest entries, the oldest one is evicted
+    cache.maxSizeBytes = sum(os.path.getsize(cache.entryPath("studies", key)) for key in keys[1:])
+    cache.evict()
+    self.assertFalse(os.path.exists(cache.entryPath("studies", keys[0])))
+    self.assertTrue(os.path.exists(cache.entryPath("studies", keys[1])))
+    self.assertTrue(os.path.exists(cache.entryPath("studies", keys[2])))
+    self.assertEqual(cache.statistics()["entries"], 2)
+    self.assertLessEqual(cache.statistics()["sizeBytes"], cache.maxSizeBytes)
+
+    # a hit refreshes the entry, so the next put evicts the other one
+    cache.get("studies", keys[1])
+    cache.put("studies", ("p3",), list(range(100)))
+    self.assertTrue(os.path.exists(cache.entryPath("studies", keys[1])))
+    self.assertFalse(os.path.exists(cache.entryPath("studies", keys[2])))
+
+  def test_clear(self):
+    cache = PersistentQueryCache(self.directory, "v1")
+    cache.put("studies", ("p1",), [1])
+    cache.put("series", ("s1",), [2])
+    cache.clear()
+    self.assertEqual(cache.statistics()["entries"], 0)
+    self.assertEqual(cache.statistics()["sizeBytes"], 0)
+    self.assertEqual(os.listdir(cache.directory), [])
+
+
+if __name__ == "__main__":
+  unittest.main()
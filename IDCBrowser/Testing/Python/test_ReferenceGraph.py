@@ -0,0 +1,58 @@
+"""Unit tests of ReferenceGraph, they only need the Python standard library.
+
+Run them with ``python -m pytest IDCBrowser/Testing/Python`` or through ctest.
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from IDCBrowserLib import ReferenceGraph
+
+
+class ReferenceGraphTest(unittest.TestCase):
+
+  def test_expandFollowsChains(self):
+    graph = ReferenceGraph(None, {"SR": ("SEG",), "SEG": ("CT",)})
+    referencedUIDs, sources = graph.expand(["SR"])
+    self.assertEqual(referencedUIDs, ["SEG", "CT"])
+    self.assertEqual(sources, {"SEG": {"SR"}, "CT": {"SR"}})
+
+  def test_expandCollectsSourcesOfSharedReferences(self):
+    # C is reached from A directly and from B through X, D only through C
+    graph = ReferenceGraph(None, {"A": ("C",), "B": ("X",), "X": ("C",), "C": ("D",)})
+    referencedUIDs, sources = graph.expand(["A", "B"])
+    self.assertEqual(referencedUIDs, ["C", "X", "D"])
+    self.assertEqual(sources, {"C": {"A", "B"}, "X": {"B"}, "D": {"A", "B"}})
+
+  def test_expandSkipsGivenSeries(self):
+    graph = ReferenceGraph(None, {"SEG": ("CT",), "CT": ()})
+    referencedUIDs, sources = graph.expand(["SEG", "CT"])
+    self.assertEqual(referencedUIDs, [])
+    self.assertEqual(sources, {})
+
+  def test_expandStopsAtCycles(self):
+    graph = ReferenceGraph(None, {"A": ("B",), "B": ("C",), "C": ("B",)})
+    referencedUIDs, sources = graph.expand(["A"])
+    self.assertEqual(referencedUIDs, ["B", "C"])
+    self.assertEqual(sources, {"B": {"A"}, "C": {"A"}})
+
+  def test_expandWithoutReferences(self):
+    graph = ReferenceGraph(None, {"SEG": ("CT",)})
+    self.assertEqual(graph.expand(["MR"]), ([], {}))
+
+  def test_saveAndLoad(self):
+    graph = ReferenceGraph("v1", {"SEG": ("CT",)})
+    with tempfile.TemporaryDirectory() as directory:
+      path = os.path.join(directory, "ReferenceGraph.pickle")
+      graph.save(path)
+      self.assertEqual(ReferenceGraph.load(path, "v1").references, {"SEG": ("CT",)})
+      # a graph of another IDC release is not used
+      self.assertIsNone(ReferenceGraph.load(path, "v2"))
+    self.assertIsNone(ReferenceGraph.load(os.path.join(directory, "missing.pickle"), "v1"))
+
+
+if __name__ == '__main__':
+  unittest.main()
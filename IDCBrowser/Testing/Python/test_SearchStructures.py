@@ -0,0 +1,236 @@
+"""Unit tests of SeriesLookup, IdentifierIndex, IncrementalSearch and HierarchyQueries.
+
+Results are compared with plain pandas scans of the same index, like the
+queries these structures replaced. They need pandas.
+
+Run them with ``python -m pytest IDCBrowser/Testing/Python`` or through ctest.
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from IDCBrowserLib import HierarchyQueries, IdentifierIndex, IncrementalSearch, SeriesLookup
+
+try:
+  import pandas as pd
+except ImportError:
+  pd = None
+
+
+COLUMNS = ["collection_id", "PatientID", "PatientSex", "PatientAge", "StudyInstanceUID", "StudyDate",
+           "StudyDescription", "SeriesInstanceUID", "SeriesDate", "SeriesDescription", "Modality",
+           "BodyPartExamined", "SeriesNumber", "Manufacturer", "ManufacturerModelName", "instanceCount",
+           "series_size_MB"]
+
+ROWS = [
+  ("LIDC-IDRI", "LIDC-0001", "M", "060Y", "1.2.1", "2001-01-02", "CHEST CT", "1.2.1.1", "2001-01-02",
+   "Axial Lung", "CT", "CHEST", "1", "GE", "LightSpeed", 120, 60.5),
+  ("LIDC-IDRI", "LIDC-0001", "M", "060Y", "1.2.1", "2001-01-02", "CHEST CT", "1.2.1.2", "2001-01-02",
+   "Coronal Lung", "CT", "CHEST", "2", "GE", "LightSpeed", 80, 40.0),
+  ("LIDC-IDRI", "LIDC-0001", "M", "060Y", "1.2.2", "2000-05-01", "Follow-up chest", "1.2.2.1", "2000-05-01",
+   "Axial Lung", "CT", "CHEST", "1", "GE", "LightSpeed", 100, 50.0),
+  ("LIDC-IDRI", "LIDC-0002", "F", "055Y", "1.2.3", "2002-03-04", "CHEST CT", "1.2.3.1", "2002-03-04",
+   "lung nodules SEG", "SEG", "CHEST", "300", "Slicer", "3D Slicer", 1, 0.5),
+  ("tcga_brca", "TCGA-A1-0001", "F", None, "1.3.1", None, "MRI BREAST", "1.3.1.1", None,
+   "Ax T1", "MR", "BREAST", "3", "SIEMENS", "Avanto", 40, 12.0),
+  ("tcga_brca", "TCGA-A1-0001", "F", None, "1.3.1", None, "MRI BREAST", "1.3.1.2", None,
+   "Ax T2", "MR", "BREAST", "4", "SIEMENS", "Avanto", 40, 12.0),
+  ("tcga_brca", "TCGA-A1-0002", "F", "047Y", "1.3.2", "2005-06-07", None, "1.3.2.1", "2005-06-07",
+   "Lung mets", "CT", "CHEST", "1", "Philips", "Brilliance", 200, 90.0),
+]
+
+
+def makeIndex():
+  return pd.DataFrame(ROWS, columns=COLUMNS)
+
+
+@unittest.skipIf(pd is None, "pandas is not installed")
+class SeriesLookupTest(unittest.TestCase):
+
+  def setUp(self):
+    self.index = makeIndex()
+    self.lookup = SeriesLookup(self.index)
+
+  def test_valuesMatchScan(self):
+    uids = ["1.3.2.1", "not a series", "1.2.1.1", "1.2.3.1"]
+    for column in ["Modality", "series_size_MB", "SeriesDescription", "PatientID"]:
+      expected = {uid: self.index.loc[self.index["SeriesInstanceUID"] == uid, column].iloc[0]
+                  for uid in uids if (self.index["SeriesInstanceUID"] == uid).any()}
+      self.assertEqual(self.lookup.values(uids, column), expected)
+    self.assertEqual(self.lookup.value("not a series", "Modality", "default"), "default")
+
+  def test_rowsKeepRequestedOrder(self):
+    uids = ["1.3.1.2", "missing", "1.2.1.1"]
+    rows = self.lookup.rows(uids, ["SeriesInstanceUID", "Modality"])
+    self.assertEqual(rows["SeriesInstanceUID"].tolist(), ["1.3.1.2", "1.2.1.1"])
+    self.assertEqual(rows["Modality"].tolist(), ["MR", "CT"])
+    self.assertEqual(len(self.lookup.rows([], ["Modality"])), 0)
+
+  def test_contains(self):
+    self.assertEqual(len(self.lookup), len(ROWS))
+    self.assertIn("1.2.2.1", self.lookup)
+    self.assertNotIn("1.2.2", self.lookup)
+    self.assertNotIn("", self.lookup)
+    self.assertNotIn(["unhashable"], self.lookup)
+
+  def test_duplicatedSeriesUseFirstRow(self):
+    duplicate = self.index.iloc[[0]].assign(Modality="OT")
+    index = pd.concat([self.index, duplicate], ignore_index=True)
+    lookup = SeriesLookup(index)
+    self.assertEqual(len(lookup), len(ROWS))
+    self.assertEqual(lookup.value("1.2.1.1", "Modality"), "CT")
+    self.assertEqual(lookup.value("1.3.2.1", "Modality"), "CT")
+
+
+@unittest.skipIf(pd is None, "pandas is not installed")
+class IdentifierIndexTest(unittest.TestCase):
+
+  def setUp(self):
+    self.index = makeIndex()
+
+  def scanLookup(self, identifier):
+    """The DataFrame scans of the unified search IdentifierIndex replaced."""
+    if identifier in set(self.index["collection_id"]):
+      return ("collection", (identifier, None, None))
+    for level, column in (("patient", "PatientID"), ("study", "StudyInstanceUID"), ("series", "SeriesInstanceUID")):
+      matches = self.index[self.index[column] == identifier]
+      if not matches.empty:
+        path = tuple(matches.iloc[0][IdentifierIndex.PATH_COLUMNS])
+        return (level, path[:2] + (None,) if level == "patient" else path)
+    return None
+
+  def test_lookupMatchesScan(self):
+    identifiers = set()
+    for column in ["collection_id", "PatientID", "StudyInstanceUID", "SeriesInstanceUID"]:
+      identifiers.update(self.index[column])
+    for identifierIndex in (IdentifierIndex(self.index), IdentifierIndex(self.index, SeriesLookup(self.index))):
+      for identifier in sorted(identifiers):
+        with self.subTest(identifier=identifier):
+          self.assertEqual(identifierIndex.lookup(identifier), self.scanLookup(identifier))
+
+  def test_lookupWithoutMatch(self):
+    identifierIndex = IdentifierIndex(self.index)
+    # identifiers are matched exactly, so case and prefixes matter
+    for identifier in ["", "lidc-idri", "Lidc-0001", "1.2", "1.2.1.", "nothing"]:
+      with self.subTest(identifier=identifier):
+        self.assertIsNone(identifierIndex.lookup(identifier))
+        self.assertEqual(identifierIndex.lookup(identifier), self.scanLookup(identifier))
+
+
+@unittest.skipIf(pd is None, "pandas is not installed")
+class IncrementalSearchTest(unittest.TestCase):
+
+  def setUp(self):
+    self.index = makeIndex()
+    self.search = IncrementalSearch(self.index)
+
+  def scanSearch(self, query):
+    """Return the (field, value, matchType) hits of query found by scanning the distinct values."""
+    query = query.strip().lower()
+    if not query:
+      return []
+    exact, prefix, substring = [], [], []
+    for column, _ in IncrementalSearch.FIELDS:
+      for value in self.index[column].dropna().unique():
+        key = value.lower()
+        if key == query:
+          exact.append((key, column, value, "exact"))
+        elif key.startswith(query):
+          prefix.append((key, column, value, "prefix"))
+        elif (query in key and len(query) >= IncrementalSearch.MIN_SUBSTRING_LENGTH
+              and column in IncrementalSearch.SUBSTRING_FIELDS):
+          substring.append((key, column, value, "substring"))
+    return [hit[1:] for hit in sorted(exact) + sorted(prefix) + sorted(substring)]
+
+  def assertPath(self, hit):
+    row = self.index[self.index[hit.field] == hit.value].iloc[0]
+    depth = IncrementalSearch.LEVEL_DEPTH[hit.level]
+    expected = tuple(row[column] if i < depth else None for i, column in enumerate(IncrementalSearch.PATH_COLUMNS))
+    self.assertEqual(hit.path, expected)
+
+  def test_searchMatchesScan(self):
+    queries = ["LIDC", "lidc", "LiDc-0001", "  lidc-0001 ", "lung", "ax", "axi", "1.2.1", "1.3", "chest ct",
+               "t1", "mets", "brca"]
+    for query in queries:
+      with self.subTest(query=query):
+        hits = self.search.search(query, limit=100)
+        self.assertEqual([(hit.field, hit.value, hit.matchType) for hit in hits], self.scanSearch(query))
+        for hit in hits:
+          self.assertPath(hit)
+
+  def test_exactMatchFirst(self):
+    hits = self.search.search("1.2.1")
+    self.assertEqual((hits[0].field, hits[0].level, hits[0].matchType), ("StudyInstanceUID", "study", "exact"))
+    self.assertEqual(hits[0].path, ("LIDC-IDRI", "LIDC-0001", "1.2.1", None))
+    # UIDs are only matched by prefix, never as substrings
+    self.assertEqual({hit.matchType for hit in hits[1:]}, {"prefix"})
+
+  def test_emptyAndUnmatchedQueries(self):
+    self.assertEqual(self.search.search(""), [])
+    self.assertEqual(self.search.search("   "), [])
+    self.assertEqual(self.search.search("zzz"), [])
+    self.assertEqual(self.search.search("none"), [])
+    # shorter than the minimum substring length, "ung" would match "Axial Lung"
+    self.assertEqual(self.search.search("un"), [])
+
+  def test_limit(self):
+    self.assertEqual(len(self.search.search("1.", limit=3)), 3)
+    hits = self.search.search("lung", limit=1)
+    self.assertEqual([(hit.value, hit.matchType) for hit in hits], [("Lung mets", "prefix")])
+
+  def test_typingNarrowsLikeFreshSearch(self):
+    for query in ["lu", "lun", "lung", "lung ", "lung n", "lungx"]:
+      with self.subTest(query=query):
+        fresh = IncrementalSearch(self.index).search(query, limit=100)
+        self.assertEqual(self.search.search(query, limit=100), fresh)
+
+
+@unittest.skipIf(pd is None, "pandas is not installed")
+class HierarchyQueriesTest(unittest.TestCase):
+
+  def setUp(self):
+    self.index = makeIndex()
+
+  def assertFrameEqual(self, actual, expected):
+    pd.testing.assert_frame_equal(actual.reset_index(drop=True), expected.reset_index(drop=True), check_dtype=False)
+
+  def test_getPatientsMatchesScan(self):
+    for collectionID in ["LIDC-IDRI", "tcga_brca", "lidc-idri", ""]:
+      with self.subTest(collectionID=collectionID):
+        rows = self.index[self.index["collection_id"] == collectionID]
+        expected = rows.drop_duplicates("PatientID").sort_values("PatientID")[HierarchyQueries.PATIENT_COLUMNS]
+        self.assertFrameEqual(HierarchyQueries.getPatients(self.index, collectionID), expected)
+
+  def test_getStudiesMatchesPerPatientScan(self):
+    patientIDs = ["TCGA-A1-0002", "LIDC-0001", "unknown", "TCGA-A1-0001"]
+    rows = []
+    for patientID in patientIDs:
+      patientRows = self.index[self.index["PatientID"] == patientID]
+      studies = []
+      for studyUID, studyRows in patientRows.groupby("StudyInstanceUID", sort=False):
+        studies.append((studyUID, studyRows["StudyDate"].iloc[0], studyRows["StudyDescription"].iloc[0],
+                        studyRows["SeriesInstanceUID"].nunique(), patientID))
+      # by study date, studies without a date last
+      rows.extend(sorted(studies, key=lambda study: (study[1] is None, study[1] or "")))
+    expected = pd.DataFrame(rows, columns=HierarchyQueries.STUDY_COLUMNS)
+    self.assertFrameEqual(HierarchyQueries.getStudies(self.index, patientIDs), expected)
+
+  def test_getSeriesMatchesPerStudyScan(self):
+    studyUIDs = ["1.3.1", "1.2.2", "1.2.1", "1.2"]
+    expected = pd.concat([self.index[self.index["StudyInstanceUID"] == studyUID] for studyUID in studyUIDs])
+    expected = expected.rename(columns={"instanceCount": "ImageCount"})[HierarchyQueries.SERIES_COLUMNS]
+    self.assertFrameEqual(HierarchyQueries.getSeries(self.index, studyUIDs), expected)
+
+  def test_queriesWithoutMatch(self):
+    self.assertEqual(len(HierarchyQueries.getPatients(self.index, "nothing")), 0)
+    self.assertEqual(len(HierarchyQueries.getStudies(self.index, [])), 0)
+    self.assertEqual(len(HierarchyQueries.getStudies(self.index, ["lidc-0001"])), 0)
+    series = HierarchyQueries.getSeries(self.index, ["1.2.1.1"])
+    self.assertEqual(len(series), 0)
+    self.assertEqual(series.columns.tolist(), HierarchyQueries.SERIES_COLUMNS)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,65 @@
+"""Benchmark batched study and series queries against the per-row path.
+
+The per-row path runs one query per selected patient (or study) and grows
+the result table after each of them, like patientSelected/studySelected
+used to. The batched path resolves the whole selection in one pass.
+
+Usage:
+  python benchmarkHierarchyQueries.py [--idc-index] [--series N]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from IDCBrowserLib import HierarchyQueries
+from benchmarkIdentifierIndex import makeSyntheticIndex
+
+
+def perRow(query, index, keys):
+  table = None
+  for key in keys:
+    rows = query(index, [key])
+    table = rows if table is None else pd.concat([table, rows], ignore_index=True)
+  return table
+
+
+def timeCall(function, *args):
+  startTime = time.perf_counter()
+  result = function(*args)
+  return time.perf_counter() - startTime, result
+
+
+def main(argv):
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument("--idc-index", action="store_true", help="use the index of the installed idc-index package")
+  parser.add_argument("--series", type=int, default=1000000, help="size of the synthetic index")
+  args = parser.parse_args(argv)
+
+  if args.idc_index:
+    from idc_index import index as idcIndex
+    index = idcIndex.IDCClient().index
+  else:
+    index = makeSyntheticIndex(args.series)
+
+  patientIDs = pd.unique(index["PatientID"])
+  studyUIDs = pd.unique(index["StudyInstanceUID"])
+
+  print("{:>8} {:>8} {:>14} {:>14} {:>9}".format("level", "rows", "per-row (s)", "batched (s)", "speedup"))
+  for level, query, keys in (("studies", HierarchyQueries.getStudies, patientIDs),
+                             ("series", HierarchyQueries.getSeries, studyUIDs)):
+    for count in (1, 100, 1000):
+      selection = list(keys[:count])
+      perRowTime, perRowResult = timeCall(perRow, query, index, selection)
+      batchedTime, batchedResult = timeCall(query, index, selection)
+      assert len(perRowResult) == len(batchedResult)
+      print("{:>8} {:>8} {:>14.3f} {:>14.3f} {:>8.0f}x".format(
+        level, count, perRowTime, batchedTime, perRowTime / batchedTime))
+
+
+if __name__ == "__main__":
+  main(sys.argv[1:])
@@ -0,0 +1,117 @@
+"""Benchmark identifier lookups of the unified search.
+
+Compares the full DataFrame scans previously used by
+IDCBrowserWidget.performUnifiedSearch against IdentifierIndex lookups
+for increasing index sizes, then measures the per-keystroke latency of
+IncrementalSearch on the largest index.
+
+Usage:
+  python benchmarkIdentifierIndex.py [--idc-index] [--queries N]
+
+By default synthetic indexes are generated. With --idc-index the index
+shipped with the installed idc-index package is sampled instead.
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from IDCBrowserLib import IdentifierIndex, IncrementalSearch
+
+
+def makeSyntheticIndex(seriesCount):
+  seriesPerStudy = 4
+  studiesPerPatient = 2
+  patientsPerCollection = 500
+  rows = []
+  for n in range(seriesCount):
+    study = n // seriesPerStudy
+    patient = study // studiesPerPatient
+    collection = patient // patientsPerCollection
+    rows.append((
+      "collection_{}".format(collection),
+      "patient_{}".format(patient),
+      "1.2.826.0.1.{}".format(study),
+      "1.2.826.0.1.{}.{}".format(study, n),
+      "STUDY {}".format(study % 97),
+      "SERIES {} {}".format(("AXIAL", "CORONAL", "SAGITTAL")[n % 3], n % 1009),
+      ("M", "F")[patient % 2],
+      "0{}Y".format(40 + patient % 50),
+      "2000-01-{:02d}".format(1 + study % 28),
+      "2000-01-{:02d}".format(1 + study % 28),
+      ("CT", "MR", "PT", "SEG")[n % 4],
+      ("CHEST", "HEAD", "ABDOMEN")[study % 3],
+      str(n % seriesPerStudy + 1),
+      ("SIEMENS", "GE MEDICAL SYSTEMS", "Philips")[patient % 3],
+      "MODEL {}".format(patient % 11),
+      100 + n % 300,
+      round(50 + n % 300 * 0.5, 2),
+    ))
+  return pd.DataFrame(rows, columns=["collection_id", "PatientID", "StudyInstanceUID", "SeriesInstanceUID",
+                                     "StudyDescription", "SeriesDescription", "PatientSex", "PatientAge",
+                                     "StudyDate", "SeriesDate", "Modality", "BodyPartExamined", "SeriesNumber",
+                                     "Manufacturer", "ManufacturerModelName", "instanceCount", "series_size_MB"])
+
+
+def scanLookup(index, searchText):
+  for column in ("PatientID", "StudyInstanceUID", "SeriesInstanceUID"):
+    matches = index[index[column] == searchText]
+    if not matches.empty:
+      return column, tuple(matches.iloc[0][IdentifierIndex.PATH_COLUMNS])
+  return None
+
+
+def timePerQuery(function, queries):
+  startTime = time.perf_counter()
+  for query in queries:
+    function(query)
+  return (time.perf_counter() - startTime) / len(queries)
+
+
+def main(argv):
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument("--idc-index", action="store_true", help="sample the index of the installed idc-index package")
+  parser.add_argument("--queries", type=int, default=20, help="number of lookups per measurement")
+  args = parser.parse_args(argv)
+
+  if args.idc_index:
+    from idc_index import index
+    fullIndex = index.IDCClient().index
+    sizes = [size for size in (1000, 10000, 100000) if size < len(fullIndex)] + [len(fullIndex)]
+  else:
+    fullIndex = None
+    sizes = [1000, 10000, 100000, 1000000]
+
+  print("{:>10} {:>12} {:>14} {:>14} {:>10}".format("series", "build (s)", "scan (ms)", "lookup (ms)", "speedup"))
+  for size in sizes:
+    index = fullIndex.head(size) if fullIndex is not None else makeSyntheticIndex(size)
+    startTime = time.perf_counter()
+    identifierIndex = IdentifierIndex(index)
+    buildTime = time.perf_counter() - startTime
+
+    # series lookups are the worst case of the scan (all three columns are compared)
+    queries = random.sample(list(index["SeriesInstanceUID"]), min(args.queries, size))
+    scanTime = timePerQuery(lambda query: scanLookup(index, query), queries)
+    lookupTime = timePerQuery(identifierIndex.lookup, queries)
+    print("{:>10} {:>12.3f} {:>14.3f} {:>14.4f} {:>9.0f}x".format(
+      size, buildTime, scanTime * 1000, lookupTime * 1000, scanTime / lookupTime))
+
+  startTime = time.perf_counter()
+  incrementalSearch = IncrementalSearch(index)
+  print("\nIncrementalSearch over {} values built in {:.3f} s".format(len(incrementalSearch), time.perf_counter() - startTime))
+  for text in (str(index["PatientID"].iloc[-1]), str(index["SeriesDescription"].iloc[len(index) // 2]).lower(), "zzzz"):
+    latencies = []
+    for length in range(1, len(text) + 1):
+      startTime = time.perf_counter()
+      incrementalSearch.search(text[:length])
+      latencies.append((time.perf_counter() - startTime) * 1000)
+    print("typing {!r:40} max {:.2f} ms, mean {:.2f} ms per keystroke".format(text, max(latencies), sum(latencies) / len(latencies)))
+
+
+if __name__ == "__main__":
+  main(sys.argv[1:])
@@ -0,0 +1,106 @@
+"""Benchmark loading the IDC index from each local format of IndexStore.
+
+Each format (memory mapped Arrow IPC, Parquet, zipped CSV) is loaded with
+the columns the browser reads and with all columns. Every measurement runs
+in a fresh Python process, so the resident memory growth of one load is not
+hidden by the memory left over from the previous one.
+
+Usage:
+  python benchmarkIndexStore.py [--idc-index] [--series N] [--repeat N]
+
+By default a synthetic index is written to a temporary folder in all
+formats. With --idc-index the index files shipped with the installed
+idc-index package are used. Arrow and Parquet need pyarrow.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from IDCBrowserLib import BROWSER_COLUMNS, IndexStore, findIndexFiles
+
+
+def measure(cacheDirectory, parquetPath, csvZipPath, format, columns):
+  """Load the index once in this process and print the report as JSON."""
+  indexStore = IndexStore(cacheDirectory, parquetPath, csvZipPath)
+  frame = indexStore.load(columns, format=format)
+  report = dict(indexStore.lastReport)
+  report["frameBytes"] = int(frame.memory_usage(deep=True, index=False).sum())
+  print(json.dumps(report))
+
+
+def measureInSubprocess(cacheDirectory, parquetPath, csvZipPath, format, columns):
+  command = [sys.executable, os.path.abspath(__file__), "--measure", format,
+             "--cache", cacheDirectory, "--parquet", parquetPath or "", "--csv", csvZipPath or "",
+             "--columns", json.dumps(columns)]
+  output = subprocess.run(command, check=True, stdout=subprocess.PIPE, universal_newlines=True).stdout
+  return json.loads(output.strip().splitlines()[-1])
+
+
+def writeSyntheticIndex(directory, seriesCount):
+  """Write a synthetic index as zipped CSV and, if pyarrow is available, as Parquet."""
+  from benchmarkIdentifierIndex import makeSyntheticIndex
+  index = makeSyntheticIndex(seriesCount)
+  # columns of the real index that the browser does not read
+  index["source_DOI"] = ["10.7937/K9/TCIA.{}".format(n % 500) for n in range(seriesCount)]
+  index["license_url"] = "https://creativecommons.org/licenses/by/4.0/"
+  index["ImageType"] = "ORIGINAL|PRIMARY|AXIAL"
+  csvZipPath = os.path.join(directory, "idc_index.csv.zip")
+  index.to_csv(csvZipPath, index=False)
+  parquetPath = None
+  if IndexStore.hasArrow():
+    parquetPath = os.path.join(directory, "idc_index.parquet")
+    index.to_parquet(parquetPath, index=False)
+  return parquetPath, csvZipPath
+
+
+def main(argv):
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument("--idc-index", action="store_true", help="use the index files of the installed idc-index package")
+  parser.add_argument("--series", type=int, default=1000000, help="number of series of the synthetic index")
+  parser.add_argument("--repeat", type=int, default=3, help="number of loads per measurement, the fastest is reported")
+  # used by the measurement subprocesses
+  parser.add_argument("--measure", help=argparse.SUPPRESS)
+  parser.add_argument("--cache", help=argparse.SUPPRESS)
+  parser.add_argument("--parquet", help=argparse.SUPPRESS)
+  parser.add_argument("--csv", help=argparse.SUPPRESS)
+  parser.add_argument("--columns", help=argparse.SUPPRESS)
+  args = parser.parse_args(argv)
+
+  if args.measure:
+    measure(args.cache, args.parquet or None, args.csv or None, args.measure, json.loads(args.columns))
+    return
+
+  with tempfile.TemporaryDirectory() as directory:
+    if args.idc_index:
+      from idc_index import index
+      parquetPath, csvZipPath = findIndexFiles(index.__file__)
+    else:
+      print("Writing synthetic index of {} series ...".format(args.series))
+      parquetPath, csvZipPath = writeSyntheticIndex(directory, args.series)
+
+    indexStore = IndexStore(directory, parquetPath, csvZipPath)
+    if indexStore.hasArrow():
+      # loading all columns from Parquet or CSV writes the Arrow file
+      indexStore.load()
+    else:
+      print("pyarrow is not installed, only the zipped CSV is measured")
+
+    print("{:>8} {:>12} {:>10} {:>14} {:>12}".format("format", "columns", "load (s)", "resident (MB)", "frame (MB)"))
+    for format, _ in indexStore.formats():
+      for columnSet, columns in (("browser", BROWSER_COLUMNS), ("all", None)):
+        reports = [measureInSubprocess(directory, parquetPath, csvZipPath, format, columns) for _ in range(args.repeat)]
+        report = min(reports, key=lambda report: report["seconds"])
+        residentBytes = report["residentBytes"]
+        print("{:>8} {:>12} {:>10.3f} {:>14} {:>12.1f}".format(
+          format, "{} {}".format(columnSet, report["columns"]), report["seconds"],
+          "unknown" if residentBytes is None else "{:.1f}".format(residentBytes / (1024 * 1024)),
+          report["frameBytes"] / (1024 * 1024)))
+
+
+if __name__ == "__main__":
+  main(sys.argv[1:])